@@ -1,14 +1,17 @@
 import time
-from typing import Any, Dict, Optional
-from uuid import uuid4
+from typing import Optional
 
 import streamlit as st
 
 from services.auth_store import delete_auth_session, load_auth_session, save_auth_session
+from services.client_pool import get_client_pool
+from services.supabase_client import SupabaseClient
 from services.supabase_service import (
     cached_user_subscriptions,
-    init_supabase,
+    invalidate_user_caches,
+    use_client,
 )
+from services.token_manager import get_token_manager, serialize_session
 from utils.query_params import get_query_params, remove_query_params, set_query_params
 from views.auth import render_login
 from views.chat import render_chat_interface
@@ -60,22 +63,19 @@ st.set_page_config(
 )
 
 
-def _extract_session_tokens(session: Any) -> Optional[Dict[str, Any]]:
-    if session is None:
-        return None
-    if isinstance(session, dict):
-        return session
-    fields = ["access_token", "refresh_token", "expires_in", "token_type", "expires_at"]
-    return {field: getattr(session, field, None) for field in fields}
-
+def restore_supabase_session() -> Optional[SupabaseClient]:
+    """Restaura la sesión de Supabase si existen tokens almacenados.
 
-def restore_supabase_session(sb_client):
-    """Restaura la sesión de Supabase si existen tokens almacenados."""
+    Devuelve el cliente del pool asociado al `auth_token` de la pestaña (o
+    None si no hay sesión). Solo se llama a `set_session`, se guarda en el
+    almacén o se reescriben los parámetros de la URL cuando algo cambió; en la
+    mayoría de recargas no hay ninguna ida y vuelta a Supabase Auth.
+    """
     query_params = get_query_params()
     session_data = st.session_state.get("auth_session")
-    access_token = None
-    refresh_token = None
     auth_token = st.session_state.get("auth_token")
+    token_manager = get_token_manager()
+    changed = False
 
     if not auth_token:
         token_from_url = query_params.get("auth_token")
@@ -85,7 +85,11 @@ def restore_supabase_session(sb_client):
         if auth_token:
             st.session_state.auth_token = auth_token
 
-    if auth_token and not session_data:
+    if not auth_token:
+        return None
+    sb_client = get_client_pool().acquire(auth_token)
+
+    if not session_data:
         stored = load_auth_session(auth_token)
         if stored:
             session_data = stored.get("session")
@@ -95,29 +99,33 @@ def restore_supabase_session(sb_client):
             if user_data and not st.session_state.get("auth_user"):
                 st.session_state.auth_user = user_data
 
-    if session_data:
-        access_token = session_data.get("access_token")
-        refresh_token = session_data.get("refresh_token")
-    else:
-        existing_session = sb_client.get_session()
-        serialized = _extract_session_tokens(existing_session)
+    if not session_data:
+        serialized = serialize_session(sb_client.get_session())
         if serialized and serialized.get("access_token"):
+            session_data = serialized
             st.session_state.auth_session = serialized
-            access_token = serialized.get("access_token")
-            refresh_token = serialized.get("refresh_token")
+            changed = True
 
-    if access_token and refresh_token:
-        try:
-            sb_client.set_session(access_token, refresh_token)
-        except Exception:
-            pass
-    if st.session_state.get("auth_session"):
-        if not auth_token:
-            auth_token = str(uuid4())
-            st.session_state.auth_token = auth_token
-        save_auth_session(auth_token, st.session_state["auth_session"], st.session_state.get("auth_user") or {})
-        if auth_token and auth_token not in (query_params.get("auth_token") or []):
+    if session_data:
+        # El renovador pudo haber cambiado los tokens desde la última recarga.
+        refreshed = token_manager.current(auth_token)
+        if refreshed and refreshed.get("access_token") != session_data.get("access_token"):
+            session_data = refreshed
+            st.session_state.auth_session = refreshed
+        token_manager.track(auth_token, session_data)
+
+        access_token = session_data.get("access_token")
+        refresh_token = session_data.get("refresh_token")
+        if access_token and refresh_token:
+            try:
+                sb_client.set_session(access_token, refresh_token)
+            except Exception:
+                pass
+        if changed:
+            save_auth_session(auth_token, session_data, st.session_state.get("auth_user") or {})
+        if auth_token not in (query_params.get("auth_token") or []):
             set_query_params(auth_token=auth_token)
+    return sb_client
 
 
 def ensure_state_defaults():
@@ -159,33 +167,42 @@ def apply_query_params_state():
 def handle_logout(sb_client):
     """Cierra la sesión en Supabase y limpia el estado local."""
     auth_token = st.session_state.get("auth_token")
+    user_id = st.session_state.get("user_id")
     try:
         sb_client.sign_out()
     except Exception:
         pass
 
     delete_auth_session(auth_token)
+    get_token_manager().forget(auth_token)
+    get_client_pool().release(auth_token)
     remove_query_params("auth_token")
 
     st.session_state.clear()
-
-    try:
-        st.cache_data.clear()
-    except Exception:
-        pass
+    invalidate_user_caches(user_id)
 
     safe_rerun()
 
 
 def main():
-    sb_client = init_supabase()
-    restore_supabase_session(sb_client)
+    sb_client = restore_supabase_session()
+    if sb_client is None:
+        _run_app(None)
+        return
+    # El pool cierra los clientes que desaloja; mientras dura la ejecución
+    # el cliente queda retenido para que no se cierre a mitad de una consulta.
+    with get_client_pool().holding(sb_client):
+        _run_app(sb_client)
+
+
+def _run_app(sb_client):
+    use_client(sb_client)
 
     auth_user = st.session_state.get("auth_user")
     session_data = st.session_state.get("auth_session")
 
-    if not auth_user or not session_data:
-        render_login(sb_client)
+    if sb_client is None or not auth_user or not session_data:
+        render_login()
         return
 
     user_id = auth_user.get("id") if isinstance(auth_user, dict) else None
@@ -194,6 +211,8 @@ def main():
         return
 
     st.session_state.user_id = user_id
+    # Las cachés de lecturas con RLS se separan por usuario.
+    use_client(sb_client, user_id)
 
     ensure_state_defaults()
     apply_query_params_state()
@@ -0,0 +1,116 @@
+"""
+Benchmark del motor de indicadores de aprendizaje (utils/analytics.py).
+Genera historiales sintéticos y mide compute_learning_analytics y el mapa de
+actividad por semana ISO frente al pivot de una columna por fecha. La racha e
+intervalos de study_habits_from_days se comparan con el bucle anterior
+(`while day in dates`) solo para comprobar que dan lo mismo: ambos tardan
+parecido porque el costo lo pone el análisis de fechas, no el bucle.
+
+Uso: python bench_analytics.py [cantidad_de_filas]
+"""
+
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.analytics import calendar_heatmap, compute_learning_analytics, study_habits_from_days
+
+
+def build_history(rows: int, seed: int = 7):
+    """Filas columnares de difficulty_tracking y generated_exercises en ~3 años."""
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(date.today(), "s")
+    span = 3 * 365 * 24 * 3600
+    subjects = np.array([f"subject-{i}" for i in range(6)])
+    topics = np.array([f"Tema {i}" for i in range(120)])
+
+    difficulty = {
+        "topic": rng.choice(topics, rows),
+        "subject_id": rng.choice(subjects, rows),
+        "difficulty_level": rng.integers(1, 6, rows),
+        "success_count": rng.integers(0, 10, rows),
+        "error_count": rng.integers(0, 10, rows),
+        "last_practiced": (today - rng.integers(0, span, rows).astype("timedelta64[s]")).astype(str),
+    }
+    exercises = {
+        "subject_id": rng.choice(subjects, rows),
+        "completed": rng.random(rows) < 0.6,
+        "created_at": (today - rng.integers(0, span, rows).astype("timedelta64[s]")).astype(str),
+    }
+    names = {subject: f"Curso {index}" for index, subject in enumerate(subjects)}
+    return difficulty, exercises, names
+
+
+def legacy_habits(dates_column):
+    dates = sorted(set(dates_column))
+    current_streak = 0
+    day = date.today()
+    while day in dates:
+        current_streak += 1
+        day -= timedelta(days=1)
+    intervals = [(dates[i] - dates[i - 1]).days for i in range(1, len(dates))]
+    avg_interval = sum(intervals) / len(intervals) if intervals else 0
+    variance = pd.Series(intervals).var() if len(intervals) > 1 else 0
+    return current_streak, avg_interval, variance
+
+
+def legacy_heatmap(activity):
+    pivot = activity.pivot_table(
+        values="exercises",
+        index=pd.to_datetime(activity["day"]).dt.dayofweek,
+        columns=activity["day"].astype(str),
+        fill_value=0,
+    )
+    return pivot.reindex(index=range(7), fill_value=0)
+
+
+def timed(label, func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+    return result, best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    difficulty, exercises, names = build_history(rows)
+    print("=" * 60)
+    print(f"Indicadores sobre {rows:,} filas por tabla")
+    print("=" * 60)
+
+    analytics, _ = timed(
+        "compute_learning_analytics (todo)",
+        lambda: compute_learning_analytics(difficulty, exercises, names),
+    )
+
+    dates = pd.to_datetime(pd.Series(exercises["created_at"])).dt.date
+    legacy, legacy_time = timed("Racha/intervalos (bucle anterior)", lambda: legacy_habits(dates.tolist()))
+    habits, habits_time = timed("Racha/intervalos (study_habits_from_days)", lambda: study_habits_from_days(dates))
+
+    assert legacy[0] == habits.current_streak, "La racha difiere"
+    assert abs(legacy[1] - (habits.avg_interval_days or 0)) < 1e-9, "El intervalo difiere"
+    activity = analytics.activity
+    legacy_grid, _ = timed("Mapa de actividad (pivot por fecha)", lambda: legacy_heatmap(activity))
+    grid, _ = timed(
+        "Mapa de actividad (calendar_heatmap, 52 sem.)",
+        lambda: calendar_heatmap(activity["day"], activity["exercises"], weeks=52),
+    )
+    assert grid.total <= legacy_grid.to_numpy().sum(), "El mapa suma más que el historial"
+
+    print("-" * 60)
+    print(f"Celdas del mapa: {legacy_grid.size:,} (pivot) frente a {grid.counts.size:,} (52 semanas)")
+    print(f"Temas: {analytics.total_topics}  Días activos: {analytics.habits.active_days}")
+    print(f"Racha: {analytics.habits.current_streak}  Tasa de éxito: {analytics.success_rate:.1f}%")
+    print(f"Racha/intervalos, anterior / actual: x{legacy_time / habits_time:,.1f} (mismo resultado, sin mejora de tiempo)")
+
+
+if __name__ == "__main__":
+    main()
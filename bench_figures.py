@@ -0,0 +1,103 @@
+"""
+Benchmark del caché de figuras (utils/figures.py).
+Reproduce lo que hace `st.plotly_chart` con la figura recibida
+(`return_figure_from_figure_or_data` + `plotly.io.to_json`) y compara, para
+las figuras del panel de estadísticas, construirla en cada visita frente a
+reutilizarla desde el caché guardada como objeto `go.Figure`, como
+especificación JSON (reconstruida con `pio.from_json`) o como diccionario.
+
+Uso: python bench_figures.py [cantidad_de_filas]
+"""
+
+import sys
+import time
+
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import plotly.tools
+
+from bench_analytics import build_history
+from utils.analytics import calendar_heatmap, compute_learning_analytics
+from utils.figures import FigureCache
+
+DAY_LABELS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+# Mismas figuras que views/statistics.py (importarlo requiere la conexión a Supabase).
+def topic_difficulty_figure(df_plot):
+    fig = px.pie(df_plot, names="topic", values="avg_difficulty", hole=0.35)
+    fig.update_layout(legend_title="Temas")
+    return fig
+
+
+def daily_progress_figure(df_daily):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df_daily["day"], y=df_daily["success_count"], name="Éxitos"))
+    fig.add_trace(go.Scatter(x=df_daily["day"], y=df_daily["error_count"], name="Errores"))
+    fig.update_layout(xaxis_title="Fecha", yaxis_title="Cantidad")
+    return fig
+
+
+def activity_heatmap_figure(heatmap):
+    return px.imshow(
+        heatmap.counts,
+        labels=dict(x="Semana", y="Día", color="Ejercicios"),
+        x=heatmap.week_labels,
+        y=DAY_LABELS,
+        aspect="auto",
+        color_continuous_scale="YlGnBu",
+    )
+
+
+def streamlit_spec(figure_or_data):
+    """Trabajo que `st.plotly_chart` hace con su argumento antes de enviarlo."""
+    figure = plotly.tools.return_figure_from_figure_or_data(figure_or_data, validate_figure=True)
+    return pio.to_json(figure, validate=False)
+
+
+def timed(label, func, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    difficulty, exercises, names = build_history(rows)
+    analytics = compute_learning_analytics(difficulty, exercises, names)
+    heatmap = calendar_heatmap(analytics.activity["day"], analytics.activity["exercises"], weeks=52)
+    builders = {
+        "topic_difficulty": lambda: topic_difficulty_figure(
+            analytics.topics[["topic", "avg_difficulty"]].dropna()
+        ),
+        "daily_progress": lambda: daily_progress_figure(analytics.daily),
+        "activity_heatmap": lambda: activity_heatmap_figure(heatmap),
+    }
+
+    print("=" * 60)
+    print(f"Figuras del panel sobre {rows:,} filas por tabla")
+    print("=" * 60)
+    for kind, build in builders.items():
+        print(f"-- {kind}")
+        figure = build()
+        spec_json = figure.to_json()
+        spec_dict = figure.to_dict()
+        cache = FigureCache()
+        cache.get(kind, build)
+
+        uncached = timed("sin caché (construir + enviar)", lambda: streamlit_spec(build()))
+        timed("acierto: JSON + pio.from_json", lambda: streamlit_spec(pio.from_json(spec_json, skip_invalid=True)))
+        timed("acierto: diccionario", lambda: streamlit_spec(spec_dict))
+        hit = timed("acierto: go.Figure (FigureCache)", lambda: streamlit_spec(cache.get(kind, build)))
+        timed("fallo: construir + to_json (anterior)", lambda: (build().to_json(), streamlit_spec(figure)))
+        print(f"{'aceleración del acierto':<45} {uncached / hit:10.1f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark de la deduplicación de mensajes del chat.
+Compara el algoritmo anterior (pd.to_datetime y display_text por mensaje)
+con MessageDeduper sobre una transcripción sintética.
+
+Uso: python bench_messages.py [cantidad_de_mensajes]
+"""
+
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from utils.messages import MessageDeduper, dedup_messages, display_text
+
+
+def build_transcript(size: int):
+    """Genera mensajes alternando roles, con JSON, LaTeX y algunos duplicados."""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for index in range(size):
+        role = "user" if index % 2 == 0 else "assistant"
+        if role == "assistant":
+            content = json.dumps(
+                {"respuesta": f"Paso {index}: la derivada es (\\frac{{d}}{{dx}} x^{index % 7}) \\[x^2\\]"}
+            )
+        else:
+            content = f"Pregunta {index // 2} sobre \\(x^{index % 5}\\)"
+        created = start + timedelta(seconds=index * 3)
+        messages.append(
+            {"id": index, "role": role, "content": content, "created_at": created.isoformat()}
+        )
+        if index % 50 == 0:
+            # Duplicado consecutivo (reintento del webhook).
+            messages.append({**messages[-1], "id": f"dup-{index}"})
+    return messages
+
+
+def legacy_dedup(messages, window_seconds=5):
+    result = []
+    last = None
+
+    def _to_ts(message):
+        try:
+            return pd.to_datetime(message.get("created_at")).timestamp()
+        except Exception:
+            return None
+
+    for message in messages:
+        if not result:
+            result.append(message)
+            last = message
+            continue
+        same_role = message.get("role") == last.get("role")
+        same_text = display_text(message.get("content")) == display_text(last.get("content"))
+        if same_role and same_text:
+            current_ts, last_ts = _to_ts(message), _to_ts(last)
+            if current_ts is not None and last_ts is not None and abs(current_ts - last_ts) <= window_seconds:
+                continue
+        result.append(message)
+        last = message
+    return result
+
+
+def timed(label, func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<45} {best * 1000:10.2f} ms")
+    return result, best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = build_transcript(size)
+    print("=" * 60)
+    print(f"Deduplicación de {len(messages)} mensajes")
+    print("=" * 60)
+
+    legacy, legacy_time = timed("Anterior (pandas + display_text)", lambda: legacy_dedup(messages))
+    # Primera pasada: incluye la normalización de cada mensaje (una sola vez por id).
+    timed("MessageDeduper (primera pasada)", lambda: dedup_messages(messages), repeat=1)
+    current, current_time = timed("MessageDeduper (contenido ya normalizado)", lambda: dedup_messages(messages))
+
+    base = current[:-10]
+    tail = messages[-10:]
+    _, incremental_time = timed(
+        "Incremental (10 mensajes nuevos)",
+        lambda: MessageDeduper(5, base).extend(tail),
+    )
+
+    assert [m["id"] for m in legacy] == [m["id"] for m in current], "Los resultados difieren"
+    print("-" * 60)
+    print(f"Mensajes conservados: {len(current)}")
+    print(f"Aceleración (recarga):     x{legacy_time / current_time:,.1f}")
+    print(f"Aceleración (incremental): x{legacy_time / incremental_time:,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """Configuración centralizada para la aplicación Streamlit."""
 
+import os
+
 N8N_WEBHOOK_URL = "https://n8n.yamboly.lat/webhook/b4b0f8c6-7ec2-4672-bb84-31ec2b3e2c5c"
 SUPABASE_URL = "https://kxieicvtrimhozgrykex.supabase.co"
 SUPABASE_KEY = (
@@ -17,3 +19,104 @@ STUDENT_COURSES_COURSE_FIELD = "subject_id"
 STUDENT_NAME_FIELDS = ("full_name", "name", "first_name", "email")
 COURSE_NAME_FIELDS = ("title", "name")
 
+# Columnas que necesita el dashboard de alumnos (evita descargar filas completas).
+STUDENT_LIST_COLUMNS = "id, name, email"
+COURSE_LIST_COLUMNS = "id, name"
+
+# Consultas concurrentes de los paneles (estadísticas y reporte PDF).
+QUERY_BUNDLE_MAX_WORKERS = 8
+QUERY_BUNDLE_TIMEOUT = 30
+
+# Cliente HTTP del webhook de n8n.
+N8N_CONNECT_TIMEOUT = 5
+N8N_READ_TIMEOUT = 25
+N8N_POOL_CONNECTIONS = 4
+# Una conexión keep-alive por hilo de la cola del tutor (TUTOR_WORKERS).
+N8N_POOL_MAXSIZE = 32
+N8N_MAX_RETRIES = 2
+N8N_RETRY_BACKOFF = 0.5
+# Acciones que se reintentan si el envío no llegó a n8n (fallo al abrir la
+# conexión o 502/503); una conexión cortada tras enviar o un plazo de lectura
+# vencido no se reintentan. El chat envía además client_message_id como
+# cabecera Idempotency-Key, que solo evita duplicados si el flujo de n8n
+# descarta las claves repetidas.
+N8N_IDEMPOTENT_ACTIONS = ("chat",)
+
+# Cola de envíos al tutor (los hilos de trabajo llaman al webhook fuera del script).
+# Cada llamada pasa ~30 s esperando a n8n sin usar CPU, así que el límite de
+# hilos marca cuántos mensajes se atienden a la vez por proceso.
+TUTOR_WORKERS = 32
+TUTOR_QUEUE_SIZE = 200
+TUTOR_PENDING_POLL_SECONDS = 1.0
+TUTOR_JOB_TTL = 600
+
+# Aviso de mensajes nuevos: "realtime" (Supabase Realtime) o "memory" (solo en proceso).
+CHAT_FEED_BACKEND = "realtime"
+CHAT_FEED_WAIT_SLICE = 1.0
+# Segundos sin consultar una sesión tras los que el feed suelta su canal.
+CHAT_FEED_IDLE_TIMEOUT = 10 * 60
+# Clave de servicio para Realtime (RLS oculta los eventos a la clave anónima).
+# Solo se lee del entorno y solo la usa el feed, que no expone los mensajes.
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+# Importación masiva de matrículas desde CSV.
+ROSTER_IMPORT_BATCH_SIZE = 500
+ROSTER_EMAIL_COLUMNS = ("email", "correo", "student_email")
+ROSTER_COURSE_COLUMNS = ("course", "curso", "course_name", "subject")
+
+# Directorio privado (0700, solo el usuario del servidor) para los archivos
+# locales de la aplicación: caché compartido y almacén de sesiones.
+APP_STATE_DIR = os.environ.get("SANTOS_TUTOR_STATE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".santos_tutor"
+)
+
+# Caché de dos niveles para los helpers cached_* (LRU en proceso + SQLite local).
+CACHE_BACKEND = "sqlite"
+CACHE_SQLITE_PATH = os.path.join(APP_STATE_DIR, "cache.sqlite3")
+CACHE_L1_MAX_ENTRIES = 512
+CACHE_L1_MAX_AGE = 2.0
+CACHE_L2_MAX_ENTRIES = 10000
+
+# Stale-while-revalidate: segundos que un valor vencido puede servirse
+# mientras se recarga en segundo plano (después la recarga es síncrona).
+CACHE_CATALOG_MAX_STALE = 300
+CACHE_SUBSCRIPTIONS_MAX_STALE = 60
+
+# Almacén de sesiones de autenticación ("memory" o "sqlite").
+AUTH_STORE_BACKEND = "memory"
+AUTH_STORE_PATH = os.path.join(APP_STATE_DIR, "auth.sqlite3")
+AUTH_SESSION_TTL = 12 * 60 * 60
+AUTH_STORE_MAX_ENTRIES = 5000
+AUTH_STORE_SWEEP_INTERVAL = 60
+
+# Renovación anticipada de tokens de acceso.
+TOKEN_REFRESH_MARGIN = 120
+TOKEN_REFRESH_RETRY = 30
+TOKEN_REFRESH_IDLE_LIMIT = 60 * 60
+
+# Pool de clientes autenticados (uno por sesión de navegador).
+SUPABASE_CLIENT_POOL_SIZE = 64
+SUPABASE_CLIENT_IDLE_TIMEOUT = 15 * 60
+
+# Mensajes de chat normalizados que se conservan en memoria (por id).
+MESSAGE_RENDER_CACHE_SIZE = 5000
+
+# Ventana del chat: mensajes visibles al abrir una sesión y tamaño de cada
+# página al cargar mensajes anteriores.
+CHAT_WINDOW_SIZE = 50
+CHAT_PAGE_SIZE = 50
+
+# Sesiones de chat conservadas en memoria por el almacén de mensajes; al
+# superarse se descarta la usada hace más tiempo.
+CHAT_STORE_MAX_SESSIONS = 500
+
+# Copias incrementales de las estadísticas (alumnos conservados en memoria).
+STATS_SNAPSHOT_MAX_USERS = 1000
+
+# Figuras de Plotly que se conservan en memoria (por huella de datos).
+FIGURE_CACHE_MAX_ENTRIES = 256
+# Muestra en el panel de estadísticas los contadores de sus cachés.
+SHOW_CACHE_STATS = os.environ.get("SANTOS_TUTOR_SHOW_CACHE_STATS") == "1"
+
+# Ventanas (en semanas) del mapa de actividad del panel de estadísticas.
+ACTIVITY_HEATMAP_WEEKS = (12, 52)
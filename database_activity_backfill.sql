@@ -0,0 +1,58 @@
+-- ============================================================================
+-- CARGA INICIAL DEL RESUMEN DIARIO - SANTOS TUTOR
+-- Ejecutar justo después de database_activity_rollup.sql (se puede repetir)
+-- ============================================================================
+-- Rellena user_daily_activity a partir del historial existente. Para los datos
+-- previos a los triggers, los contadores de cada tema se asignan al día de su
+-- última práctica.
+--
+-- Reconstruye la tabla completa: borra lo que hubiera y la vuelve a calcular
+-- desde las tablas de origen, así que los totales siempre coinciden con ellas
+-- aunque los triggers ya hayan registrado actividad. Los incrementos de
+-- dificultad que los triggers habían repartido por día pasan al día de la
+-- última práctica de cada tema. Bloquea las tablas de origen y la de destino
+-- mientras copia para que ningún trigger escriba a medio cálculo. Si la app
+-- ya está en marcha, reiníciala después para descartar las estadísticas que
+-- guarda en memoria.
+BEGIN;
+
+LOCK TABLE generated_exercises, difficulty_tracking, user_daily_activity
+    IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM user_daily_activity;
+
+INSERT INTO user_daily_activity (user_id, subject_id, day, exercises, completed, successes, errors)
+SELECT
+    src.user_id,
+    src.subject_id,
+    src.day,
+    SUM(src.exercises),
+    SUM(src.completed),
+    SUM(src.successes),
+    SUM(src.errors)
+FROM (
+    SELECT
+        ge.user_id,
+        COALESCE(ge.subject_id, '00000000-0000-0000-0000-000000000000') AS subject_id,
+        (ge.created_at AT TIME ZONE 'UTC')::DATE AS day,
+        1 AS exercises,
+        COALESCE(ge.completed, FALSE)::INTEGER AS completed,
+        0 AS successes,
+        0 AS errors
+    FROM generated_exercises ge
+    WHERE ge.user_id IS NOT NULL AND ge.created_at IS NOT NULL
+    UNION ALL
+    SELECT
+        dt.user_id,
+        COALESCE(dt.subject_id, '00000000-0000-0000-0000-000000000000'),
+        (dt.last_practiced AT TIME ZONE 'UTC')::DATE,
+        0,
+        0,
+        COALESCE(dt.success_count, 0),
+        COALESCE(dt.error_count, 0)
+    FROM difficulty_tracking dt
+    WHERE dt.user_id IS NOT NULL AND dt.last_practiced IS NOT NULL
+) AS src
+GROUP BY src.user_id, src.subject_id, src.day;
+
+COMMIT;
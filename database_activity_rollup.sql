@@ -0,0 +1,256 @@
+-- ============================================================================
+-- RESUMEN DIARIO DE ACTIVIDAD - SANTOS TUTOR
+-- Ejecutar después de database_schema.sql y antes de database_stats_functions.sql.
+-- Se puede volver a ejecutar sin tocar los datos; la carga inicial desde el
+-- historial está aparte, en database_activity_backfill.sql.
+-- ============================================================================
+-- user_daily_activity guarda una fila por (alumno, curso, día) con los
+-- ejercicios generados/completados y los éxitos/errores registrados ese día.
+-- La mantienen los triggers de generated_exercises y difficulty_tracking, de
+-- modo que la racha, el progreso diario y el mapa de actividad leen como
+-- máximo 365 filas por curso y año en lugar del historial completo.
+
+-- ============================================================================
+-- TABLA
+-- ============================================================================
+-- Los registros sin curso se agrupan bajo el UUID nulo para que la clave
+-- primaria no admita duplicados con subject_id NULL.
+CREATE TABLE IF NOT EXISTS user_daily_activity (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    subject_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    day DATE NOT NULL,
+    exercises INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, subject_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_daily_activity_user_day ON user_daily_activity(user_id, day);
+
+ALTER TABLE user_daily_activity ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own daily activity" ON user_daily_activity;
+CREATE POLICY "Users can view own daily activity" ON user_daily_activity
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- ============================================================================
+-- ACUMULADOR
+-- ============================================================================
+-- Suma los deltas indicados a la fila del día (creándola si no existe). Corre
+-- con los permisos del propietario porque los alumnos no escriben la tabla
+-- directamente.
+CREATE OR REPLACE FUNCTION bump_daily_activity(
+    p_user_id UUID,
+    p_subject_id UUID,
+    p_at TIMESTAMP WITH TIME ZONE,
+    p_exercises INTEGER,
+    p_completed INTEGER,
+    p_successes INTEGER,
+    p_errors INTEGER
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_at IS NULL THEN
+        RETURN;
+    END IF;
+    IF p_exercises = 0 AND p_completed = 0 AND p_successes = 0 AND p_errors = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO user_daily_activity AS uda
+        (user_id, subject_id, day, exercises, completed, successes, errors)
+    VALUES (
+        p_user_id,
+        COALESCE(p_subject_id, '00000000-0000-0000-0000-000000000000'),
+        (p_at AT TIME ZONE 'UTC')::DATE,
+        p_exercises,
+        p_completed,
+        p_successes,
+        p_errors
+    )
+    ON CONFLICT (user_id, subject_id, day) DO UPDATE SET
+        exercises = uda.exercises + EXCLUDED.exercises,
+        completed = uda.completed + EXCLUDED.completed,
+        successes = uda.successes + EXCLUDED.successes,
+        errors = uda.errors + EXCLUDED.errors,
+        updated_at = NOW();
+END;
+$$;
+
+-- ============================================================================
+-- TRIGGER DE EJERCICIOS GENERADOS
+-- ============================================================================
+-- Cada ejercicio cuenta en el día de su creación; al completarse suma
+-- `completed` en ese mismo día.
+CREATE OR REPLACE FUNCTION track_exercise_activity()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_daily_activity(
+            OLD.user_id, OLD.subject_id, OLD.created_at,
+            -1, -(COALESCE(OLD.completed, FALSE)::INTEGER), 0, 0
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_daily_activity(
+            NEW.user_id, NEW.subject_id, NEW.created_at,
+            1, COALESCE(NEW.completed, FALSE)::INTEGER, 0, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_exercise_daily_activity ON generated_exercises;
+CREATE TRIGGER trg_exercise_daily_activity
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, subject_id, created_at, completed
+    ON generated_exercises
+    FOR EACH ROW
+    EXECUTE FUNCTION track_exercise_activity();
+
+-- ============================================================================
+-- MARCA DE MODIFICACIÓN DE difficulty_tracking
+-- ============================================================================
+-- Este trigger marca cada cambio en `updated_at`, la marca que usan las
+-- estadísticas incrementales y el día al que el resumen diario asigna los
+-- incrementos de los contadores. `last_practiced` no se toca: la fijan n8n y
+-- la app.
+ALTER TABLE difficulty_tracking
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_difficulty_user_updated ON difficulty_tracking(user_id, updated_at);
+
+CREATE OR REPLACE FUNCTION touch_difficulty_tracking()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_difficulty_touch ON difficulty_tracking;
+CREATE TRIGGER trg_difficulty_touch
+    BEFORE UPDATE ON difficulty_tracking
+    FOR EACH ROW
+    EXECUTE FUNCTION touch_difficulty_tracking();
+
+-- ============================================================================
+-- TRIGGER DE SEGUIMIENTO DE DIFICULTADES
+-- ============================================================================
+-- difficulty_tracking guarda contadores acumulados por tema; al actualizarse se
+-- registra solo el incremento, en el día de la modificación (`updated_at`,
+-- que fija trg_difficulty_touch). Al insertar, borrar o mover una fila de
+-- alumno o curso se suman o descuentan sus totales en el día de su última
+-- práctica.
+CREATE OR REPLACE FUNCTION track_difficulty_activity()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_daily_activity(
+            NEW.user_id, NEW.subject_id, NEW.last_practiced,
+            0, 0, COALESCE(NEW.success_count, 0), COALESCE(NEW.error_count, 0)
+        );
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bump_daily_activity(
+            OLD.user_id, OLD.subject_id, OLD.last_practiced,
+            0, 0, -COALESCE(OLD.success_count, 0), -COALESCE(OLD.error_count, 0)
+        );
+    ELSIF NEW.user_id IS DISTINCT FROM OLD.user_id
+        OR NEW.subject_id IS DISTINCT FROM OLD.subject_id THEN
+        PERFORM bump_daily_activity(
+            OLD.user_id, OLD.subject_id, OLD.last_practiced,
+            0, 0, -COALESCE(OLD.success_count, 0), -COALESCE(OLD.error_count, 0)
+        );
+        PERFORM bump_daily_activity(
+            NEW.user_id, NEW.subject_id, NEW.last_practiced,
+            0, 0, COALESCE(NEW.success_count, 0), COALESCE(NEW.error_count, 0)
+        );
+    ELSE
+        PERFORM bump_daily_activity(
+            NEW.user_id, NEW.subject_id, COALESCE(NEW.updated_at, NOW()),
+            0, 0,
+            COALESCE(NEW.success_count, 0) - COALESCE(OLD.success_count, 0),
+            COALESCE(NEW.error_count, 0) - COALESCE(OLD.error_count, 0)
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_difficulty_daily_activity ON difficulty_tracking;
+CREATE TRIGGER trg_difficulty_daily_activity
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, subject_id, success_count, error_count
+    ON difficulty_tracking
+    FOR EACH ROW
+    EXECUTE FUNCTION track_difficulty_activity();
+
+-- ============================================================================
+-- LECTURA
+-- ============================================================================
+-- Actividad por día (sumando cursos) desde `p_since`, o todo el historial.
+-- Con `p_updated_since` solo devuelve los días con cambios posteriores a esa
+-- marca (con sus totales completos), para actualizar copias incrementales.
+CREATE OR REPLACE FUNCTION get_daily_activity(
+    p_user_id UUID,
+    p_since DATE DEFAULT NULL,
+    p_updated_since TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (
+    day DATE,
+    exercises BIGINT,
+    completed BIGINT,
+    success_count BIGINT,
+    error_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        uda.day,
+        SUM(uda.exercises)::BIGINT,
+        SUM(uda.completed)::BIGINT,
+        SUM(uda.successes)::BIGINT,
+        SUM(uda.errors)::BIGINT
+    FROM user_daily_activity uda
+    WHERE uda.user_id = p_user_id
+      AND (p_since IS NULL OR uda.day >= p_since)
+      AND (
+          p_updated_since IS NULL
+          OR uda.day IN (
+              SELECT changed.day
+              FROM user_daily_activity changed
+              WHERE changed.user_id = p_user_id
+                AND changed.updated_at >= p_updated_since
+          )
+      )
+    GROUP BY uda.day
+    ORDER BY uda.day;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_daily_activity(UUID, DATE, TIMESTAMP WITH TIME ZONE) TO authenticated;
+
+-- bump_daily_activity es SECURITY DEFINER y escribe cualquier fila: no debe
+-- poder llamarse por /rpc. En Supabase los privilegios por defecto del esquema
+-- public conceden EXECUTE a anon y authenticated además de a PUBLIC, así que
+-- hay que retirarlo de los tres. Los triggers la siguen invocando con los
+-- permisos del propietario.
+REVOKE EXECUTE ON FUNCTION bump_daily_activity(UUID, UUID, TIMESTAMP WITH TIME ZONE, INTEGER, INTEGER, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION track_exercise_activity() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION track_difficulty_activity() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION touch_difficulty_tracking() FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,87 @@
+-- ============================================================================
+-- FUNCIONES DE ASIGNACIÓN DE CURSOS - SANTOS TUTOR
+-- Ejecutar después de database_schema.sql
+-- ============================================================================
+-- Sincronizan user_subscriptions calculando la diferencia en el servidor:
+-- solo se insertan (o reactivan) los pares nuevos y se desactivan los
+-- retirados, conservando el historial en is_active. Se ejecutan con los
+-- permisos del invocador, por lo que las políticas RLS siguen aplicándose.
+
+-- ============================================================================
+-- SINCRONIZACIÓN DE UN ALUMNO
+-- ============================================================================
+-- Devuelve los cursos activos del alumno después de aplicar los cambios.
+CREATE OR REPLACE FUNCTION sync_student_courses(p_student_id UUID, p_course_ids UUID[])
+RETURNS TABLE (course_id UUID)
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE user_subscriptions us
+    SET is_active = FALSE
+    WHERE us.user_id = p_student_id
+      AND us.is_active
+      AND NOT (us.subject_id = ANY(COALESCE(p_course_ids, '{}'::UUID[])));
+
+    INSERT INTO user_subscriptions (user_id, subject_id, is_active)
+    SELECT DISTINCT p_student_id, c.subject_id
+    FROM unnest(COALESCE(p_course_ids, '{}'::UUID[])) AS c(subject_id)
+    ON CONFLICT (user_id, subject_id) DO UPDATE
+        SET is_active = TRUE
+        WHERE user_subscriptions.is_active IS DISTINCT FROM TRUE;
+
+    SELECT us.subject_id
+    FROM user_subscriptions us
+    WHERE us.user_id = p_student_id
+      AND us.is_active;
+$$;
+
+-- ============================================================================
+-- SINCRONIZACIÓN MASIVA (matriz alumno -> cursos)
+-- ============================================================================
+-- p_assignments: {"<student_id>": ["<subject_id>", ...], ...}
+-- Cada alumno incluido queda exactamente con la lista indicada; los alumnos
+-- que no aparecen no se modifican. Devuelve cuántos pares se agregaron y
+-- cuántos se desactivaron por alumno.
+CREATE OR REPLACE FUNCTION sync_student_courses_bulk(p_assignments JSONB)
+RETURNS TABLE (student_id UUID, added_count BIGINT, removed_count BIGINT)
+LANGUAGE sql
+VOLATILE
+AS $$
+    WITH students AS (
+        SELECT key::UUID AS user_id
+        FROM jsonb_object_keys(COALESCE(p_assignments, '{}'::JSONB)) AS key
+    ),
+    desired AS (
+        SELECT DISTINCT e.key::UUID AS user_id, c.value::UUID AS subject_id
+        FROM jsonb_each(COALESCE(p_assignments, '{}'::JSONB)) AS e
+        CROSS JOIN LATERAL jsonb_array_elements_text(e.value) AS c(value)
+    ),
+    to_remove AS (
+        UPDATE user_subscriptions us
+        SET is_active = FALSE
+        FROM students s
+        WHERE us.user_id = s.user_id
+          AND us.is_active
+          AND NOT EXISTS (
+              SELECT 1 FROM desired d
+              WHERE d.user_id = us.user_id AND d.subject_id = us.subject_id
+          )
+        RETURNING us.user_id
+    ),
+    to_add AS (
+        INSERT INTO user_subscriptions (user_id, subject_id, is_active)
+        SELECT d.user_id, d.subject_id FROM desired d
+        ON CONFLICT (user_id, subject_id) DO UPDATE
+            SET is_active = TRUE
+            WHERE user_subscriptions.is_active IS DISTINCT FROM TRUE
+        RETURNING user_subscriptions.user_id
+    )
+    SELECT
+        s.user_id,
+        (SELECT COUNT(*) FROM to_add a WHERE a.user_id = s.user_id)::BIGINT,
+        (SELECT COUNT(*) FROM to_remove r WHERE r.user_id = s.user_id)::BIGINT
+    FROM students s;
+$$;
+
+GRANT EXECUTE ON FUNCTION sync_student_courses(UUID, UUID[]) TO authenticated;
+GRANT EXECUTE ON FUNCTION sync_student_courses_bulk(JSONB) TO authenticated;
@@ -78,7 +78,8 @@ CREATE TABLE IF NOT EXISTS difficulty_tracking (
     error_count INTEGER DEFAULT 0,
     success_count INTEGER DEFAULT 0,
     last_practiced TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- ============================================================================
@@ -301,6 +302,25 @@ CREATE POLICY "Users can insert own payments" ON payments
     FOR INSERT
     WITH CHECK (auth.uid() = user_id);
 
+-- ============================================================================
+-- REALTIME PARA MENSAJES DEL CHAT
+-- ============================================================================
+-- Publica las inserciones de chat_messages para que la aplicación reciba
+-- avisos de mensajes nuevos sin consultar la tabla periódicamente. Con RLS
+-- activo los eventos solo llegan a quien puede leer la fila, por eso el feed
+-- de la aplicación se conecta con SUPABASE_SERVICE_ROLE_KEY (ver
+-- services/chat_feed.py).
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+       AND NOT EXISTS (
+           SELECT 1 FROM pg_publication_tables
+           WHERE pubname = 'supabase_realtime' AND tablename = 'chat_messages'
+       ) THEN
+        ALTER PUBLICATION supabase_realtime ADD TABLE chat_messages;
+    END IF;
+END $$;
+
 -- ============================================================================
 -- COMENTARIOS EN TABLAS Y COLUMNAS
 -- ============================================================================
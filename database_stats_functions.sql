@@ -0,0 +1,296 @@
+-- ============================================================================
+-- FUNCIONES DE AGREGACIÓN PARA EL PANEL DE ESTADÍSTICAS - SANTOS TUTOR
+-- Ejecutar después de database_schema.sql y database_activity_rollup.sql
+-- ============================================================================
+-- Cada función devuelve solo el resultado agregado que necesita la vista, de
+-- modo que el tamaño de la respuesta no crece con el historial del alumno.
+-- Se ejecutan con los permisos del invocador (SECURITY INVOKER), por lo que
+-- las políticas RLS de difficulty_tracking y generated_exercises siguen
+-- aplicándose.
+
+-- ============================================================================
+-- ÍNDICES DE APOYO
+-- ============================================================================
+CREATE INDEX IF NOT EXISTS idx_exercises_user_created ON generated_exercises(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_difficulty_user_practiced ON difficulty_tracking(user_id, last_practiced);
+
+-- ============================================================================
+-- SUMAS POR TEMA Y CURSO
+-- ============================================================================
+-- Una fila por (tema, curso) con las sumas de las que la aplicación deriva los
+-- resúmenes por tema, por curso y globales (ver RunningStatistics en
+-- utils/analytics.py). Con `p_updated_since` solo devuelve los grupos con
+-- algún registro modificado desde esa marca, con sus totales completos, de
+-- modo que la copia de cada alumno se actualiza sin descargar filas sueltas.
+-- rate_sum replica el cálculo previo por curso: suma de la tasa de éxito de
+-- cada registro (los registros sin intentos cuentan 0).
+CREATE OR REPLACE FUNCTION get_difficulty_groups(
+    p_user_id UUID,
+    p_updated_since TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (
+    topic VARCHAR,
+    subject_id UUID,
+    row_count BIGINT,
+    level_sum DOUBLE PRECISION,
+    level_count BIGINT,
+    level_squares DOUBLE PRECISION,
+    success_count BIGINT,
+    error_count BIGINT,
+    rate_sum DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dt.topic,
+        dt.subject_id,
+        COUNT(*)::BIGINT,
+        COALESCE(SUM(dt.difficulty_level), 0)::DOUBLE PRECISION,
+        COUNT(dt.difficulty_level)::BIGINT,
+        COALESCE(SUM(dt.difficulty_level * dt.difficulty_level), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(dt.success_count), 0)::BIGINT,
+        COALESCE(SUM(dt.error_count), 0)::BIGINT,
+        COALESCE(SUM(
+            COALESCE(dt.success_count, 0)::DOUBLE PRECISION
+                / GREATEST(COALESCE(dt.success_count, 0) + COALESCE(dt.error_count, 0), 1)
+        ), 0)
+    FROM difficulty_tracking dt
+    WHERE dt.user_id = p_user_id
+      AND (
+          p_updated_since IS NULL
+          OR EXISTS (
+              SELECT 1
+              FROM difficulty_tracking changed
+              WHERE changed.user_id = p_user_id
+                AND changed.updated_at >= p_updated_since
+                AND changed.topic = dt.topic
+                AND changed.subject_id IS NOT DISTINCT FROM dt.subject_id
+          )
+      )
+    GROUP BY dt.topic, dt.subject_id;
+$$;
+
+-- ============================================================================
+-- RESUMEN POR TEMA
+-- ============================================================================
+CREATE OR REPLACE FUNCTION get_topic_stats(p_user_id UUID)
+RETURNS TABLE (
+    topic VARCHAR,
+    avg_difficulty DOUBLE PRECISION,
+    success_count BIGINT,
+    error_count BIGINT,
+    attempts BIGINT,
+    success_rate DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dt.topic,
+        AVG(dt.difficulty_level)::DOUBLE PRECISION,
+        COALESCE(SUM(dt.success_count), 0)::BIGINT,
+        COALESCE(SUM(dt.error_count), 0)::BIGINT,
+        COALESCE(SUM(dt.success_count + dt.error_count), 0)::BIGINT,
+        COALESCE(SUM(dt.success_count), 0)::DOUBLE PRECISION
+            / GREATEST(COALESCE(SUM(dt.success_count + dt.error_count), 0), 1)
+    FROM difficulty_tracking dt
+    WHERE dt.user_id = p_user_id
+    GROUP BY dt.topic
+    ORDER BY dt.topic;
+$$;
+
+-- ============================================================================
+-- RESUMEN POR CURSO
+-- ============================================================================
+-- avg_success_rate replica el cálculo previo: promedio de la tasa de éxito de
+-- cada registro de difficulty_tracking (los registros sin intentos cuentan 0).
+CREATE OR REPLACE FUNCTION get_course_stats(p_user_id UUID)
+RETURNS TABLE (
+    subject_id UUID,
+    course_name VARCHAR,
+    unique_topics BIGINT,
+    avg_success_rate DOUBLE PRECISION,
+    success_count BIGINT,
+    error_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dt.subject_id,
+        COALESCE(s.name, 'Sin curso')::VARCHAR,
+        COUNT(DISTINCT dt.topic)::BIGINT,
+        AVG(
+            COALESCE(dt.success_count, 0)::DOUBLE PRECISION
+                / GREATEST(COALESCE(dt.success_count, 0) + COALESCE(dt.error_count, 0), 1)
+        ),
+        COALESCE(SUM(dt.success_count), 0)::BIGINT,
+        COALESCE(SUM(dt.error_count), 0)::BIGINT
+    FROM difficulty_tracking dt
+    LEFT JOIN subjects s ON s.id = dt.subject_id
+    WHERE dt.user_id = p_user_id
+    GROUP BY dt.subject_id, s.name
+    ORDER BY 3 DESC;
+$$;
+
+-- ============================================================================
+-- PROGRESO Y ACTIVIDAD DIARIOS
+-- ============================================================================
+-- Se leen del resumen diario (user_daily_activity, ver
+-- database_activity_rollup.sql), que tiene a lo sumo una fila por curso y día.
+CREATE OR REPLACE FUNCTION get_daily_progress(p_user_id UUID)
+RETURNS TABLE (
+    day DATE,
+    success_count BIGINT,
+    error_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        uda.day,
+        SUM(uda.successes)::BIGINT,
+        SUM(uda.errors)::BIGINT
+    FROM user_daily_activity uda
+    WHERE uda.user_id = p_user_id
+    GROUP BY uda.day
+    HAVING SUM(uda.successes) <> 0 OR SUM(uda.errors) <> 0
+    ORDER BY uda.day;
+$$;
+
+CREATE OR REPLACE FUNCTION get_exercise_activity(p_user_id UUID)
+RETURNS TABLE (
+    day DATE,
+    exercises BIGINT,
+    completed BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        uda.day,
+        SUM(uda.exercises)::BIGINT,
+        SUM(uda.completed)::BIGINT
+    FROM user_daily_activity uda
+    WHERE uda.user_id = p_user_id
+    GROUP BY uda.day
+    HAVING SUM(uda.exercises) > 0
+    ORDER BY uda.day;
+$$;
+
+-- ============================================================================
+-- HÁBITOS DE ESTUDIO E INDICADORES GENERALES (una sola fila)
+-- ============================================================================
+-- La racha y los intervalos se calculan sobre los días con ejercicios
+-- (islas de días consecutivos).
+CREATE OR REPLACE FUNCTION get_study_habits(p_user_id UUID)
+RETURNS TABLE (
+    difficulty_rows BIGINT,
+    total_topics BIGINT,
+    avg_difficulty DOUBLE PRECISION,
+    difficulty_variance DOUBLE PRECISION,
+    total_success BIGINT,
+    total_errors BIGINT,
+    total_exercises BIGINT,
+    completed_exercises BIGINT,
+    active_days BIGINT,
+    current_streak BIGINT,
+    avg_interval_days DOUBLE PRECISION,
+    interval_variance DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH difficulty AS (
+        SELECT
+            COUNT(*)::BIGINT AS difficulty_rows,
+            COUNT(DISTINCT topic)::BIGINT AS total_topics,
+            AVG(difficulty_level)::DOUBLE PRECISION AS avg_difficulty,
+            VAR_SAMP(difficulty_level)::DOUBLE PRECISION AS difficulty_variance,
+            COALESCE(SUM(success_count), 0)::BIGINT AS total_success,
+            COALESCE(SUM(error_count), 0)::BIGINT AS total_errors
+        FROM difficulty_tracking
+        WHERE user_id = p_user_id
+    ),
+    days AS (
+        SELECT uda.day, SUM(uda.exercises) AS exercises, SUM(uda.completed) AS completed
+        FROM user_daily_activity uda
+        WHERE uda.user_id = p_user_id
+        GROUP BY uda.day
+        HAVING SUM(uda.exercises) > 0
+    ),
+    islands AS (
+        SELECT
+            day,
+            day - (ROW_NUMBER() OVER (ORDER BY day))::INTEGER AS grp,
+            day - LAG(day) OVER (ORDER BY day) AS gap
+        FROM days
+    ),
+    habits AS (
+        SELECT
+            COUNT(*)::BIGINT AS active_days,
+            COUNT(*) FILTER (
+                WHERE grp = (SELECT i.grp FROM islands i WHERE i.day = CURRENT_DATE)
+            )::BIGINT AS current_streak,
+            AVG(gap)::DOUBLE PRECISION AS avg_interval_days,
+            VAR_SAMP(gap)::DOUBLE PRECISION AS interval_variance
+        FROM islands
+    )
+    SELECT
+        d.difficulty_rows,
+        d.total_topics,
+        d.avg_difficulty,
+        d.difficulty_variance,
+        d.total_success,
+        d.total_errors,
+        (SELECT COALESCE(SUM(exercises), 0) FROM days)::BIGINT,
+        (SELECT COALESCE(SUM(completed), 0) FROM days)::BIGINT,
+        h.active_days,
+        h.current_streak,
+        h.avg_interval_days,
+        h.interval_variance
+    FROM difficulty d, habits h;
+$$;
+
+-- ============================================================================
+-- MARCA DE AGUA DE LAS ESTADÍSTICAS (una sola fila)
+-- ============================================================================
+-- Resume el estado de los datos del alumno con consultas sobre índices. Si la
+-- marca no cambió desde la última visita, la aplicación reutiliza su copia de
+-- las estadísticas; si cambió, solo pide las filas posteriores. La marca de
+-- difficulty_tracking es `updated_at` (ver trg_difficulty_touch en
+-- database_activity_rollup.sql), que también avanza cuando n8n actualiza los
+-- contadores; la suma de intentos permite además comprobar la copia.
+CREATE OR REPLACE FUNCTION get_stats_watermark(p_user_id UUID)
+RETURNS TABLE (
+    difficulty_rows BIGINT,
+    difficulty_attempts BIGINT,
+    difficulty_updated_at TIMESTAMP WITH TIME ZONE,
+    exercise_rows BIGINT,
+    last_exercise_at TIMESTAMP WITH TIME ZONE,
+    activity_updated_at TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM difficulty_tracking WHERE user_id = p_user_id)::BIGINT,
+        (
+            SELECT COALESCE(SUM(COALESCE(success_count, 0) + COALESCE(error_count, 0)), 0)
+            FROM difficulty_tracking
+            WHERE user_id = p_user_id
+        )::BIGINT,
+        (SELECT MAX(updated_at) FROM difficulty_tracking WHERE user_id = p_user_id),
+        (SELECT COALESCE(SUM(exercises), 0) FROM user_daily_activity WHERE user_id = p_user_id)::BIGINT,
+        (SELECT MAX(created_at) FROM generated_exercises WHERE user_id = p_user_id),
+        (SELECT MAX(updated_at) FROM user_daily_activity WHERE user_id = p_user_id);
+$$;
+
+GRANT EXECUTE ON FUNCTION get_difficulty_groups(UUID, TIMESTAMP WITH TIME ZONE) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_topic_stats(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_course_stats(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_daily_progress(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_exercise_activity(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_study_habits(UUID) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_stats_watermark(UUID) TO authenticated;
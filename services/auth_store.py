@@ -1,29 +1,278 @@
-"""Almacén en memoria para sesiones de autenticación."""
+"""Almacén de sesiones de autenticación con expiración y límite de tamaño.
 
-from typing import Any, Dict, Optional
+Cada entrada vence tras `AUTH_SESSION_TTL` segundos sin uso (la lectura
+renueva el plazo), y cuando se supera `AUTH_STORE_MAX_ENTRIES` se desaloja la
+que vence antes. Un hilo barre periódicamente las vencidas para que las
+pestañas abandonadas no acumulen memoria. Con `AUTH_STORE_BACKEND = "sqlite"`
+las sesiones se guardan en un archivo compartido por los procesos del host y
+sobreviven a un reinicio del servidor.
+"""
+
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
 import streamlit as st
 
+from config.settings import (
+    AUTH_SESSION_TTL,
+    AUTH_STORE_BACKEND,
+    AUTH_STORE_MAX_ENTRIES,
+    AUTH_STORE_PATH,
+    AUTH_STORE_SWEEP_INTERVAL,
+)
+from utils.private_files import ensure_private_file
+
+
+def _empty_metrics() -> Dict[str, int]:
+    return {"saves": 0, "hits": 0, "misses": 0, "deletes": 0, "evictions": 0, "expirations": 0}
+
+
+class MemoryAuthStore:
+    """Sesiones en memoria ordenadas por vencimiento (el más próximo primero).
+
+    Como el plazo es el mismo para todas y cada acceso lo renueva, el orden de
+    inserción/acceso del `OrderedDict` coincide con el de `expires_at`.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._metrics = _empty_metrics()
+
+    def save(self, token: str, record: Dict[str, Any]):
+        with self._lock:
+            self._entries[token] = (time.time() + self._ttl, record)
+            self._entries.move_to_end(token)
+            self._metrics["saves"] += 1
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def load(self, token: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._metrics["misses"] += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[token]
+                self._metrics["expirations"] += 1
+                self._metrics["misses"] += 1
+                return None
+            self._entries[token] = (now + self._ttl, entry[1])
+            self._entries.move_to_end(token)
+            self._metrics["hits"] += 1
+            return entry[1]
+
+    def delete(self, token: str):
+        with self._lock:
+            if self._entries.pop(token, None) is not None:
+                self._metrics["deletes"] += 1
+
+    def sweep(self) -> int:
+        """Elimina las entradas vencidas y devuelve cuántas se borraron."""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._entries:
+                token, (expires_at, _) = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                del self._entries[token]
+                removed += 1
+            self._metrics["expirations"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._entries),
+                "max_entries": self._max_entries,
+                **self._metrics,
+            }
+
+
+class SQLiteAuthStore:
+    """Sesiones en un archivo SQLite compartido por los procesos del host.
+
+    El archivo es 0600 dentro de un directorio privado y no guarda nada
+    utilizable sin el `auth_token` del navegador: cada fila se indexa por un
+    hash del token y su contenido (tokens de Supabase incluidos) va cifrado con
+    Fernet usando una clave derivada del mismo token.
+
+    Para no escribir en cada lectura, el vencimiento solo se renueva cuando ha
+    pasado más de `touch_interval` segundos desde la última renovación.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, touch_interval: float = 60.0):
+        self._path = path
+        self._ttl = ttl
+        self._max_entries = max(1, max_entries)
+        self._touch_interval = touch_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._metrics = _empty_metrics()
+        ensure_private_file(path)
+        conn = self._connect()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(auth_sessions)")}
+        if "token" in columns:
+            # Versión anterior con tokens en claro: se descarta (los usuarios
+            # vuelven a iniciar sesión).
+            conn.execute("DROP TABLE auth_sessions")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS auth_sessions ("
+            " token_hash TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL,"
+            " data BLOB NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_auth_sessions_expires ON auth_sessions(expires_at)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._metrics[counter] += amount
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        return hashlib.sha256(f"auth-store:id:{token}".encode()).hexdigest()
+
+    @staticmethod
+    def _fernet(token: str):
+        from cryptography.fernet import Fernet
+
+        key = hashlib.sha256(f"auth-store:key:{token}".encode()).digest()
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def save(self, token: str, record: Dict[str, Any]):
+        conn = self._connect()
+        data = self._fernet(token).encrypt(json.dumps(record, default=str).encode())
+        conn.execute(
+            "INSERT OR REPLACE INTO auth_sessions (token_hash, expires_at, data) VALUES (?, ?, ?)",
+            (self._token_hash(token), time.time() + self._ttl, data),
+        )
+        self._count("saves")
+        overflow = conn.execute("SELECT COUNT(*) FROM auth_sessions").fetchone()[0] - self._max_entries
+        if overflow > 0:
+            evicted = conn.execute(
+                "DELETE FROM auth_sessions WHERE token_hash IN ("
+                " SELECT token_hash FROM auth_sessions ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            self._count("evictions", evicted)
+
+    def load(self, token: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._connect()
+        token_hash = self._token_hash(token)
+        row = conn.execute(
+            "SELECT expires_at, data FROM auth_sessions WHERE token_hash = ?", (token_hash,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        expires_at, data = row
+        if expires_at <= now:
+            conn.execute("DELETE FROM auth_sessions WHERE token_hash = ?", (token_hash,))
+            self._count("expirations")
+            self._count("misses")
+            return None
+        from cryptography.fernet import InvalidToken
+
+        try:
+            record = json.loads(self._fernet(token).decrypt(data))
+        except (InvalidToken, ValueError):
+            conn.execute("DELETE FROM auth_sessions WHERE token_hash = ?", (token_hash,))
+            self._count("misses")
+            return None
+        if now + self._ttl - expires_at > self._touch_interval:
+            conn.execute(
+                "UPDATE auth_sessions SET expires_at = ? WHERE token_hash = ?",
+                (now + self._ttl, token_hash),
+            )
+        self._count("hits")
+        return record
+
+    def delete(self, token: str):
+        deleted = self._connect().execute(
+            "DELETE FROM auth_sessions WHERE token_hash = ?", (self._token_hash(token),)
+        ).rowcount
+        self._count("deletes", deleted)
+
+    def sweep(self) -> int:
+        removed = self._connect().execute(
+            "DELETE FROM auth_sessions WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+        self._count("expirations", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        size = self._connect().execute("SELECT COUNT(*) FROM auth_sessions").fetchone()[0]
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "size": size,
+                "max_entries": self._max_entries,
+                **self._metrics,
+            }
+
+
+def _start_sweeper(store, interval: float):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.sweep()
+            except Exception:  # noqa: BLE001 - el barrido se reintenta en la siguiente vuelta
+                pass
+
+    threading.Thread(target=run, name="auth-store-sweeper", daemon=True).start()
+
 
 @st.cache_resource
-def _get_store() -> Dict[str, Dict[str, Any]]:
-    return {}
+def _get_store():
+    if AUTH_STORE_BACKEND == "sqlite":
+        store = SQLiteAuthStore(AUTH_STORE_PATH, AUTH_SESSION_TTL, AUTH_STORE_MAX_ENTRIES)
+    else:
+        store = MemoryAuthStore(AUTH_SESSION_TTL, AUTH_STORE_MAX_ENTRIES)
+    _start_sweeper(store, AUTH_STORE_SWEEP_INTERVAL)
+    return store
 
 
 def save_auth_session(token: str, session_data: Dict[str, Any], user_data: Dict[str, Any]):
-    store = _get_store()
-    store[token] = {"session": session_data, "user": user_data}
+    _get_store().save(token, {"session": session_data, "user": user_data})
 
 
 def load_auth_session(token: Optional[str]) -> Optional[Dict[str, Any]]:
     if not token:
         return None
-    return _get_store().get(token)
+    return _get_store().load(token)
 
 
 def delete_auth_session(token: Optional[str]):
     if not token:
         return
-    store = _get_store()
-    store.pop(token, None)
+    _get_store().delete(token)
+
 
+def auth_store_stats() -> Dict[str, Any]:
+    """Tamaño del almacén y contadores de aciertos, desalojos y expiraciones."""
+    return _get_store().stats()
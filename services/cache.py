@@ -0,0 +1,305 @@
+"""Caché de dos niveles: LRU en proceso delante de un almacén SQLite compartido.
+
+Cuando varios procesos de Streamlit corren en el mismo host, el nivel 2
+(SQLite en modo WAL) permite que una consulta hecha por un proceso la
+aprovechen los demás. El nivel 1 evita tocar disco en las lecturas
+repetidas; sus entradas solo se consideran válidas durante `l1_max_age`
+segundos, lo que acota cuánto tarda un proceso en ver la invalidación hecha
+por otro.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.private_files import ensure_private_file
+
+MISSING = object()
+
+# (función, argumentos, ámbito): el ámbito separa las entradas de cada usuario
+# en las consultas filtradas por RLS (None en las compartidas).
+CacheKey = Tuple[str, Tuple, Optional[str]]
+
+
+def _empty_stats() -> Dict[str, int]:
+    return {
+        "l1_hits": 0,
+        "l2_hits": 0,
+        "misses": 0,
+        "sets": 0,
+        "invalidations": 0,
+        "evicted": 0,
+        "l1_evictions": 0,
+    }
+
+
+class LRUCache:
+    """Diccionario ordenado con límite de entradas y expiración por entrada."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        if entry[0] <= now:
+            del self._entries[key]
+            return MISSING
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: CacheKey, value: Any, expires_at: float) -> Optional[CacheKey]:
+        """Guarda la entrada y devuelve la clave desalojada, si la hubo."""
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            return evicted
+        return None
+
+    def delete_args(self, name: str, args: Tuple) -> int:
+        """Elimina la entrada `(name, args)` de todos los ámbitos."""
+        keys = [key for key in self._entries if key[0] == name and key[1] == args]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def delete_name(self, name: str) -> int:
+        keys = [key for key in self._entries if key[0] == name]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class SQLiteCacheStore:
+    """Almacén compartido entre procesos del mismo host.
+
+    Los valores se guardan como JSON (nunca con pickle: leer el archivo no debe
+    poder ejecutar código) en un archivo 0600 dentro de un directorio privado.
+    Los valores que no son JSON solo quedan en el nivel 1. Cada hilo abre su
+    propia conexión porque `sqlite3` no permite compartirlas entre hilos.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self._path = path
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        ensure_private_file(path)
+        with self._connect() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+            if columns and "args" not in columns:
+                # Copia de una versión anterior sin ámbitos: se descarta entera.
+                conn.execute("DROP TABLE cache_entries")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " key TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " args TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " value TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_name ON cache_entries(name)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_args ON cache_entries(args)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_expires"
+                " ON cache_entries(expires_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _serialize_key(key: CacheKey) -> str:
+        return repr(key)
+
+    @staticmethod
+    def _serialize_args(name: str, args: Tuple) -> str:
+        return repr((name, args))
+
+    def get(self, key: CacheKey, now: float) -> Tuple[Any, float]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT expires_at, value FROM cache_entries WHERE key = ?",
+                (self._serialize_key(key),),
+            )
+            .fetchone()
+        )
+        if row is None or row[0] <= now:
+            return MISSING, 0.0
+        return json.loads(row[1]), row[0]
+
+    def set(self, key: CacheKey, value: Any, expires_at: float):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, name, args, expires_at, value)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                self._serialize_key(key),
+                key[0],
+                self._serialize_args(key[0], key[1]),
+                expires_at,
+                json.dumps(value, ensure_ascii=False, separators=(",", ":")),
+            ),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.purge(time.time())
+
+    def delete_args(self, name: str, args: Tuple) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM cache_entries WHERE args = ?", (self._serialize_args(name, args),)
+        )
+        return cursor.rowcount
+
+    def delete_name(self, name: str) -> int:
+        cursor = self._connect().execute("DELETE FROM cache_entries WHERE name = ?", (name,))
+        return cursor.rowcount
+
+    def purge(self, now: float) -> int:
+        """Elimina las entradas vencidas y, si hace falta, las que expiran antes."""
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self._max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                " SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        return removed
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class TwoTierCache:
+    """Busca primero en el LRU del proceso y después en el almacén compartido."""
+
+    def __init__(
+        self,
+        l1_max_entries: int,
+        l1_max_age: float,
+        l2: Optional[SQLiteCacheStore] = None,
+    ):
+        self._lock = threading.Lock()
+        self._l1 = LRUCache(l1_max_entries)
+        self._l1_max_age = l1_max_age
+        self._l2 = l2
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.l2_error: Optional[str] = None
+
+    def _count(self, name: str, counter: str, amount: int = 1):
+        self._stats.setdefault(name, _empty_stats())[counter] += amount
+
+    def _l1_expiry(self, expires_at: float, now: float) -> float:
+        if self._l2 is None:
+            return expires_at
+        return min(expires_at, now + self._l1_max_age)
+
+    def _l2_call(self, method: str, *args, default: Any = None) -> Any:
+        # Un fallo del almacén compartido (disco lleno, bloqueo prolongado)
+        # degrada el caché a solo nivel 1 en lugar de romper la vista.
+        try:
+            return getattr(self._l2, method)(*args)
+        except (sqlite3.Error, TypeError, ValueError, OSError) as exc:
+            self.l2_error = str(exc)
+            return default
+
+    def get(self, key: CacheKey) -> Any:
+        """Devuelve el valor cacheado o `MISSING`."""
+        name = key[0]
+        now = time.time()
+        with self._lock:
+            value = self._l1.get(key, now)
+            if value is not MISSING:
+                self._count(name, "l1_hits")
+                return value
+
+        if self._l2 is not None:
+            value, expires_at = self._l2_call("get", key, now, default=(MISSING, 0.0))
+            if value is not MISSING:
+                with self._lock:
+                    self._l1.set(key, value, self._l1_expiry(expires_at, now))
+                    self._count(name, "l2_hits")
+                return value
+
+        with self._lock:
+            self._count(name, "misses")
+        return MISSING
+
+    def set(self, key: CacheKey, value: Any, ttl: float):
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock:
+            evicted = self._l1.set(key, value, self._l1_expiry(expires_at, now))
+            self._count(key[0], "sets")
+            if evicted is not None:
+                self._count(evicted[0], "l1_evictions")
+        if self._l2 is not None:
+            self._l2_call("set", key, value, expires_at)
+
+    def invalidate(self, name: str, args: Optional[Tuple] = None) -> int:
+        """Elimina `(name, args)` en todos los ámbitos, o todas las de `name`, en ambos niveles."""
+        with self._lock:
+            if args is not None:
+                removed = self._l1.delete_args(name, args)
+            else:
+                removed = self._l1.delete_name(name)
+        if self._l2 is not None:
+            if args is not None:
+                removed = max(removed, self._l2_call("delete_args", name, args, default=0))
+            else:
+                removed = max(removed, self._l2_call("delete_name", name, default=0))
+        with self._lock:
+            self._count(name, "invalidations")
+            self._count(name, "evicted", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores por función, con aciertos totales y tasa de aciertos."""
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                hits = stats["l1_hits"] + stats["l2_hits"]
+                lookups = hits + stats["misses"]
+                result[name] = {
+                    **stats,
+                    "hits": hits,
+                    "hit_rate": hits / lookups if lookups else 0.0,
+                }
+            return result
+
+    def info(self) -> Dict[str, Any]:
+        """Tamaño de cada nivel y estado del almacén compartido."""
+        with self._lock:
+            info: Dict[str, Any] = {
+                "l1_entries": len(self._l1),
+                "l1_evictions": self._l1.evictions,
+                "l2_enabled": self._l2 is not None,
+            }
+        if self._l2 is not None:
+            info["l2_entries"] = self._l2_call("size", default=None)
+            info["l2_error"] = self.l2_error
+        return info
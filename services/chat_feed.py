@@ -0,0 +1,201 @@
+"""Avisos de mensajes nuevos en chat_messages, por sesión."""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import streamlit as st
+
+from config.settings import (
+    CHAT_FEED_BACKEND,
+    CHAT_FEED_IDLE_TIMEOUT,
+    SUPABASE_SERVICE_ROLE_KEY,
+    SUPABASE_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessChatFeed:
+    """Feed de cambios en memoria.
+
+    Cada sesión tiene un número de versión que aumenta con cada mensaje nuevo;
+    las vistas guardan la última versión vista y esperan a que cambie. Sirve
+    como implementación para pruebas y como respaldo cuando Realtime no está
+    disponible: la cola del tutor publica aquí las respuestas que recibe.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._versions: Dict[str, int] = {}
+
+    def version(self, session_id: Optional[str]) -> int:
+        if not session_id:
+            return 0
+        with self._cond:
+            return self._versions.get(session_id, 0)
+
+    def publish(self, session_id: Optional[str]):
+        """Registra un mensaje nuevo en la sesión y despierta a quien espere."""
+        if not session_id:
+            return
+        with self._cond:
+            self._versions[session_id] = self._versions.get(session_id, 0) + 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, session_id: str, since_version: int, timeout: float) -> int:
+        """Bloquea hasta que la versión supere `since_version` o venza el plazo."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._versions.get(session_id, 0) <= since_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._versions.get(session_id, 0)
+
+
+class SupabaseRealtimeChatFeed(InProcessChatFeed):
+    """Escucha las inserciones de chat_messages vía Supabase Realtime.
+
+    Con la clave anónima y sin JWT de usuario, RLS filtra todos los eventos de
+    `postgres_changes`, así que el feed se autentica con la clave de servicio.
+    Para no recibir los mensajes de todo el proyecto, solo se suscribe a las
+    sesiones que alguna vista está mirando (un canal con filtro `session_id`
+    por sesión) y suelta las que llevan `idle_timeout` segundos sin consultarse.
+
+    La suscripción corre en un hilo con su propio bucle asyncio. Si no se puede
+    establecer, el feed sigue funcionando en modo en proceso, `error` guarda el
+    motivo y se registra un aviso.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        table: str = "chat_messages",
+        idle_timeout: float = CHAT_FEED_IDLE_TIMEOUT,
+    ):
+        super().__init__()
+        self._url = url
+        self._key = key
+        self._table = table
+        self._idle_timeout = idle_timeout
+        self.error: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._channels: Dict[str, Any] = {}
+        self._watched: Dict[str, float] = {}
+        self._thread = threading.Thread(
+            target=self._run_loop, name="chat-feed-realtime", daemon=True
+        )
+        self._thread.start()
+
+    def version(self, session_id: Optional[str]) -> int:
+        self._watch(session_id)
+        return super().version(session_id)
+
+    def wait_for_change(self, session_id: str, since_version: int, timeout: float) -> int:
+        self._watch(session_id)
+        return super().wait_for_change(session_id, since_version, timeout)
+
+    def _watch(self, session_id: Optional[str]):
+        """Marca la sesión como observada y ajusta las suscripciones."""
+        if not session_id or self.error:
+            return
+        now = time.monotonic()
+        with self._cond:
+            is_new = session_id not in self._watched
+            self._watched[session_id] = now
+            idle = [
+                sid for sid, seen in self._watched.items() if now - seen > self._idle_timeout
+            ]
+            for sid in idle:
+                del self._watched[sid]
+            loop = self._loop
+        if loop is None:
+            # Aún conectando: `_listen` se suscribe a las sesiones observadas.
+            return
+        if is_new:
+            asyncio.run_coroutine_threadsafe(self._subscribe(session_id), loop)
+        for sid in idle:
+            asyncio.run_coroutine_threadsafe(self._unsubscribe(sid), loop)
+
+    def _run_loop(self):
+        try:
+            asyncio.run(self._listen())
+        except Exception as exc:  # noqa: BLE001 - se conserva el modo en proceso
+            self.error = str(exc)
+            logger.warning(
+                "Supabase Realtime no disponible; el feed del chat solo ve los "
+                "mensajes de este proceso: %s",
+                exc,
+            )
+
+    async def _listen(self):
+        from supabase import acreate_client
+
+        self._client = await acreate_client(self._url, self._key)
+        with self._cond:
+            self._loop = asyncio.get_running_loop()
+            pending = list(self._watched)
+        for session_id in pending:
+            await self._subscribe(session_id)
+        listen = getattr(self._client.realtime, "listen", None)
+        if callable(listen):
+            await listen()
+        else:
+            await asyncio.Event().wait()
+
+    async def _subscribe(self, session_id: str):
+        if session_id in self._channels:
+            return
+        channel = self._client.channel(f"{self._table}:{session_id}")
+        self._channels[session_id] = channel
+        channel.on_postgres_changes(
+            "INSERT",
+            schema="public",
+            table=self._table,
+            filter=f"session_id=eq.{session_id}",
+            callback=self._on_insert,
+        )
+        try:
+            await channel.subscribe()
+        except Exception as exc:  # noqa: BLE001 - esa sesión queda en modo en proceso
+            self._channels.pop(session_id, None)
+            logger.warning("No se pudo suscribir el feed a la sesión %s: %s", session_id, exc)
+
+    async def _unsubscribe(self, session_id: str):
+        channel = self._channels.pop(session_id, None)
+        if channel is None:
+            return
+        try:
+            await self._client.remove_channel(channel)
+        except Exception:  # noqa: BLE001 - soltar el canal es un mejor esfuerzo
+            pass
+
+    def _on_insert(self, payload):
+        if not isinstance(payload, dict):
+            return
+        record = (
+            (payload.get("data") or {}).get("record")
+            or payload.get("record")
+            or payload.get("new")
+            or {}
+        )
+        self.publish(record.get("session_id"))
+
+
+@st.cache_resource
+def get_chat_feed() -> InProcessChatFeed:
+    """Devuelve el feed de cambios configurado en `CHAT_FEED_BACKEND`."""
+    if CHAT_FEED_BACKEND == "realtime":
+        if SUPABASE_SERVICE_ROLE_KEY:
+            return SupabaseRealtimeChatFeed(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        logger.warning(
+            "CHAT_FEED_BACKEND='realtime' requiere SUPABASE_SERVICE_ROLE_KEY; "
+            "el feed del chat solo verá los mensajes de este proceso."
+        )
+    return InProcessChatFeed()
@@ -0,0 +1,161 @@
+"""Pool acotado de clientes de Supabase autenticados, uno por sesión de navegador."""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from config.settings import (
+    SUPABASE_CLIENT_IDLE_TIMEOUT,
+    SUPABASE_CLIENT_POOL_SIZE,
+    SUPABASE_KEY,
+    SUPABASE_URL,
+)
+from services.supabase_client import SupabaseClient
+
+
+class ClientPool:
+    """Asigna a cada `auth_token` su propio `SupabaseClient`.
+
+    Con un único cliente compartido, `set_session` de un usuario pisaba la
+    sesión de otro que estuviera a mitad de una consulta. Aquí cada sesión
+    tiene su cliente, que se descarta tras `idle_timeout` segundos sin uso o
+    cuando se necesita espacio (se desaloja el menos usado).
+
+    Todo cliente que sale del pool (desalojo o `release` en el logout) se
+    cierra, así que `max_clients` acota las conexiones HTTP abiertas. Quien
+    siga usando un cliente fuera del pool, como un script en curso o un
+    trabajo encolado, lo retiene con `hold`/`holding`; mientras tanto el
+    cliente queda retirado y se cierra en el último `unhold`.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], SupabaseClient],
+        max_clients: int = SUPABASE_CLIENT_POOL_SIZE,
+        idle_timeout: float = SUPABASE_CLIENT_IDLE_TIMEOUT,
+    ):
+        self._factory = factory
+        self._max_clients = max(1, max_clients)
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[str, Tuple[SupabaseClient, float]]" = OrderedDict()
+        # id(cliente) -> (cliente, nº de retenciones activas)
+        self._holds: Dict[int, Tuple[SupabaseClient, int]] = {}
+        # Clientes liberados con retenciones pendientes; se cierran al soltarlos.
+        self._retired: Set[int] = set()
+        self._metrics = {"created": 0, "reused": 0, "idle_evictions": 0, "capacity_evictions": 0}
+
+    def acquire(self, auth_token: str) -> SupabaseClient:
+        """Devuelve el cliente de `auth_token`, creándolo si hace falta."""
+        now = time.time()
+        to_close: List[SupabaseClient] = []
+        with self._lock:
+            to_close.extend(self._evict_idle_locked(now))
+            entry = self._clients.get(auth_token)
+            if entry is not None:
+                self._clients[auth_token] = (entry[0], now)
+                self._clients.move_to_end(auth_token)
+                self._metrics["reused"] += 1
+                client = entry[0]
+            else:
+                client = None
+        if client is None:
+            client = self._factory()
+            with self._lock:
+                existing = self._clients.get(auth_token)
+                if existing is not None:
+                    # Otro hilo lo creó mientras tanto; se usa el suyo.
+                    to_close.append(client)
+                    client = existing[0]
+                else:
+                    self._clients[auth_token] = (client, now)
+                    self._metrics["created"] += 1
+                    while len(self._clients) > self._max_clients:
+                        _, (evicted, _) = self._clients.popitem(last=False)
+                        self._metrics["capacity_evictions"] += 1
+                        if self._retire_locked(evicted):
+                            to_close.append(evicted)
+        for stale in to_close:
+            stale.close()
+        return client
+
+    def release(self, auth_token: Optional[str]):
+        """Cierra y descarta el cliente de `auth_token` (logout)."""
+        if not auth_token:
+            return
+        with self._lock:
+            entry = self._clients.pop(auth_token, None)
+            if entry is None:
+                return
+            if not self._retire_locked(entry[0]):
+                return
+        entry[0].close()
+
+    def hold(self, client: SupabaseClient):
+        """Impide que el pool cierre `client` hasta el `unhold` correspondiente."""
+        with self._lock:
+            _, count = self._holds.get(id(client), (client, 0))
+            self._holds[id(client)] = (client, count + 1)
+
+    def unhold(self, client: SupabaseClient):
+        """Suelta una retención; cierra el cliente si ya se había liberado."""
+        with self._lock:
+            entry = self._holds.get(id(client))
+            if entry is None:
+                return
+            if entry[1] > 1:
+                self._holds[id(client)] = (client, entry[1] - 1)
+                return
+            del self._holds[id(client)]
+            if id(client) not in self._retired:
+                return
+            self._retired.discard(id(client))
+        client.close()
+
+    @contextmanager
+    def holding(self, client: SupabaseClient) -> Iterator[SupabaseClient]:
+        """Retiene `client` mientras dura el bloque."""
+        self.hold(client)
+        try:
+            yield client
+        finally:
+            self.unhold(client)
+
+    def _retire_locked(self, client: SupabaseClient) -> bool:
+        """Saca `client` del servicio; devuelve si ya se puede cerrar."""
+        if id(client) in self._holds:
+            self._retired.add(id(client))
+            return False
+        return True
+
+    def _evict_idle_locked(self, now: float) -> List[SupabaseClient]:
+        evicted = []
+        while self._clients:
+            auth_token, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self._idle_timeout:
+                break
+            del self._clients[auth_token]
+            self._metrics["idle_evictions"] += 1
+            if self._retire_locked(client):
+                evicted.append(client)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "max_clients": self._max_clients,
+                "held_clients": len(self._holds),
+                "retired_clients": len(self._retired),
+                **self._metrics,
+            }
+
+
+@st.cache_resource
+def get_client_pool() -> ClientPool:
+    """Devuelve el pool de clientes autenticados del proceso."""
+    return ClientPool(factory=lambda: SupabaseClient(SUPABASE_URL, SUPABASE_KEY))
@@ -0,0 +1,178 @@
+"""Almacén incremental de mensajes de chat por sesión."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+
+from config.settings import CHAT_PAGE_SIZE, CHAT_STORE_MAX_SESSIONS, CHAT_WINDOW_SIZE
+from utils.messages import MessageDeduper, ingest_messages
+
+
+class ChatMessageStore:
+    """Mantiene una copia de cada sesión y solo descarga las filas nuevas.
+
+    Cada sesión recuerda la marca (`created_at`) del último mensaje conocido y los
+    ids ya vistos; la consulta incremental usa `gte` sobre esa marca y descarta
+    los ids repetidos, de modo que los mensajes con la misma marca no se pierden.
+    La primera carga trae solo los `window_size` mensajes más recientes; los
+    anteriores se piden por páginas con `load_older`. Las copias se separan por
+    `owner` (el ámbito del cliente que las descargó), porque cada una refleja lo
+    que las políticas RLS permiten ver a ese usuario. Se conservan como máximo
+    `max_sessions` copias; al superarse se descarta la usada hace más tiempo,
+    que se vuelve a descargar si alguien la abre de nuevo.
+    """
+
+    def __init__(
+        self,
+        window_size: int = CHAT_WINDOW_SIZE,
+        max_sessions: int = CHAT_STORE_MAX_SESSIONS,
+    ):
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[Tuple[Optional[str], str], Dict[str, Any]]" = OrderedDict()
+        self._window_size = window_size
+        self._max_sessions = max(1, max_sessions)
+
+    def _entry(self, session_id: str, owner: Optional[str] = None) -> Dict[str, Any]:
+        key = (owner, session_id)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = {
+                    "lock": threading.Lock(),
+                    "messages": [],
+                    "ids": set(),
+                    "watermark": None,
+                    "synced_at": 0.0,
+                    "has_older": False,
+                    "deduper": MessageDeduper(),
+                }
+                self._sessions[key] = entry
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+            return entry
+
+    @staticmethod
+    def _merge(entry: Dict[str, Any], rows: Iterable[dict]) -> int:
+        added = 0
+        new_rows = []
+        previous_last = entry["messages"][-1].get("created_at", "") if entry["messages"] else ""
+        for row in rows or []:
+            row_id = row.get("id")
+            if row_id is not None and row_id in entry["ids"]:
+                continue
+            if row_id is not None:
+                entry["ids"].add(row_id)
+            entry["messages"].append(row)
+            new_rows.append(row)
+            created = row.get("created_at")
+            if created and (entry["watermark"] is None or created > entry["watermark"]):
+                entry["watermark"] = created
+            added += 1
+        if added:
+            entry["messages"].sort(key=lambda x: x.get("created_at", ""))
+            # El contenido se normaliza una sola vez, al incorporarse al almacén.
+            ingest_messages(new_rows)
+            if all(row.get("created_at", "") >= previous_last for row in new_rows):
+                new_rows.sort(key=lambda x: x.get("created_at", ""))
+                entry["deduper"].extend(new_rows)
+            else:
+                # Llegó un mensaje anterior a la cola: se reconstruye la lista.
+                entry["deduper"] = MessageDeduper()
+                entry["deduper"].extend(entry["messages"])
+        return added
+
+    @staticmethod
+    def _snapshot(entry: Dict[str, Any], deduped: bool) -> List[dict]:
+        return list(entry["deduper"].messages if deduped else entry["messages"])
+
+    def sync(
+        self,
+        client,
+        session_id: str,
+        max_age: float = 0,
+        deduped: bool = False,
+        owner: Optional[str] = None,
+    ) -> List[dict]:
+        """Descarga los mensajes posteriores a la marca y devuelve la lista completa.
+
+        Si la última sincronización ocurrió hace menos de `max_age` segundos se
+        devuelve la copia local sin consultar Supabase. Con `deduped` se
+        devuelve la lista sin duplicados consecutivos, mantenida al incorporar
+        cada lote.
+        """
+        entry = self._entry(session_id, owner)
+        with entry["lock"]:
+            if max_age and time.time() - entry["synced_at"] < max_age:
+                return self._snapshot(entry, deduped)
+            if entry["watermark"] is None:
+                rows = client.get_chat_messages_page(session_id, limit=self._window_size) or []
+                entry["has_older"] = len(rows) >= self._window_size
+            else:
+                rows = client.get_chat_messages(session_id, since=entry["watermark"]) or []
+            self._merge(entry, rows)
+            entry["synced_at"] = time.time()
+            return self._snapshot(entry, deduped)
+
+    def load_older(
+        self,
+        client,
+        session_id: str,
+        limit: int = CHAT_PAGE_SIZE,
+        owner: Optional[str] = None,
+    ) -> bool:
+        """Carga la página anterior al mensaje más antiguo conocido.
+
+        Devuelve si quedan mensajes más antiguos por cargar.
+        """
+        entry = self._entry(session_id, owner)
+        with entry["lock"]:
+            if not entry["messages"]:
+                return False
+            oldest = entry["messages"][0].get("created_at")
+            rows = client.get_chat_messages_page(session_id, before=oldest, limit=limit) or []
+            added = self._merge(entry, rows)
+            # `lte` repite los mensajes con la misma marca; si la página no
+            # trajo nada nuevo ya no quedan anteriores.
+            entry["has_older"] = added > 0 and len(rows) >= limit
+            return entry["has_older"]
+
+    def has_older(self, session_id: str, owner: Optional[str] = None) -> bool:
+        return self._entry(session_id, owner)["has_older"]
+
+    def append(self, session_id: str, rows: Iterable[dict], owner: Optional[str] = None) -> int:
+        """Incorpora filas ya conocidas (p. ej. devueltas por un insert)."""
+        entry = self._entry(session_id, owner)
+        with entry["lock"]:
+            return self._merge(entry, rows)
+
+    def get(
+        self, session_id: str, deduped: bool = False, owner: Optional[str] = None
+    ) -> List[dict]:
+        entry = self._entry(session_id, owner)
+        with entry["lock"]:
+            return self._snapshot(entry, deduped)
+
+    def watermark(self, session_id: str, owner: Optional[str] = None) -> Optional[str]:
+        return self._entry(session_id, owner)["watermark"]
+
+    def reset(self, session_id: Optional[str] = None):
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                for key in [key for key in self._sessions if key[1] == session_id]:
+                    del self._sessions[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self._max_sessions}
+
+
+@st.cache_resource
+def get_message_store() -> ChatMessageStore:
+    """Devuelve el almacén de mensajes compartido por el proceso."""
+    return ChatMessageStore()
@@ -0,0 +1,143 @@
+"""Carga concurrente de consultas independientes a Supabase."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import streamlit as st
+
+from config.settings import QUERY_BUNDLE_MAX_WORKERS, QUERY_BUNDLE_TIMEOUT
+from services.supabase_client import (
+    DIFFICULTY_STATS_COLUMNS,
+    EXERCISE_STATS_COLUMNS,
+    SUBJECT_NAME_COLUMNS,
+    SupabaseClient,
+)
+
+
+@st.cache_resource
+def _get_executor() -> ThreadPoolExecutor:
+    """Pool de hilos acotado y compartido por todas las sesiones del proceso."""
+    return ThreadPoolExecutor(
+        max_workers=QUERY_BUNDLE_MAX_WORKERS, thread_name_prefix="supabase-bundle"
+    )
+
+
+@dataclass
+class QueryResult:
+    """Resultado de una consulta individual del lote."""
+
+    name: str
+    data: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class QueryBundle:
+    """Resultados de un lote de consultas con sus tiempos y errores."""
+
+    results: Dict[str, QueryResult] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def get(self, name: str, default: Any = None) -> Any:
+        result = self.results.get(name)
+        if result is None or result.error is not None or result.data is None:
+            return default
+        return result.data
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        return {name: result.elapsed for name, result in self.results.items()}
+
+    @property
+    def errors(self) -> Dict[str, BaseException]:
+        return {
+            name: result.error for name, result in self.results.items() if result.error is not None
+        }
+
+    def raise_for_errors(self, names: Optional[List[str]] = None):
+        """Propaga el primer error de las consultas indicadas (o de todas)."""
+        for name in names or list(self.results):
+            result = self.results.get(name)
+            if result is not None and result.error is not None:
+                raise result.error
+
+
+def _timed(name: str, query: Callable[[], Any]) -> QueryResult:
+    start = time.perf_counter()
+    try:
+        data = query()
+        return QueryResult(name=name, data=data, elapsed=time.perf_counter() - start)
+    except Exception as exc:  # noqa: BLE001 - el error se reporta en el resultado
+        return QueryResult(name=name, error=exc, elapsed=time.perf_counter() - start)
+
+
+def load_bundle(
+    queries: Dict[str, Callable[[], Any]], timeout: float = QUERY_BUNDLE_TIMEOUT
+) -> QueryBundle:
+    """Ejecuta las consultas en paralelo; la latencia total es la de la más lenta."""
+    start = time.perf_counter()
+    executor = _get_executor()
+    futures = {name: executor.submit(_timed, name, query) for name, query in queries.items()}
+
+    bundle = QueryBundle()
+    deadline = start + timeout
+    for name, future in futures.items():
+        try:
+            bundle.results[name] = future.result(timeout=max(deadline - time.perf_counter(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            bundle.results[name] = QueryResult(
+                name=name,
+                error=TimeoutError(f"La consulta '{name}' superó {timeout} s"),
+                elapsed=time.perf_counter() - start,
+            )
+    bundle.elapsed = time.perf_counter() - start
+    return bundle
+
+
+@dataclass
+class ReportData:
+    """Datos que necesita el reporte PDF."""
+
+    difficulty: List[Dict]
+    exercises: List[Dict]
+    chat_sessions: List[Dict]
+    subscriptions: List[Dict]
+    subjects: List[Dict]
+    daily_activity: List[Dict]
+    bundle: QueryBundle
+
+
+def load_report_data(sb_client: SupabaseClient, user_id: str) -> ReportData:
+    bundle = load_bundle(
+        {
+            "difficulty": lambda: sb_client.get_difficulty_stats(
+                user_id, columns=DIFFICULTY_STATS_COLUMNS
+            ),
+            "exercises": lambda: sb_client.get_exercise_stats(
+                user_id, columns=EXERCISE_STATS_COLUMNS
+            ),
+            "chat_sessions": lambda: sb_client.get_chat_sessions(user_id),
+            "subscriptions": lambda: sb_client.get_user_subscriptions(user_id),
+            "subjects": lambda: sb_client.get_subjects(SUBJECT_NAME_COLUMNS),
+            "daily_activity": lambda: sb_client.get_daily_activity(user_id),
+        }
+    )
+    bundle.raise_for_errors(["difficulty", "exercises", "chat_sessions", "subjects"])
+    return ReportData(
+        difficulty=bundle.get("difficulty", []),
+        exercises=bundle.get("exercises", []),
+        chat_sessions=bundle.get("chat_sessions", []),
+        subscriptions=bundle.get("subscriptions", []),
+        subjects=bundle.get("subjects", []),
+        daily_activity=bundle.get("daily_activity", []),
+        bundle=bundle,
+    )
@@ -0,0 +1,143 @@
+"""Importación masiva de matrículas (alumno, curso) desde un CSV."""
+
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from typing import IO, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from config.settings import (
+    ROSTER_COURSE_COLUMNS,
+    ROSTER_EMAIL_COLUMNS,
+    ROSTER_IMPORT_BATCH_SIZE,
+    STUDENT_COURSES_COURSE_FIELD,
+    STUDENT_COURSES_STUDENT_FIELD,
+)
+from services.supabase_client import SupabaseClient
+
+
+@dataclass
+class RosterPlan:
+    """Diferencia entre el CSV y las asignaciones activas (resultado del dry-run)."""
+
+    rows_read: int = 0
+    to_add: List[Tuple[str, str]] = field(default_factory=list)
+    already_assigned: int = 0
+    duplicates: int = 0
+    unknown_students: List[Tuple[int, str]] = field(default_factory=list)
+    unknown_courses: List[Tuple[int, str]] = field(default_factory=list)
+    invalid_rows: List[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+@dataclass
+class RosterImportReport:
+    """Resultado de aplicar un plan de importación."""
+
+    inserted: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.inserted / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _pick_column(fieldnames: Iterable[str], candidates: Iterable[str]) -> Optional[str]:
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized[candidate]
+    return None
+
+
+def _text_stream(source: Union[IO[bytes], IO[str]]) -> IO[str]:
+    if isinstance(source, io.TextIOBase):
+        return source
+    # Los archivos subidos con Streamlit son binarios; se decodifican al vuelo.
+    return io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+
+
+def plan_roster_import(
+    source: Union[IO[bytes], IO[str]],
+    students: Iterable[Dict],
+    courses: Iterable[Dict],
+    relations: Iterable[Dict],
+) -> RosterPlan:
+    """Lee el CSV fila a fila y calcula qué pares (alumno, curso) faltan por registrar.
+
+    Los alumnos se resuelven por email y los cursos por nombre (sin distinguir
+    mayúsculas) contra los catálogos ya cacheados.
+    """
+    start = time.perf_counter()
+    student_by_email = {
+        str(student.get("email")).strip().lower(): student["id"]
+        for student in students
+        if student.get("email") and student.get("id")
+    }
+    course_by_name = {
+        str(course.get("name")).strip().casefold(): course["id"]
+        for course in courses
+        if course.get("name") and course.get("id")
+    }
+    existing: Set[Tuple[str, str]] = {
+        (relation.get(STUDENT_COURSES_STUDENT_FIELD), relation.get(STUDENT_COURSES_COURSE_FIELD))
+        for relation in relations
+    }
+
+    reader = csv.DictReader(_text_stream(source))
+    email_column = _pick_column(reader.fieldnames or [], ROSTER_EMAIL_COLUMNS)
+    course_column = _pick_column(reader.fieldnames or [], ROSTER_COURSE_COLUMNS)
+    if not email_column or not course_column:
+        raise ValueError(
+            "El CSV debe tener una columna de email "
+            f"({', '.join(ROSTER_EMAIL_COLUMNS)}) y una de curso "
+            f"({', '.join(ROSTER_COURSE_COLUMNS)})."
+        )
+
+    plan = RosterPlan()
+    seen: Set[Tuple[str, str]] = set()
+    # La línea 1 es el encabezado.
+    for line_number, row in enumerate(reader, start=2):
+        plan.rows_read += 1
+        email = (row.get(email_column) or "").strip().lower()
+        course_name = (row.get(course_column) or "").strip()
+        if not email or not course_name:
+            plan.invalid_rows.append(line_number)
+            continue
+
+        student_id = student_by_email.get(email)
+        course_id = course_by_name.get(course_name.casefold())
+        if student_id is None:
+            plan.unknown_students.append((line_number, email))
+        if course_id is None:
+            plan.unknown_courses.append((line_number, course_name))
+        if student_id is None or course_id is None:
+            continue
+
+        pair = (student_id, course_id)
+        if pair in seen:
+            plan.duplicates += 1
+            continue
+        seen.add(pair)
+        if pair in existing:
+            plan.already_assigned += 1
+            continue
+        plan.to_add.append(pair)
+
+    plan.elapsed = time.perf_counter() - start
+    return plan
+
+
+def apply_roster_import(
+    client: SupabaseClient, plan: RosterPlan, batch_size: int = ROSTER_IMPORT_BATCH_SIZE
+) -> RosterImportReport:
+    """Registra los pares del plan mediante upserts por lotes."""
+    report = RosterImportReport()
+    start = time.perf_counter()
+    for offset in range(0, len(plan.to_add), batch_size):
+        batch = plan.to_add[offset : offset + batch_size]
+        report.inserted += client.upsert_student_courses(batch)
+        report.batches += 1
+    report.elapsed = time.perf_counter() - start
+    return report
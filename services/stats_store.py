@@ -0,0 +1,159 @@
+"""Copia incremental de las estadísticas de cada alumno."""
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional
+
+import streamlit as st
+
+from config.settings import STATS_SNAPSHOT_MAX_USERS
+from services.query_bundle import load_bundle
+from services.supabase_client import SUBJECT_NAME_COLUMNS
+from utils.analytics import LearningAnalytics, RunningStatistics
+
+
+class StatisticsStore:
+    """Conserva por alumno las sumas de sus estadísticas y la marca con que se calcularon.
+
+    Cada visita solo consulta `get_stats_watermark`. Si la marca no cambió se
+    devuelve el resultado guardado; si avanzó se descargan las sumas de los
+    grupos (tema, curso) y los días de actividad modificados desde la marca
+    anterior y se incorporan a la copia. Tanto la carga completa como la
+    incremental piden sumas agregadas en Postgres, nunca los registros sueltos.
+    Si después los conteos o la suma de intentos no coinciden con la marca
+    (p. ej. se borraron filas) se recalcula todo.
+    """
+
+    def __init__(self, max_users: int = STATS_SNAPSHOT_MAX_USERS):
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._max_users = max(1, max_users)
+        self.hits = 0
+        self.folds = 0
+        self.rebuilds = 0
+
+    def _entry(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = {
+                    "lock": threading.Lock(),
+                    "stats": None,
+                    "names": {},
+                    "watermark": None,
+                    "analytics": None,
+                    "day": None,
+                }
+                self._users[user_id] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self._max_users:
+                self._users.popitem(last=False)
+            return entry
+
+    @staticmethod
+    def _load_names(client, entry: Dict[str, Any]):
+        subjects = client.get_subjects(SUBJECT_NAME_COLUMNS) or []
+        entry["names"] = {row.get("id"): row.get("name") for row in subjects}
+
+    def _rebuild(self, client, user_id: str, entry: Dict[str, Any]):
+        bundle = load_bundle(
+            {
+                "difficulty": lambda: client.get_difficulty_groups(user_id),
+                "daily_activity": lambda: client.get_daily_activity(user_id),
+                "subjects": lambda: client.get_subjects(SUBJECT_NAME_COLUMNS),
+            }
+        )
+        bundle.raise_for_errors()
+        stats = RunningStatistics()
+        stats.fold_difficulty_groups(bundle.get("difficulty", []))
+        stats.fold_daily_activity(bundle.get("daily_activity", []))
+        entry["stats"] = stats
+        entry["names"] = {row.get("id"): row.get("name") for row in bundle.get("subjects", [])}
+        self.rebuilds += 1
+
+    def _fold(self, client, user_id: str, entry: Dict[str, Any], watermark: Dict[str, Any]):
+        previous = entry["watermark"] or {}
+        queries = {}
+        if any(
+            watermark.get(name) != previous.get(name)
+            for name in ("difficulty_updated_at", "difficulty_rows", "difficulty_attempts")
+        ):
+            since = previous.get("difficulty_updated_at")
+            queries["difficulty"] = lambda: client.get_difficulty_groups(
+                user_id, updated_since=since
+            )
+        if (
+            watermark.get("activity_updated_at") != previous.get("activity_updated_at")
+            or watermark.get("exercise_rows") != previous.get("exercise_rows")
+        ):
+            updated_since = previous.get("activity_updated_at")
+            queries["daily_activity"] = lambda: client.get_daily_activity(
+                user_id, updated_since=updated_since
+            )
+        if queries:
+            bundle = load_bundle(queries)
+            bundle.raise_for_errors()
+            # Las consultas usan `>=`: los grupos y días con la misma marca
+            # vuelven a llegar y se reemplazan sin duplicarse.
+            entry["stats"].fold_difficulty_groups(bundle.get("difficulty", []))
+            entry["stats"].fold_daily_activity(bundle.get("daily_activity", []))
+        self.folds += 1
+
+    @staticmethod
+    def _consistent(stats: RunningStatistics, watermark: Dict[str, Any]) -> bool:
+        return (
+            stats.difficulty_rows == int(watermark.get("difficulty_rows") or 0)
+            and stats.difficulty_attempts == int(watermark.get("difficulty_attempts") or 0)
+            and stats.exercise_rows == int(watermark.get("exercise_rows") or 0)
+        )
+
+    def load(self, client, user_id: str, today: Optional[date] = None) -> LearningAnalytics:
+        """Devuelve las estadísticas del alumno, recalculando solo lo que cambió."""
+        today = today or date.today()
+        entry = self._entry(user_id)
+        with entry["lock"]:
+            watermark = client.get_stats_watermark(user_id) or {}
+            if (
+                entry["analytics"] is not None
+                and entry["watermark"] == watermark
+                and entry["day"] == today
+            ):
+                self.hits += 1
+                return entry["analytics"]
+
+            if entry["stats"] is None:
+                self._rebuild(client, user_id, entry)
+            elif entry["watermark"] != watermark:
+                self._fold(client, user_id, entry, watermark)
+                if not self._consistent(entry["stats"], watermark):
+                    self._rebuild(client, user_id, entry)
+            if not entry["stats"].subject_ids() <= set(entry["names"]):
+                self._load_names(client, entry)
+
+            entry["watermark"] = watermark
+            entry["day"] = today
+            entry["analytics"] = entry["stats"].to_analytics(entry["names"], today=today)
+            return entry["analytics"]
+
+    def reset(self, user_id: Optional[str] = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "hits": self.hits,
+                "folds": self.folds,
+                "rebuilds": self.rebuilds,
+            }
+
+
+@st.cache_resource
+def get_stats_store() -> StatisticsStore:
+    """Devuelve el almacén de estadísticas compartido por el proceso."""
+    return StatisticsStore()
@@ -1,6 +1,6 @@
 """Cliente de Supabase para encapsular operaciones relacionadas con la base de datos y autenticación."""
 
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import supabase
 
@@ -12,6 +12,19 @@ from config.settings import (
     STUDENTS_TABLE,
 )
 
+# Proyecciones de columnas reutilizadas por las vistas.
+DIFFICULTY_STATS_COLUMNS = (
+    "topic, subject_id, difficulty_level, success_count, error_count, last_practiced"
+)
+EXERCISE_STATS_COLUMNS = "subject_id, completed, created_at"
+# La lista incluye la respuesta del alumno para mostrarla en los completados;
+# el enunciado y la solución, que son los textos largos, quedan para el detalle.
+EXERCISE_LIST_COLUMNS = (
+    "id, user_id, subject_id, topic, difficulty_level, completed, user_answer, created_at"
+)
+EXERCISE_DETAIL_COLUMNS = "id, exercise_text, solution, user_answer"
+SUBJECT_NAME_COLUMNS = "id, name"
+
 
 class SupabaseClient:
     """Encapsula el cliente de Supabase y operaciones frecuentes."""
@@ -30,6 +43,12 @@ class SupabaseClient:
         if not key or not key.strip():
             raise ValueError("SUPABASE_KEY no puede estar vacía. Verifica config/settings.py")
         
+        # Tokens aplicados con `set_session`, para no repetir la llamada (y su
+        # posible ida y vuelta a Auth) cuando no han cambiado.
+        self._applied_tokens: Optional[Tuple[str, str]] = None
+        # Lo marca `close`; un cliente cerrado no debe volver a usarse.
+        self.closed = False
+
         try:
             self.client = supabase.create_client(url, key)
         except Exception as e:
@@ -56,6 +75,7 @@ class SupabaseClient:
 
     def sign_out(self):
         """Cierra la sesión activa en Supabase."""
+        self._applied_tokens = None
         return self.client.auth.sign_out()
 
     def get_session(self):
@@ -65,19 +85,57 @@ class SupabaseClient:
             return getter()
         return getattr(self.client.auth, "session", None)
 
-    def set_session(self, access_token: str, refresh_token: str):
-        """Establece tokens para reutilizar sesiones entre recargas."""
+    def set_session(self, access_token: str, refresh_token: str, force: bool = False):
+        """Establece tokens para reutilizar sesiones entre recargas.
+
+        Si los tokens son los mismos que ya se aplicaron no se hace nada, salvo
+        que `force` sea True.
+        """
+        tokens = (access_token, refresh_token)
+        if not force and self._applied_tokens == tokens:
+            return None
         setter = getattr(self.client.auth, "set_session", None)
         if callable(setter):
-            return setter(access_token, refresh_token)
+            result = setter(access_token, refresh_token)
+            self._applied_tokens = tokens
+            return result
         # Fallback para versiones que exponen directamente los atributos.
         self.client.auth._access_token = access_token  # type: ignore[attr-defined]  # noqa: SLF001
         self.client.auth._refresh_token = refresh_token  # type: ignore[attr-defined]  # noqa: SLF001
         self.client.auth.session = getattr(self.client.auth, "session", {}) or {}
         self.client.auth.session["access_token"] = access_token
         self.client.auth.session["refresh_token"] = refresh_token
+        self._applied_tokens = tokens
         return self.client.auth.session
 
+    def refresh_session(self, refresh_token: str):
+        """Canjea el refresh token por una sesión nueva."""
+        result = self.client.auth.refresh_session(refresh_token)
+        session = getattr(result, "session", None)
+        if session is None and isinstance(result, dict):
+            session = result.get("session")
+        access_token = getattr(session, "access_token", None)
+        new_refresh = getattr(session, "refresh_token", None)
+        if access_token and new_refresh:
+            self._applied_tokens = (access_token, new_refresh)
+        return session
+
+    def close(self):
+        """Cierra las conexiones HTTP abiertas por el cliente."""
+        self.closed = True
+        self._applied_tokens = None
+        for owner, attr in (
+            (getattr(self.client, "_postgrest", None), "session"),
+            (getattr(self.client, "auth", None), "_http_client"),
+        ):
+            http_client = getattr(owner, attr, None)
+            close = getattr(http_client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:  # noqa: BLE001 - cerrar es un mejor esfuerzo
+                    pass
+
     def get_current_user(self):
         """Obtiene el usuario autenticado actual."""
         getter = getattr(self.client.auth, "get_user", None)
@@ -108,14 +166,36 @@ class SupabaseClient:
         )
         return response.data
 
-    def get_chat_messages(self, session_id: str):
-        response = (
+    def get_chat_messages(self, session_id: str, since: Optional[str] = None):
+        """Obtiene los mensajes de la sesión; con `since` solo los creados desde esa marca."""
+        query = (
             self.client.table("chat_messages")
             .select("*")
             .eq("session_id", session_id)
-            .order("created_at", desc=False)
-            .execute()
         )
+        if since:
+            query = query.gte("created_at", since)
+        response = query.order("created_at", desc=False).execute()
+        data = response.data or []
+        data.sort(key=lambda x: x.get("created_at", ""))
+        return data
+
+    def get_chat_messages_page(
+        self, session_id: str, before: Optional[str] = None, limit: int = 50
+    ):
+        """Obtiene los `limit` mensajes más recientes de la sesión creados hasta `before`.
+
+        Paginación por clave (`created_at`): cada página se pide con la marca
+        del mensaje más antiguo ya cargado, sin OFFSET.
+        """
+        query = (
+            self.client.table("chat_messages")
+            .select("*")
+            .eq("session_id", session_id)
+        )
+        if before:
+            query = query.lte("created_at", before)
+        response = query.order("created_at", desc=True).limit(limit).execute()
         data = response.data or []
         data.sort(key=lambda x: x.get("created_at", ""))
         return data
@@ -168,11 +248,11 @@ class SupabaseClient:
     # Estadísticas y ejercicios
     # ------------------------------------------------------------------
 
-    def get_difficulty_stats(self, user_id: str, subject_id: str = None):
+    def get_difficulty_stats(self, user_id: str, subject_id: str = None, columns: str = "*"):
 
         query = (
             self.client.table("difficulty_tracking")
-            .select("*")
+            .select(columns)
             .eq("user_id", user_id)
         )
 
@@ -182,41 +262,111 @@ class SupabaseClient:
         response = query.execute()
         return response.data
     
-    def get_subjects(self):
+    def get_subjects(self, columns: str = "*"):
         """Retorna todas las materias activas."""
         response = (
             self.client.table("subjects")
-            .select("*")
+            .select(columns)
             .order("created_at", desc=False)
             .execute()
         )
         return response.data
 
 
-    def get_exercise_stats(self, user_id: str):
+    def get_exercise_stats(self, user_id: str, columns: str = "*"):
         response = (
             self.client.table("generated_exercises")
-            .select("*")
+            .select(columns)
             .eq("user_id", user_id)
             .execute()
         )
         return response.data
 
+    def get_exercise_detail(self, exercise_id: str, columns: str = EXERCISE_DETAIL_COLUMNS):
+        """Recupera los campos de texto extensos de un único ejercicio."""
+        response = (
+            self.client.table("generated_exercises")
+            .select(columns)
+            .eq("id", exercise_id)
+            .limit(1)
+            .execute()
+        )
+        data = response.data or []
+        return data[0] if data else None
+
+    # ------------------------------------------------------------------
+    # Agregados calculados en Postgres (ver database_stats_functions.sql)
+    # ------------------------------------------------------------------
+    def _rpc(self, function: str, params: Dict):
+        response = self.client.rpc(function, params).execute()
+        return response.data or []
+
+    def get_difficulty_groups(self, user_id: str, updated_since: Optional[str] = None) -> List[Dict]:
+        """Sumas de dificultad, éxitos y errores por (tema, curso).
+
+        Con `updated_since` solo se devuelven los grupos modificados desde esa marca.
+        """
+        return self._rpc(
+            "get_difficulty_groups", {"p_user_id": user_id, "p_updated_since": updated_since}
+        )
+
+    def get_topic_stats(self, user_id: str) -> List[Dict]:
+        """Éxitos, errores y dificultad promedio agrupados por tema."""
+        return self._rpc("get_topic_stats", {"p_user_id": user_id})
+
+    def get_course_stats(self, user_id: str) -> List[Dict]:
+        """Temas únicos y tasa de éxito promedio por curso."""
+        return self._rpc("get_course_stats", {"p_user_id": user_id})
+
+    def get_daily_progress(self, user_id: str) -> List[Dict]:
+        """Éxitos y errores agrupados por día."""
+        return self._rpc("get_daily_progress", {"p_user_id": user_id})
+
+    def get_exercise_activity(self, user_id: str) -> List[Dict]:
+        """Ejercicios generados y completados por día."""
+        return self._rpc("get_exercise_activity", {"p_user_id": user_id})
+
+    def get_study_habits(self, user_id: str) -> Dict:
+        """Indicadores generales, racha e intervalos entre días de estudio."""
+        data = self._rpc("get_study_habits", {"p_user_id": user_id})
+        if isinstance(data, list):
+            return data[0] if data else {}
+        return data or {}
+
+    def get_daily_activity(
+        self, user_id: str, since: Optional[str] = None, updated_since: Optional[str] = None
+    ) -> List[Dict]:
+        """Ejercicios, completados, éxitos y errores por día (desde `since`, ISO).
+
+        Con `updated_since` solo se devuelven los días modificados desde esa marca.
+        """
+        return self._rpc(
+            "get_daily_activity",
+            {"p_user_id": user_id, "p_since": since, "p_updated_since": updated_since},
+        )
+
+    def get_stats_watermark(self, user_id: str) -> Dict:
+        """Conteos y marcas de tiempo máximas de los datos de estadísticas del alumno."""
+        data = self._rpc("get_stats_watermark", {"p_user_id": user_id})
+        if isinstance(data, list):
+            return data[0] if data else {}
+        return data or {}
+
     # ------------------------------------------------------------------
     # Gestión de alumnos y cursos
     # ------------------------------------------------------------------
-    def get_students(self):
-        response = self.client.table(STUDENTS_TABLE).select("*").execute()
+    def get_students(self, columns: str = "*"):
+        response = self.client.table(STUDENTS_TABLE).select(columns).execute()
         return response.data
 
-    def get_courses(self):
-        response = self.client.table(COURSES_TABLE).select("*").execute()
+    def get_courses(self, columns: str = "*"):
+        response = self.client.table(COURSES_TABLE).select(columns).execute()
         return response.data
 
-    def get_student_course_relations(self):
+    def get_student_course_relations(self, columns: str = "*"):
         response = (
             self.client.table(STUDENT_COURSES_TABLE)
-            .select("*")
+            .select(columns)
             .eq("is_active", True)
             .execute()
         )
@@ -237,27 +387,51 @@ class SupabaseClient:
             if row.get(STUDENT_COURSES_COURSE_FIELD)
         ]
 
-    def update_student_courses(self, student_id: str, course_ids: Iterable[str]):
-        """Actualiza la relación alumno-curso eliminando asignaciones previas y registrando las nuevas."""
-        unique_course_ids = {cid for cid in course_ids if cid}
-        (
-            self.client.table(STUDENT_COURSES_TABLE)
-            .delete()
-            .eq(STUDENT_COURSES_STUDENT_FIELD, student_id)
-            .execute()
-        )
+    def update_student_courses(self, student_id: str, course_ids: Iterable[str]) -> List[str]:
+        """Sincroniza los cursos del alumno en una sola llamada RPC.
 
-        if not unique_course_ids:
-            return []
+        La función `sync_student_courses` (database_enrollment_functions.sql) solo
+        inserta los cursos nuevos y desactiva los retirados; devuelve los activos.
+        """
+        unique_course_ids = sorted({cid for cid in course_ids if cid})
+        data = self._rpc(
+            "sync_student_courses",
+            {"p_student_id": student_id, "p_course_ids": unique_course_ids},
+        )
+        return [row["course_id"] for row in data if row.get("course_id")]
 
+    def upsert_student_courses(self, pairs: Iterable[tuple]) -> int:
+        """Registra pares (alumno, curso) activos con un upsert por lote."""
         payload = [
             {
                 STUDENT_COURSES_STUDENT_FIELD: student_id,
-                STUDENT_COURSES_COURSE_FIELD: cid,
+                STUDENT_COURSES_COURSE_FIELD: course_id,
                 "is_active": True,
             }
-            for cid in unique_course_ids
+            for student_id, course_id in pairs
         ]
-        self.client.table(STUDENT_COURSES_TABLE).insert(payload).execute()
-        return list(unique_course_ids)
+        if not payload:
+            return 0
+        (
+            self.client.table(STUDENT_COURSES_TABLE)
+            .upsert(
+                payload,
+                on_conflict=f"{STUDENT_COURSES_STUDENT_FIELD},{STUDENT_COURSES_COURSE_FIELD}",
+            )
+            .execute()
+        )
+        return len(payload)
+
+    def bulk_update_student_courses(self, assignments: Dict[str, Iterable[str]]) -> List[Dict]:
+        """Aplica una matriz alumno -> cursos completa en un único viaje de ida y vuelta.
 
+        Devuelve, por alumno, cuántas asignaciones se agregaron y cuántas se desactivaron.
+        """
+        payload = {
+            student_id: sorted({cid for cid in course_ids if cid})
+            for student_id, course_ids in assignments.items()
+            if student_id
+        }
+        if not payload:
+            return []
+        return self._rpc("sync_student_courses_bulk", {"p_assignments": payload})
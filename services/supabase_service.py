@@ -1,76 +1,394 @@
-"""Funciones auxiliares para interactuar con Supabase utilizando caches de Streamlit."""
+"""Funciones auxiliares para interactuar con Supabase utilizando caches compartidos."""
 
-from typing import Iterable, List
+import contextvars
+import copy
+import functools
+import inspect
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import streamlit as st
 
-from config.settings import SUPABASE_KEY, SUPABASE_URL
+from config.settings import (
+    CACHE_BACKEND,
+    CACHE_CATALOG_MAX_STALE,
+    CACHE_L1_MAX_AGE,
+    CACHE_L1_MAX_ENTRIES,
+    CACHE_L2_MAX_ENTRIES,
+    CACHE_SQLITE_PATH,
+    CACHE_SUBSCRIPTIONS_MAX_STALE,
+    COURSE_LIST_COLUMNS,
+    STUDENT_COURSES_COURSE_FIELD,
+    STUDENT_COURSES_STUDENT_FIELD,
+    STUDENT_LIST_COLUMNS,
+    SUPABASE_KEY,
+    SUPABASE_URL,
+)
+from services.cache import MISSING, SQLiteCacheStore, TwoTierCache
+from services.message_store import get_message_store
+from services.roster_import import RosterImportReport, RosterPlan, apply_roster_import
 from services.supabase_client import SupabaseClient
 
 
 @st.cache_resource
 def init_supabase() -> SupabaseClient:
-    """Inicializa y comparte la instancia del cliente de Supabase."""
+    """Cliente anónimo compartido, sin sesión, para lecturas de catálogo público.
+
+    Las consultas de un usuario usan su propio cliente del pool (ver
+    `use_client` y `current_client`).
+    """
     return SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
 
 
-@st.cache_data(ttl=10, show_spinner=False)
+_current_client: contextvars.ContextVar[Optional[SupabaseClient]] = contextvars.ContextVar(
+    "current_supabase_client", default=None
+)
+_current_scope: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_cache_scope", default=None
+)
+
+
+def use_client(client: Optional[SupabaseClient], scope: Optional[str] = None):
+    """Fija el cliente autenticado de la ejecución actual y el usuario al que pertenece.
+
+    Streamlit ejecuta cada recarga (y cada recarga de un fragmento) en un hilo
+    nuevo, así que hay que llamarla al inicio de cada una.
+    """
+    _current_client.set(client)
+    _current_scope.set(scope)
+
+
+def current_client() -> SupabaseClient:
+    """Cliente autenticado de la ejecución actual, o el anónimo si no hay sesión."""
+    return _current_client.get() or init_supabase()
+
+
+def current_scope() -> str:
+    """Ámbito de caché del cliente actual.
+
+    Las consultas hechas con el cliente de un usuario pasan por sus políticas
+    RLS, así que su resultado solo puede reutilizarse para ese mismo usuario.
+    """
+    scope = _current_scope.get()
+    if scope:
+        return f"user:{scope}"
+    client = _current_client.get()
+    if client is not None:
+        return f"client:{id(client)}"
+    return "anon"
+
+
+# ----------------------------------------------------------------------
+# Caché con invalidación selectiva
+# ----------------------------------------------------------------------
+class CacheRegistry:
+    """Caché por (función, argumentos) que permite invalidar claves concretas.
+
+    `st.cache_data.clear()` vacía el caché de todos los usuarios del servidor;
+    aquí cada escritura invalida solo las claves que afecta (p. ej. las
+    sesiones de un usuario) y se llevan contadores por función. El
+    almacenamiento lo resuelve `TwoTierCache`, compartido entre los procesos
+    del host cuando `CACHE_BACKEND` es "sqlite".
+    """
+
+    def __init__(self, cache: TwoTierCache):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._refreshing: Set[Tuple[str, Tuple, Optional[str]]] = set()
+        self._generations: Dict[str, int] = {}
+        self._swr_stats: Dict[str, Dict[str, int]] = {}
+
+    def _count_swr(self, name: str, counter: str):
+        stats = self._swr_stats.setdefault(
+            name, {"stale_served": 0, "refreshes": 0, "refresh_errors": 0, "forced_refreshes": 0}
+        )
+        stats[counter] += 1
+
+    def get_or_load(
+        self,
+        name: str,
+        args: Tuple,
+        ttl: float,
+        loader: Callable[[], Any],
+        max_stale: Optional[float] = None,
+        scope: Optional[str] = None,
+    ) -> Any:
+        """Devuelve el valor cacheado o lo carga.
+
+        `scope` separa las entradas de cada usuario (ver `current_scope`). Con
+        `max_stale`, un valor vencido hace menos de `max_stale` segundos se
+        devuelve al instante y se refresca en segundo plano
+        (stale-while-revalidate); pasado ese margen la carga es síncrona.
+        """
+        key = (name, args, scope)
+        if max_stale is None:
+            value = self._cache.get(key)
+            if value is MISSING:
+                value = loader()
+                self._cache.set(key, value, ttl)
+            return copy.deepcopy(value)
+
+        entry = self._cache.get(key)
+        if entry is not MISSING:
+            fresh_until, value = entry
+            if time.time() >= fresh_until:
+                with self._lock:
+                    self._count_swr(name, "stale_served")
+                self._refresh_in_background(key, ttl, max_stale, loader)
+            return copy.deepcopy(value)
+
+        with self._lock:
+            self._count_swr(name, "forced_refreshes")
+        value = loader()
+        self._cache.set(key, (time.time() + ttl, value), ttl + max_stale)
+        return copy.deepcopy(value)
+
+    def _refresh_in_background(
+        self,
+        key: Tuple[str, Tuple, Optional[str]],
+        ttl: float,
+        max_stale: float,
+        loader: Callable[[], Any],
+    ):
+        name = key[0]
+        with self._lock:
+            # Single-flight: una sola recarga en curso por clave.
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            generation = self._generations.get(name, 0)
+
+        def refresh():
+            try:
+                value = loader()
+            except Exception:  # noqa: BLE001 - se sigue sirviendo el valor anterior
+                with self._lock:
+                    self._count_swr(name, "refresh_errors")
+            else:
+                with self._lock:
+                    # Si hubo una invalidación mientras se cargaba, el valor
+                    # podría ser anterior a la escritura y se descarta.
+                    current = self._generations.get(name, 0) == generation
+                    self._count_swr(name, "refreshes")
+                if current:
+                    self._cache.set(key, (time.time() + ttl, value), ttl + max_stale)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(refresh,), name=f"cache-refresh-{name}", daemon=True
+        ).start()
+
+    def invalidate(self, name: str, args: Optional[Tuple] = None) -> int:
+        """Elimina la entrada `args` de la función en todos los ámbitos (o todas si `args` es None)."""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+        return self._cache.invalidate(name, args)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores por función, con la tasa de aciertos calculada."""
+        stats = self._cache.stats()
+        with self._lock:
+            for name, swr in self._swr_stats.items():
+                stats.setdefault(name, {}).update(swr)
+        return stats
+
+    def info(self) -> Dict[str, Any]:
+        info = self._cache.info()
+        with self._lock:
+            info["refreshes_in_flight"] = len(self._refreshing)
+        return info
+
+
+@st.cache_resource
+def get_cache_registry() -> CacheRegistry:
+    """Devuelve el registro de caché compartido por el proceso."""
+    l2 = None
+    if CACHE_BACKEND == "sqlite":
+        try:
+            l2 = SQLiteCacheStore(CACHE_SQLITE_PATH, CACHE_L2_MAX_ENTRIES)
+        except (sqlite3.Error, OSError):
+            l2 = None
+    return CacheRegistry(TwoTierCache(CACHE_L1_MAX_ENTRIES, CACHE_L1_MAX_AGE, l2))
+
+
+def registry_cached(ttl: float, max_stale: Optional[float] = None, shared: bool = False):
+    """Decorador equivalente a `st.cache_data(ttl=...)` sobre el registro compartido.
+
+    La función decorada expone `invalidate(*args)` para descartar una clave y
+    `clear()` para descartarlas todas. Con `max_stale` se activa el modo
+    stale-while-revalidate (ver `CacheRegistry.get_or_load`). Salvo con
+    `shared=True` (consultas del cliente anónimo, iguales para todos), la clave
+    incluye el usuario actual.
+    """
+
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+        name = func.__qualname__
+
+        def _key(*args, **kwargs) -> Tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(bound.arguments.values())
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_cache_registry().get_or_load(
+                name,
+                _key(*args, **kwargs),
+                ttl,
+                lambda: func(*args, **kwargs),
+                max_stale=max_stale,
+                scope=None if shared else current_scope(),
+            )
+
+        def invalidate(*args, **kwargs) -> int:
+            return get_cache_registry().invalidate(name, _key(*args, **kwargs))
+
+        def clear() -> int:
+            return get_cache_registry().invalidate(name)
+
+        wrapper.invalidate = invalidate  # type: ignore[attr-defined]
+        wrapper.clear = clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Aciertos (por nivel), fallos, desalojos e invalidaciones de cada función cacheada."""
+    return get_cache_registry().stats()
+
+
+def cache_info() -> Dict[str, Any]:
+    """Tamaño de los niveles del caché y estado del almacén compartido."""
+    return get_cache_registry().info()
+
+
+@registry_cached(ttl=10, max_stale=CACHE_SUBSCRIPTIONS_MAX_STALE)
 def cached_user_subscriptions(user_id: str):
-    client = init_supabase()
+    client = current_client()
     return client.get_user_subscriptions(user_id)
 
 
-@st.cache_data(ttl=10, show_spinner=False)
+@registry_cached(ttl=10)
 def cached_chat_sessions(user_id: str):
-    client = init_supabase()
+    client = current_client()
     return client.get_chat_sessions(user_id)
 
 
-@st.cache_data(ttl=5, show_spinner=False)
 def cached_chat_messages(session_id: str):
-    client = init_supabase()
-    return client.get_chat_messages(session_id)
+    """Devuelve los mensajes de la sesión (sin duplicados) refrescando solo las filas nuevas cada 5 s."""
+    return get_message_store().sync(
+        current_client(), session_id, max_age=5, deduped=True, owner=current_scope()
+    )
 
 
-@st.cache_data(ttl=20, show_spinner=False)
-def cached_students():
-    client = init_supabase()
-    return client.get_students()
+def sync_chat_messages(session_id: str):
+    """Descarga inmediatamente los mensajes nuevos de la sesión (sin duplicados)."""
+    return get_message_store().sync(
+        current_client(), session_id, deduped=True, owner=current_scope()
+    )
 
 
-@st.cache_data(ttl=20, show_spinner=False)
-def cached_courses():
-    client = init_supabase()
-    return client.get_courses()
+def load_older_chat_messages(session_id: str) -> bool:
+    """Carga la página de mensajes anterior a la ya cargada; devuelve si quedan más."""
+    return get_message_store().load_older(current_client(), session_id, owner=current_scope())
+
+
+def chat_has_older(session_id: str) -> bool:
+    return get_message_store().has_older(session_id, owner=current_scope())
 
 
-@st.cache_data(ttl=10, show_spinner=False)
-def cached_student_course_relations():
+@registry_cached(ttl=20, max_stale=CACHE_CATALOG_MAX_STALE)
+def cached_students(columns: str = STUDENT_LIST_COLUMNS):
+    client = current_client()
+    return client.get_students(columns)
+
+
+@registry_cached(ttl=20, max_stale=CACHE_CATALOG_MAX_STALE, shared=True)
+def cached_courses(columns: str = COURSE_LIST_COLUMNS):
     client = init_supabase()
-    return client.get_student_course_relations()
+    return client.get_courses(columns)
+
+
+@registry_cached(ttl=10)
+def cached_student_course_relations(
+    columns: str = f"{STUDENT_COURSES_STUDENT_FIELD}, {STUDENT_COURSES_COURSE_FIELD}",
+):
+    client = current_client()
+    return client.get_student_course_relations(columns)
 
 
-@st.cache_data(ttl=5, show_spinner=False)
+@registry_cached(ttl=5)
 def cached_student_courses(student_id: str) -> List[str]:
-    client = init_supabase()
+    client = current_client()
     return client.get_student_courses(student_id)
 
 
+@registry_cached(ttl=30)
+def cached_exercise_detail(exercise_id: str):
+    """Carga bajo demanda el enunciado, la solución y la respuesta de un ejercicio."""
+    client = current_client()
+    return client.get_exercise_detail(exercise_id)
+
+
+# ----------------------------------------------------------------------
+# Invalidación tras escrituras
+# ----------------------------------------------------------------------
+def invalidate_chat_sessions(user_id: str):
+    """Descarta la lista de sesiones de chat de un usuario."""
+    cached_chat_sessions.invalidate(user_id)  # type: ignore[attr-defined]
+
+
+def invalidate_exercise(exercise_id: str):
+    """Descarta el detalle cacheado de un ejercicio tras enviar una respuesta."""
+    cached_exercise_detail.invalidate(exercise_id)  # type: ignore[attr-defined]
+
+
+def invalidate_user_caches(user_id: Optional[str]):
+    """Descarta todo lo cacheado para un usuario (login/logout)."""
+    if not user_id:
+        return
+    cached_user_subscriptions.invalidate(user_id)  # type: ignore[attr-defined]
+    cached_chat_sessions.invalidate(user_id)  # type: ignore[attr-defined]
+    cached_student_courses.invalidate(user_id)  # type: ignore[attr-defined]
+
+
+def _invalidate_assignments(student_ids: Optional[Iterable[str]] = None):
+    """Descarta los caches de asignación de los alumnos afectados (o de todos)."""
+    cached_student_course_relations.clear()  # type: ignore[attr-defined]
+    if student_ids is None:
+        cached_student_courses.clear()  # type: ignore[attr-defined]
+        cached_user_subscriptions.clear()  # type: ignore[attr-defined]
+        return
+    for student_id in student_ids:
+        cached_student_courses.invalidate(student_id)  # type: ignore[attr-defined]
+        cached_user_subscriptions.invalidate(student_id)  # type: ignore[attr-defined]
+
+
 def update_student_courses(student_id: str, course_ids: Iterable[str]) -> List[str]:
     """Actualiza la asignación de cursos en Supabase y devuelve la lista final."""
-    client = init_supabase()
+    client = current_client()
     updated = client.update_student_courses(student_id, course_ids)
-    # Limpiar caches relacionados para reflejar cambios inmediatos.
-    try:
-        cached_student_courses.clear()  # type: ignore[attr-defined]
-    except Exception:
-        pass
-    try:
-        cached_student_course_relations.clear()  # type: ignore[attr-defined]
-    except Exception:
-        pass
-    try:
-        cached_students.clear()  # type: ignore[attr-defined]
-    except Exception:
-        pass
-    return updated
\ No newline at end of file
+    _invalidate_assignments([student_id])
+    return updated
+
+
+def bulk_update_student_courses(assignments: Dict[str, Iterable[str]]) -> List[Dict]:
+    """Aplica la asignación de cursos de varios alumnos en una sola llamada."""
+    client = current_client()
+    result = client.bulk_update_student_courses(assignments)
+    _invalidate_assignments(list(assignments))
+    return result
+
+
+def import_roster(plan: RosterPlan) -> RosterImportReport:
+    """Aplica un plan de importación de matrículas y refresca los caches afectados."""
+    report = apply_roster_import(current_client(), plan)
+    _invalidate_assignments({student_id for student_id, _ in plan.to_add})
+    return report
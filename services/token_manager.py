@@ -0,0 +1,192 @@
+"""Renovación de los tokens de acceso antes de que venzan."""
+
+import heapq
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from config.settings import (
+    SUPABASE_KEY,
+    SUPABASE_URL,
+    TOKEN_REFRESH_IDLE_LIMIT,
+    TOKEN_REFRESH_MARGIN,
+    TOKEN_REFRESH_RETRY,
+)
+from services.auth_store import load_auth_session, save_auth_session
+from services.supabase_client import SupabaseClient
+
+SESSION_FIELDS = ["access_token", "refresh_token", "expires_in", "expires_at", "token_type"]
+
+
+def serialize_session(session: Any) -> Optional[Dict[str, Any]]:
+    """Convierte la sesión de Supabase en un diccionario con sus tokens."""
+    if session is None:
+        return None
+    if isinstance(session, dict):
+        return session
+    return {field: getattr(session, field, None) for field in SESSION_FIELDS}
+
+
+def _with_expires_at(session_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Devuelve la sesión con `expires_at` absoluto, calculado de `expires_in` si falta."""
+    if session_data.get("expires_at") or not session_data.get("expires_in"):
+        return session_data
+    try:
+        expires_at = int(time.time() + float(session_data["expires_in"]))
+    except (TypeError, ValueError):
+        return session_data
+    return {**session_data, "expires_at": expires_at}
+
+
+def _expires_at(session_data: Dict[str, Any]) -> Optional[float]:
+    expires_at = session_data.get("expires_at")
+    if not expires_at:
+        return None
+    try:
+        return float(expires_at)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenManager:
+    """Programa la renovación de cada sesión `TOKEN_REFRESH_MARGIN` s antes de su vencimiento.
+
+    Las recargas de la página registran la sesión con `track` y consultan con
+    `current` si el hilo ya la renovó; así la renovación nunca ocurre dentro
+    del render. Las sesiones sin actividad durante `TOKEN_REFRESH_IDLE_LIMIT`
+    segundos dejan de renovarse y se olvidan.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], SupabaseClient],
+        margin: float = TOKEN_REFRESH_MARGIN,
+        retry: float = TOKEN_REFRESH_RETRY,
+        idle_limit: float = TOKEN_REFRESH_IDLE_LIMIT,
+    ):
+        self._client_factory = client_factory
+        self._client: Optional[SupabaseClient] = None
+        self._margin = margin
+        self._retry = retry
+        self._idle_limit = idle_limit
+        self._cond = threading.Condition()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._metrics = {"refreshes": 0, "refresh_errors": 0, "adopted": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+        self._thread.start()
+
+    def track(self, auth_token: str, session_data: Dict[str, Any]):
+        """Registra (o actualiza) la sesión asociada a `auth_token`."""
+        if not auth_token or not session_data or not session_data.get("refresh_token"):
+            return
+        with self._cond:
+            self._last_seen[auth_token] = time.time()
+            known = self._sessions.get(auth_token)
+            if known and known.get("access_token") == session_data.get("access_token"):
+                return
+            # El vencimiento se fija una sola vez, al registrar la sesión.
+            session_data = _with_expires_at(session_data)
+            self._sessions[auth_token] = session_data
+            self._schedule_locked(auth_token, session_data)
+
+    def current(self, auth_token: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Devuelve la sesión más reciente conocida para `auth_token`."""
+        if not auth_token:
+            return None
+        with self._cond:
+            return self._sessions.get(auth_token)
+
+    def forget(self, auth_token: Optional[str]):
+        if not auth_token:
+            return
+        with self._cond:
+            self._sessions.pop(auth_token, None)
+            self._last_seen.pop(auth_token, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "tracked": len(self._sessions),
+                "scheduled": len(self._schedule),
+                **self._metrics,
+            }
+
+    def _schedule_locked(self, auth_token: str, session_data: Dict[str, Any]):
+        expires_at = _expires_at(session_data)
+        if expires_at is None:
+            return
+        due = max(time.time(), expires_at - self._margin)
+        heapq.heappush(self._schedule, (due, auth_token))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._schedule or self._schedule[0][0] > time.time():
+                    timeout = self._schedule[0][0] - time.time() if self._schedule else None
+                    self._cond.wait(timeout)
+                _, auth_token = heapq.heappop(self._schedule)
+                session_data = self._sessions.get(auth_token)
+                last_seen = self._last_seen.get(auth_token, 0.0)
+            if session_data is None:
+                continue
+            due = _expires_at(session_data)
+            if due is not None and due - self._margin > time.time():
+                # Entrada antigua del heap: la sesión ya se renovó y tiene otra cita.
+                continue
+            if time.time() - last_seen > self._idle_limit:
+                self.forget(auth_token)
+                with self._cond:
+                    self._metrics["dropped"] += 1
+                continue
+            self._refresh(auth_token, session_data)
+
+    def _refresh(self, auth_token: str, session_data: Dict[str, Any]):
+        stored = load_auth_session(auth_token) or {}
+        stored_session = stored.get("session") or {}
+        if stored_session.get("access_token") not in (None, session_data.get("access_token")):
+            # Otro proceso ya la renovó y la guardó en el almacén compartido.
+            stored_session = _with_expires_at(stored_session)
+            with self._cond:
+                self._sessions[auth_token] = stored_session
+                self._metrics["adopted"] += 1
+                self._schedule_locked(auth_token, stored_session)
+            return
+
+        try:
+            if self._client is None:
+                self._client = self._client_factory()
+            refreshed = serialize_session(
+                self._client.refresh_session(session_data["refresh_token"])
+            )
+            if refreshed:
+                refreshed = _with_expires_at(refreshed)
+        except Exception:  # noqa: BLE001 - se reintenta más tarde
+            refreshed = None
+        if not refreshed or not refreshed.get("access_token"):
+            with self._cond:
+                self._metrics["refresh_errors"] += 1
+                heapq.heappush(self._schedule, (time.time() + self._retry, auth_token))
+                self._cond.notify()
+            return
+
+        save_auth_session(auth_token, refreshed, stored.get("user") or {})
+        with self._cond:
+            if auth_token in self._sessions:
+                self._sessions[auth_token] = refreshed
+                self._schedule_locked(auth_token, refreshed)
+            self._metrics["refreshes"] += 1
+
+
+@st.cache_resource
+def get_token_manager() -> TokenManager:
+    """Devuelve el renovador de tokens compartido por el proceso.
+
+    Usa un cliente propio para que renovar no altere la sesión del cliente que
+    atienden las vistas.
+    """
+    return TokenManager(client_factory=lambda: SupabaseClient(SUPABASE_URL, SUPABASE_KEY))
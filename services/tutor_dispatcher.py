@@ -0,0 +1,199 @@
+"""Cola de trabajos en segundo plano para los mensajes enviados al tutor."""
+
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import streamlit as st
+
+from config.settings import TUTOR_JOB_TTL, TUTOR_QUEUE_SIZE, TUTOR_WORKERS
+from services.chat_feed import get_chat_feed
+from services.message_store import get_message_store
+from services.client_pool import get_client_pool
+from services.supabase_service import current_client, current_scope, init_supabase
+from services.webhook_client import post_to_webhook
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class DispatcherBusy(Exception):
+    """La cola de envíos está llena."""
+
+
+@dataclass
+class TutorJob:
+    """Estado de un mensaje enviado al tutor."""
+
+    session_id: str
+    payload: Dict[str, Any]
+    headers: Dict[str, str] = field(default_factory=dict)
+    # `created_at` del último mensaje conocido al enviar; la respuesta es
+    # cualquier mensaje del tutor posterior a esta marca.
+    baseline_watermark: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    state: str = JOB_QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    reply_received: bool = False
+    # Cliente autenticado del usuario que envió el mensaje, para leer la
+    # respuesta con sus permisos (RLS) desde el hilo de trabajo. Se retiene en
+    # el pool mientras el trabajo está pendiente para que un logout no lo cierre.
+    client: Any = field(default=None, repr=False)
+    # Ámbito de caché del usuario (ver `current_scope`).
+    owner: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (JOB_DONE, JOB_FAILED)
+
+
+class TutorDispatcher:
+    """Envía los mensajes al webhook desde hilos propios para no bloquear el script."""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        workers: int = TUTOR_WORKERS,
+        max_queue: int = TUTOR_QUEUE_SIZE,
+        job_ttl: float = TUTOR_JOB_TTL,
+    ):
+        self._client_factory = client_factory
+        self._queue: "queue.Queue[TutorJob]" = queue.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, TutorJob] = {}
+        self._lock = threading.Lock()
+        self._job_ttl = job_ttl
+        self._threads: List[threading.Thread] = []
+        for index in range(workers):
+            thread = threading.Thread(
+                target=self._run, name=f"tutor-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self,
+        session_id: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        baseline_watermark: Optional[str] = None,
+    ) -> TutorJob:
+        """Encola el envío y devuelve el trabajo sin esperar la respuesta."""
+        job = TutorJob(
+            session_id=session_id,
+            payload=payload,
+            headers=headers or {},
+            baseline_watermark=baseline_watermark,
+            client=current_client(),
+            owner=current_scope(),
+        )
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        get_client_pool().hold(job.client)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full as exc:
+            get_client_pool().unhold(job.client)
+            job.client = None
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise DispatcherBusy("El tutor está atendiendo demasiadas solicitudes.") from exc
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[TutorJob]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Resumen de hilos, profundidad de la cola y trabajos por estado."""
+        with self._lock:
+            states: Dict[str, int] = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "workers": len(self._threads),
+            "alive_workers": sum(1 for t in self._threads if t.is_alive()),
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "jobs": states,
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self._job_ttl
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished and (job.finished_at or 0) < cutoff
+            ]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._process(job)
+            except Exception as exc:  # noqa: BLE001 - un fallo no debe matar al hilo
+                job.error = str(exc)
+                job.state = JOB_FAILED
+                job.finished_at = time.time()
+            finally:
+                if job.client is not None:
+                    get_client_pool().unhold(job.client)
+                job.client = None
+                self._queue.task_done()
+
+    def _process(self, job: TutorJob):
+        job.state = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            response = post_to_webhook(job.payload, headers=job.headers)
+        except Exception as exc:
+            job.error = f"Error al llamar al webhook del tutor: {exc}"
+            job.state = JOB_FAILED
+            job.finished_at = time.time()
+            return
+
+        job.status_code = response.status_code
+        if not (200 <= response.status_code < 300):
+            job.error = f"Tutor respondió {response.status_code}: {response.text}"
+            job.state = JOB_FAILED
+            job.finished_at = time.time()
+            return
+
+        # n8n guarda la respuesta en chat_messages antes de contestar; se lee
+        # una sola vez para dejarla en el almacén y se libera el hilo. Si aún
+        # no está, la vista la recibe por el feed o en su siguiente consulta.
+        store = get_message_store()
+        client = job.client or self._client_factory()
+        try:
+            messages = store.sync(client, job.session_id, owner=job.owner)
+        except Exception:
+            messages = store.get(job.session_id, owner=job.owner)
+        job.reply_received = any(
+            m.get("role") != "user"
+            and (job.baseline_watermark is None or m.get("created_at", "") > job.baseline_watermark)
+            for m in messages
+        )
+
+        job.state = JOB_DONE
+        job.finished_at = time.time()
+        get_chat_feed().publish(job.session_id)
+
+
+@st.cache_resource
+def get_tutor_dispatcher() -> TutorDispatcher:
+    """Devuelve la cola de envíos compartida por el proceso."""
+    return TutorDispatcher(client_factory=init_supabase)
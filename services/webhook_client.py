@@ -0,0 +1,128 @@
+"""Cliente HTTP compartido para el webhook de n8n."""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from config.settings import (
+    N8N_CONNECT_TIMEOUT,
+    N8N_IDEMPOTENT_ACTIONS,
+    N8N_MAX_RETRIES,
+    N8N_POOL_CONNECTIONS,
+    N8N_POOL_MAXSIZE,
+    N8N_READ_TIMEOUT,
+    N8N_RETRY_BACKOFF,
+    N8N_WEBHOOK_URL,
+)
+
+# 504 no se reintenta: el gateway agotó la espera, pero n8n pudo haber
+# procesado el mensaje.
+RETRYABLE_STATUS = {502, 503}
+
+
+def _not_sent(exc: requests.ConnectionError) -> bool:
+    """Indica si el error ocurrió antes de abrir la conexión, sin enviar nada.
+
+    `requests.ConnectionError` también cubre conexiones cortadas después de
+    enviar el cuerpo (p. ej. "Connection aborted"/reset), en las que n8n pudo
+    haber recibido el mensaje; esos casos no cuentan.
+    """
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    reason = getattr(reason, "reason", reason)
+    # NameResolutionError es una subclase de NewConnectionError.
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class WebhookClient:
+    """Reutiliza conexiones keep-alive hacia n8n y reintenta los envíos que no llegaron."""
+
+    def __init__(
+        self,
+        url: str = N8N_WEBHOOK_URL,
+        connect_timeout: float = N8N_CONNECT_TIMEOUT,
+        read_timeout: float = N8N_READ_TIMEOUT,
+        pool_connections: int = N8N_POOL_CONNECTIONS,
+        pool_maxsize: int = N8N_POOL_MAXSIZE,
+        max_retries: int = N8N_MAX_RETRIES,
+        backoff: float = N8N_RETRY_BACKOFF,
+        idempotent_actions=N8N_IDEMPOTENT_ACTIONS,
+    ):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idempotent_actions = set(idempotent_actions or ())
+        self._local = threading.local()
+        # Un adaptador compartido mantiene el pool de conexiones de todo el proceso.
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=False
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        # requests.Session no es seguro entre hilos para la gestión de cookies;
+        # cada hilo usa su sesión, pero todas comparten el adaptador y su pool.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _sleep_before_retry(self, attempt: int):
+        delay = self.backoff * (2 ** attempt)
+        time.sleep(random.uniform(0, delay))
+
+    def post(
+        self,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[Any] = None,
+    ) -> requests.Response:
+        """Envía el payload al webhook.
+
+        Solo se reintentan (con backoff exponencial y jitter) las acciones listadas
+        en `N8N_IDEMPOTENT_ACTIONS`, y solo cuando la petición no llegó a
+        n8n: fallos al abrir la conexión (DNS, conexión rechazada, plazo de
+        conexión) o respuestas 502/503 del proxy. Una conexión cortada tras
+        enviar el cuerpo o un `ReadTimeout` no se reintentan, porque n8n pudo
+        haber recibido el mensaje y repetirlo lo duplicaría. Si el payload trae
+        `client_message_id` se envía como cabecera `Idempotency-Key`; solo
+        evita duplicados si el flujo de n8n descarta las claves ya vistas.
+        """
+        retries = self.max_retries if payload.get("action") in self.idempotent_actions else 0
+        if payload.get("client_message_id"):
+            headers = {**(headers or {}), "Idempotency-Key": str(payload["client_message_id"])}
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.url, json=payload, headers=headers, timeout=timeout or self.timeout
+                )
+            except requests.ConnectionError as exc:
+                if attempt >= retries or not _not_sent(exc):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or attempt >= retries:
+                    return response
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+
+@st.cache_resource
+def get_webhook_client() -> WebhookClient:
+    """Devuelve el cliente del webhook compartido por el proceso."""
+    return WebhookClient()
+
+
+def post_to_webhook(payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout=None):
+    return get_webhook_client().post(payload, headers=headers, timeout=timeout)
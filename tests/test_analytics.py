@@ -0,0 +1,217 @@
+"""Pruebas de los indicadores de aprendizaje (utils/analytics.py)."""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analytics import (
+    RunningStatistics,
+    calendar_heatmap,
+    compute_learning_analytics,
+    heatmap_window_start,
+    study_habits_from_days,
+)
+
+TODAY = date(2024, 3, 13)  # miércoles, semana ISO 2024-W11
+
+
+def _groups(difficulty: pd.DataFrame):
+    """Sumas por (tema, curso) equivalentes a `get_difficulty_groups`."""
+    frame = difficulty.copy()
+    success = frame["success_count"].fillna(0)
+    errors = frame["error_count"].fillna(0)
+    frame["rate"] = success / np.maximum(success + errors, 1)
+    frame["squares"] = frame["difficulty_level"] ** 2
+    grouped = frame.groupby(["topic", "subject_id"], dropna=False)
+    return (
+        pd.DataFrame(
+            {
+                "row_count": grouped.size(),
+                "level_sum": grouped["difficulty_level"].sum(),
+                "level_count": grouped["difficulty_level"].count(),
+                "level_squares": grouped["squares"].sum(),
+                "success_count": grouped["success_count"].sum(),
+                "error_count": grouped["error_count"].sum(),
+                "rate_sum": grouped["rate"].sum(),
+            }
+        )
+        .reset_index()
+        .to_dict("records")
+    )
+
+
+@pytest.fixture
+def difficulty():
+    return pd.DataFrame(
+        {
+            "topic": ["álgebra", "álgebra", "límites", "límites", "series"],
+            "subject_id": ["c1", "c1", "c1", "c2", "c2"],
+            "difficulty_level": [2, 4, 3, np.nan, 5],
+            "success_count": [3, 1, 0, 2, 4],
+            "error_count": [1, 1, 2, 0, 4],
+            "last_practiced": ["2024-03-10T10:00:00Z"] * 5,
+        }
+    )
+
+
+# ----------------------------------------------------------------------
+# study_habits_from_days
+# ----------------------------------------------------------------------
+def test_study_habits_empty():
+    habits = study_habits_from_days([], today=TODAY)
+    assert habits.active_days == 0
+    assert habits.current_streak == 0
+    assert habits.avg_interval_days is None
+    assert habits.interval_variance is None
+
+
+def test_study_habits_streak_includes_today_and_ignores_duplicates():
+    days = ["2024-03-13", "2024-03-12", "2024-03-11", "2024-03-11", "2024-03-08", "2024-03-01"]
+    habits = study_habits_from_days(days, today=TODAY)
+    assert habits.active_days == 5
+    assert habits.current_streak == 3
+    # Intervalos: 7, 3, 1, 1
+    assert habits.avg_interval_days == pytest.approx(3.0)
+    assert habits.interval_variance == pytest.approx(np.var([7, 3, 1, 1], ddof=1))
+
+
+def test_study_habits_no_streak_without_activity_today():
+    habits = study_habits_from_days(["2024-03-11", "2024-03-12"], today=TODAY)
+    assert habits.current_streak == 0
+    assert habits.avg_interval_days == pytest.approx(1.0)
+    assert habits.interval_variance is None
+
+
+def test_study_habits_skips_invalid_values():
+    habits = study_habits_from_days(["2024-03-13", None, "no es fecha"], today=TODAY)
+    assert habits.active_days == 1
+    assert habits.current_streak == 1
+
+
+# ----------------------------------------------------------------------
+# calendar_heatmap
+# ----------------------------------------------------------------------
+def test_calendar_heatmap_places_days_by_weekday_and_iso_week():
+    heatmap = calendar_heatmap(
+        ["2024-03-11", "2024-03-13", "2024-03-04", "2024-03-13"],
+        [2, 5, 1, 1],
+        weeks=2,
+        today=TODAY,
+    )
+    assert heatmap.counts.shape == (7, 2)
+    assert heatmap.week_labels == ["2024-W10", "2024-W11"]
+    assert str(heatmap.week_starts[0]) == "2024-03-04"
+    assert heatmap.counts[0, 0] == 1  # lunes de la semana anterior
+    assert heatmap.counts[0, 1] == 2  # lunes de esta semana
+    assert heatmap.counts[2, 1] == 6  # miércoles (hoy), sumando repetidos
+    assert heatmap.total == 9
+
+
+def test_calendar_heatmap_drops_days_outside_window_and_marks_future():
+    heatmap = calendar_heatmap(["2023-01-02", "2024-03-13"], weeks=1, today=TODAY)
+    assert heatmap.total == 1
+    # Jueves a domingo de la semana en curso aún no ocurrieron.
+    assert np.isnan(heatmap.counts[3:, 0]).all()
+    assert not np.isnan(heatmap.counts[:3, 0]).any()
+
+
+def test_calendar_heatmap_counts_rows_without_values():
+    heatmap = calendar_heatmap(["2024-03-12", "2024-03-12", None], weeks=4, today=TODAY)
+    assert heatmap.counts.shape == (7, 4)
+    assert heatmap.counts[1, 3] == 2
+    assert heatmap.total == 2
+
+
+def test_calendar_heatmap_across_iso_year_boundary():
+    heatmap = calendar_heatmap(["2021-01-03"], weeks=2, today=date(2021, 1, 4))
+    # El domingo 2021-01-03 pertenece a la semana 53 de 2020.
+    assert heatmap.week_labels == ["2020-W53", "2021-W01"]
+    assert heatmap.counts[6, 0] == 1
+
+
+# ----------------------------------------------------------------------
+# RunningStatistics
+# ----------------------------------------------------------------------
+def test_running_statistics_matches_full_computation(difficulty):
+    expected = compute_learning_analytics(difficulty, [], {"c1": "Cálculo", "c2": "Series"})
+    stats = RunningStatistics()
+    stats.fold_difficulty_groups(_groups(difficulty))
+    result = stats.to_analytics({"c1": "Cálculo", "c2": "Series"})
+
+    assert result.difficulty_rows == expected.difficulty_rows == 5
+    assert result.total_topics == expected.total_topics
+    assert result.avg_difficulty == pytest.approx(expected.avg_difficulty)
+    assert result.difficulty_variance == pytest.approx(expected.difficulty_variance)
+    assert result.total_success == expected.total_success
+    assert result.total_errors == expected.total_errors
+    pd.testing.assert_frame_equal(result.topics, expected.topics, check_dtype=False)
+    pd.testing.assert_frame_equal(
+        result.courses.sort_values("subject_id").reset_index(drop=True),
+        expected.courses.sort_values("subject_id").reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_running_statistics_fold_unfold_is_symmetric(difficulty):
+    groups = _groups(difficulty)
+    stats = RunningStatistics()
+    stats.fold_difficulty_groups(groups)
+    removed = stats.fold_difficulty_groups([{**group, "row_count": 0} for group in groups])
+
+    assert removed == len(groups)
+    assert stats.difficulty_rows == 0
+    assert stats.difficulty_attempts == 0
+    assert stats.subject_ids() == set()
+    empty = stats.to_analytics()
+    assert empty.total_topics == 0
+    assert empty.avg_difficulty == 0.0
+    assert empty.topics.empty and empty.courses.empty
+
+
+def test_running_statistics_replacing_groups_equals_rebuild(difficulty):
+    stats = RunningStatistics()
+    stats.fold_difficulty_groups(_groups(difficulty))
+
+    updated = difficulty.copy()
+    updated.loc[0, "success_count"] += 5
+    updated.loc[4, "difficulty_level"] = 1
+    changed_keys = {("álgebra", "c1"), ("series", "c2")}
+    changed = [g for g in _groups(updated) if (g["topic"], g["subject_id"]) in changed_keys]
+    assert stats.fold_difficulty_groups(changed) == 2
+    # Volver a recibir los mismos grupos no cambia nada.
+    assert stats.fold_difficulty_groups(changed) == 0
+
+    fresh = RunningStatistics()
+    fresh.fold_difficulty_groups(_groups(updated))
+    a, b = stats.to_analytics(), fresh.to_analytics()
+    assert stats.difficulty_attempts == fresh.difficulty_attempts
+    assert a.avg_difficulty == pytest.approx(b.avg_difficulty)
+    assert a.difficulty_variance == pytest.approx(b.difficulty_variance)
+    pd.testing.assert_frame_equal(a.topics, b.topics, check_dtype=False)
+
+
+def test_running_statistics_daily_activity_replaces_days():
+    stats = RunningStatistics()
+    rows = [
+        {"day": "2024-03-12", "exercises": 2, "completed": 1, "success_count": 1, "error_count": 0},
+        {"day": "2024-03-13", "exercises": 1, "completed": 0, "success_count": 0, "error_count": 0},
+    ]
+    assert stats.fold_daily_activity(rows) == 2
+    assert stats.fold_daily_activity(rows[:1]) == 0
+    assert stats.fold_daily_activity([{**rows[1], "exercises": 4}]) == 1
+    assert stats.exercise_rows == 6
+
+    result = stats.to_analytics(today=TODAY)
+    assert result.total_exercises == 6
+    assert result.completed_exercises == 1
+    assert result.habits.current_streak == 2
+    assert list(result.daily["day"]) == ["2024-03-12"]
+
+
+def test_heatmap_window_start_is_monday_of_first_week():
+    assert heatmap_window_start(1, today=TODAY) == date(2024, 3, 11)
+    assert heatmap_window_start(2, today=TODAY) == date(2024, 3, 4)
+    heatmap = calendar_heatmap([], weeks=12, today=TODAY)
+    assert heatmap.week_starts[0] == np.datetime64(heatmap_window_start(12, today=TODAY))
@@ -0,0 +1,109 @@
+"""Pruebas del almacén de sesiones de autenticación (services/auth_store.py)."""
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+from services.auth_store import MemoryAuthStore, SQLiteAuthStore
+
+RECORD = {"session": {"access_token": "secreto-de-acceso", "refresh_token": "r"}, "user": {"id": "u1"}}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl=60.0, max_entries=100):
+        if request.param == "memory":
+            return MemoryAuthStore(ttl, max_entries)
+        path = str(tmp_path / "state" / "auth.sqlite3")
+        return SQLiteAuthStore(path, ttl, max_entries, touch_interval=0)
+
+    return make
+
+
+def test_save_load_delete(make_store):
+    store = make_store()
+    store.save("token", RECORD)
+    assert store.load("token") == RECORD
+    assert store.load("otro") is None
+    store.delete("token")
+    assert store.load("token") is None
+    stats = store.stats()
+    assert (stats["saves"], stats["hits"], stats["deletes"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_load_renews_ttl(make_store):
+    store = make_store(ttl=0.3)
+    store.save("token", RECORD)
+    time.sleep(0.2)
+    assert store.load("token") == RECORD
+    time.sleep(0.2)
+    # Sin la renovación ya habría vencido (0.4 s > 0.3 s).
+    assert store.load("token") == RECORD
+    time.sleep(0.35)
+    assert store.load("token") is None
+    assert store.stats()["expirations"] == 1
+
+
+def test_eviction_removes_session_expiring_first(make_store):
+    store = make_store(max_entries=2)
+    store.save("a", RECORD)
+    time.sleep(0.01)
+    store.save("b", RECORD)
+    time.sleep(0.01)
+    store.load("a")  # "a" renueva su plazo; "b" pasa a vencer antes
+    time.sleep(0.01)
+    store.save("c", RECORD)
+
+    assert store.load("b") is None
+    assert store.load("a") == RECORD
+    assert store.load("c") == RECORD
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["size"] == 2
+
+
+def test_sweep_removes_only_expired(make_store):
+    store = make_store(ttl=0.05)
+    store.save("viejo", RECORD)
+    time.sleep(0.06)
+    store._ttl = 60  # la siguiente sesión dura más
+    store.save("nuevo", RECORD)
+
+    assert store.sweep() == 1
+    assert store.sweep() == 0
+    assert store.load("nuevo") == RECORD
+    assert store.stats()["size"] == 1
+
+
+def test_sqlite_file_is_private_and_encrypted(tmp_path):
+    path = str(tmp_path / "state" / "auth.sqlite3")
+    store = SQLiteAuthStore(path, 60, 10)
+    store.save("token-del-navegador", RECORD)
+
+    if os.name == "posix":
+        assert os.stat(path).st_mode & 0o777 == 0o600
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT token_hash, data FROM auth_sessions").fetchall()
+    assert len(rows) == 1
+    token_hash, data = rows[0]
+    assert "token-del-navegador" not in token_hash
+    assert b"secreto-de-acceso" not in data
+
+
+def test_sqlite_undecryptable_row_is_dropped(tmp_path):
+    path = str(tmp_path / "state" / "auth.sqlite3")
+    store = SQLiteAuthStore(path, 60, 10)
+    store.save("token", RECORD)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE auth_sessions SET data = ?", (b"no es fernet",))
+
+    assert store.load("token") is None
+    assert store.stats()["size"] == 0
+    assert store.stats()["misses"] == 1
+
+
+def test_sqlite_sessions_survive_a_new_instance(tmp_path):
+    path = str(tmp_path / "state" / "auth.sqlite3")
+    SQLiteAuthStore(path, 60, 10).save("token", RECORD)
+    assert SQLiteAuthStore(path, 60, 10).load("token") == RECORD
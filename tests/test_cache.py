@@ -0,0 +1,99 @@
+"""Pruebas del caché de dos niveles (services/cache.py)."""
+
+import sqlite3
+import time
+
+import pytest
+
+from services.cache import MISSING, LRUCache, SQLiteCacheStore, TwoTierCache
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "cache" / "cache.sqlite3")
+
+
+def _tiers(store_path, l1_max_age=60.0):
+    """Dos procesos simulados: cada uno con su LRU y el mismo archivo SQLite."""
+    return (
+        TwoTierCache(16, l1_max_age, SQLiteCacheStore(store_path, 100)),
+        TwoTierCache(16, l1_max_age, SQLiteCacheStore(store_path, 100)),
+    )
+
+
+def test_lru_evicts_oldest_and_expires_entries():
+    lru = LRUCache(2)
+    now = time.time()
+    lru.set(("f", (1,), None), "a", now + 60)
+    lru.set(("f", (2,), None), "b", now + 60)
+    lru.get(("f", (1,), None), now)
+    assert lru.set(("f", (3,), None), "c", now + 60) == ("f", (2,), None)
+    assert lru.get(("f", (1,), None), now + 61) is MISSING
+    assert len(lru) == 1
+
+
+def test_value_round_trips_through_shared_store(store_path):
+    first, second = _tiers(store_path)
+    key = ("sessions", ("u1",), "user:u1")
+    first.set(key, [{"id": 1, "title": "Álgebra"}], ttl=60)
+
+    assert second.get(key) == [{"id": 1, "title": "Álgebra"}]
+    assert second.get(key) == [{"id": 1, "title": "Álgebra"}]
+    stats = second.stats()["sessions"]
+    assert (stats["l2_hits"], stats["l1_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_scopes_are_separate_entries(store_path):
+    first, second = _tiers(store_path)
+    first.set(("sessions", ("s",), "user:a"), "de a", ttl=60)
+
+    assert second.get(("sessions", ("s",), "user:b")) is MISSING
+    assert second.get(("sessions", ("s",), "user:a")) == "de a"
+
+
+def test_invalidate_args_removes_every_scope_in_both_tiers(store_path):
+    first, second = _tiers(store_path, l1_max_age=0.05)
+    for scope in ("user:a", "user:b"):
+        first.set(("sessions", ("s",), scope), scope, ttl=60)
+    first.set(("sessions", ("other",), "user:a"), "otra", ttl=60)
+    assert second.get(("sessions", ("s",), "user:a")) == "user:a"
+
+    assert first.invalidate("sessions", ("s",)) == 2
+    assert first.get(("sessions", ("s",), "user:b")) is MISSING
+    # El otro proceso deja de ver la entrada cuando vence su copia de nivel 1.
+    time.sleep(0.06)
+    assert second.get(("sessions", ("s",), "user:a")) is MISSING
+    assert second.get(("sessions", ("other",), "user:a")) == "otra"
+
+    first.invalidate("sessions")
+    time.sleep(0.06)
+    assert second.get(("sessions", ("other",), "user:a")) is MISSING
+
+
+def test_expired_entries_are_not_served(store_path):
+    first, second = _tiers(store_path)
+    first.set(("f", (), None), "valor", ttl=0.01)
+    time.sleep(0.02)
+    assert first.get(("f", (), None)) is MISSING
+    assert second.get(("f", (), None)) is MISSING
+
+
+def test_non_json_values_stay_in_process(store_path):
+    first, second = _tiers(store_path)
+    value = {1, 2}
+    first.set(("f", (), None), value, ttl=60)
+    assert first.get(("f", (), None)) == value
+    assert second.get(("f", (), None)) is MISSING
+    assert first.l2_error
+
+
+def test_legacy_table_without_args_is_replaced(store_path):
+    SQLiteCacheStore(store_path, 10)  # crea el directorio privado
+    with sqlite3.connect(store_path) as conn:
+        conn.execute("DROP TABLE cache_entries")
+        conn.execute(
+            "CREATE TABLE cache_entries (key TEXT PRIMARY KEY, name TEXT, expires_at REAL, value TEXT)"
+        )
+    store = SQLiteCacheStore(store_path, 10)
+    store.set(("f", (1,), None), 1, time.time() + 60)
+    assert store.get(("f", (1,), None), time.time())[0] == 1
@@ -0,0 +1,123 @@
+"""Pruebas del registro de caché con stale-while-revalidate (services/supabase_service.py)."""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from services.cache import TwoTierCache  # noqa: E402
+from services.supabase_service import CacheRegistry  # noqa: E402
+
+
+class Loader:
+    """Cargador falso que cuenta llamadas y puede quedar bloqueado."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("Supabase no responde")
+        return {"version": self.calls}
+
+
+def _registry():
+    return CacheRegistry(TwoTierCache(64, 60.0))
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _in_flight(registry):
+    return registry.info()["refreshes_in_flight"]
+
+
+def test_loads_once_and_returns_copies():
+    registry, loader = _registry(), Loader()
+    first = registry.get_or_load("f", ("a",), 60, loader)
+    first["version"] = 99
+    assert registry.get_or_load("f", ("a",), 60, loader) == {"version": 1}
+    assert loader.calls == 1
+
+
+def test_scopes_are_isolated():
+    registry, loader = _registry(), Loader()
+    assert registry.get_or_load("f", ("a",), 60, loader, scope="user:1") == {"version": 1}
+    assert registry.get_or_load("f", ("a",), 60, loader, scope="user:2") == {"version": 2}
+    assert registry.get_or_load("f", ("a",), 60, loader, scope="user:1") == {"version": 1}
+    # Invalidar una clave la descarta en todos los ámbitos.
+    registry.invalidate("f", ("a",))
+    assert registry.get_or_load("f", ("a",), 60, loader, scope="user:2") == {"version": 3}
+
+
+def test_stale_value_is_served_while_a_single_refresh_runs():
+    registry, loader = _registry(), Loader()
+    registry.get_or_load("f", (), 0, loader, max_stale=60)
+    loader.release.clear()
+    loader.started.clear()
+
+    # Vencido: se sirve el valor anterior y se lanza una sola recarga.
+    for _ in range(5):
+        assert registry.get_or_load("f", (), 0, loader, max_stale=60) == {"version": 1}
+    assert loader.started.wait(2)
+    assert _in_flight(registry) == 1
+    assert loader.calls == 2
+
+    loader.release.set()
+    assert _wait_for(lambda: _in_flight(registry) == 0)
+    stats = registry.stats()["f"]
+    assert stats["stale_served"] == 5
+    assert stats["refreshes"] == 1
+    assert stats["forced_refreshes"] == 1
+    assert registry.get_or_load("f", (), 0, loader, max_stale=60) == {"version": 2}
+
+
+def test_refresh_started_before_invalidate_is_discarded():
+    registry, loader = _registry(), Loader()
+    registry.get_or_load("f", (), 0, loader, max_stale=60)
+    loader.release.clear()
+    loader.started.clear()
+    registry.get_or_load("f", (), 0, loader, max_stale=60)
+    assert loader.started.wait(2)
+
+    registry.invalidate("f")
+    loader.release.set()
+    assert _wait_for(lambda: _in_flight(registry) == 0)
+
+    # La recarga terminó después de la invalidación: su valor no se guarda.
+    assert registry.get_or_load("f", (), 60, loader, max_stale=60) == {"version": 3}
+    assert loader.calls == 3
+
+
+def test_failed_refresh_keeps_serving_stale_value():
+    registry = _registry()
+    registry.get_or_load("f", (), 0, Loader(), max_stale=60)
+    failing = Loader(fail=True)
+
+    assert registry.get_or_load("f", (), 0, failing, max_stale=60) == {"version": 1}
+    assert _wait_for(lambda: _in_flight(registry) == 0)
+    assert registry.stats()["f"]["refresh_errors"] == 1
+    assert registry.get_or_load("f", (), 0, failing, max_stale=60) == {"version": 1}
+
+
+def test_value_past_max_stale_is_loaded_synchronously():
+    registry, loader = _registry(), Loader()
+    registry.get_or_load("f", (), 0, loader, max_stale=0.01)
+    time.sleep(0.02)
+    assert registry.get_or_load("f", (), 0, loader, max_stale=0.01) == {"version": 2}
+    assert _in_flight(registry) == 0
@@ -0,0 +1,90 @@
+"""Pruebas del pool de clientes autenticados (services/client_pool.py)."""
+
+import pytest
+
+pytest.importorskip("supabase")
+
+from services.client_pool import ClientPool  # noqa: E402
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs):
+    created = []
+
+    def factory():
+        created.append(FakeClient())
+        return created[-1]
+
+    return ClientPool(factory=factory, **kwargs), created
+
+
+def test_acquire_reuses_client_per_token():
+    pool, created = _pool()
+    assert pool.acquire("a") is pool.acquire("a")
+    assert pool.acquire("b") is not pool.acquire("a")
+    assert len(created) == 2
+    assert pool.stats()["reused"] == 2
+
+
+def test_capacity_eviction_closes_client():
+    pool, created = _pool(max_clients=2)
+    a, b = pool.acquire("a"), pool.acquire("b")
+    pool.acquire("a")  # "b" pasa a ser el menos usado
+    pool.acquire("c")
+    assert b.closed and not a.closed
+    assert pool.stats()["clients"] == 2
+    assert pool.stats()["capacity_evictions"] == 1
+
+
+def test_idle_eviction_closes_client():
+    pool, _ = _pool(idle_timeout=0)
+    a = pool.acquire("a")
+    b = pool.acquire("b")
+    assert a.closed and b is not a
+    assert pool.stats()["idle_evictions"] == 1
+
+
+def test_held_client_is_closed_on_last_unhold():
+    pool, _ = _pool(max_clients=1)
+    a = pool.acquire("a")
+    pool.hold(a)
+    with pool.holding(a):
+        pool.acquire("b")
+        assert not a.closed
+        assert pool.stats()["retired_clients"] == 1
+    assert not a.closed
+    pool.unhold(a)
+    assert a.closed
+    assert pool.stats()["held_clients"] == 0
+    assert pool.stats()["retired_clients"] == 0
+
+
+def test_release_closes_or_retires():
+    pool, _ = _pool()
+    a, b = pool.acquire("a"), pool.acquire("b")
+    pool.release("a")
+    assert a.closed
+
+    with pool.holding(b):
+        pool.release("b")
+        assert not b.closed
+    assert b.closed
+    # Un token desconocido o vacío no hace nada.
+    pool.release("b")
+    pool.release(None)
+
+
+def test_unheld_client_in_pool_stays_open():
+    pool, _ = _pool()
+    a = pool.acquire("a")
+    with pool.holding(a):
+        pass
+    assert not a.closed
+    assert pool.acquire("a") is a
@@ -0,0 +1,59 @@
+"""Pruebas del almacén incremental de mensajes (services/message_store.py)."""
+
+from services.message_store import ChatMessageStore
+
+
+class FakeClient:
+    """Cliente mínimo con las dos consultas que usa el almacén."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def get_chat_messages_page(self, session_id, before=None, limit=50):
+        self.calls += 1
+        rows = [r for r in self.rows if r["session_id"] == session_id]
+        return rows[-limit:]
+
+    def get_chat_messages(self, session_id, since=None):
+        self.calls += 1
+        return [r for r in self.rows if r["session_id"] == session_id and r["created_at"] >= since]
+
+
+def _row(row_id, session_id, second):
+    return {
+        "id": f"{session_id}-{row_id}",
+        "session_id": session_id,
+        "role": "user",
+        "content": f"mensaje {row_id}",
+        "created_at": f"2024-01-01T12:00:{second:02d}+00:00",
+    }
+
+
+def test_store_evicts_least_recently_used_session():
+    client = FakeClient([_row(1, "a", 1), _row(1, "b", 2), _row(1, "c", 3)])
+    store = ChatMessageStore(max_sessions=2)
+    store.sync(client, "a")
+    store.sync(client, "b")
+    store.get("a")  # "a" pasa a ser la más reciente
+    store.sync(client, "c")
+
+    assert store.stats()["sessions"] == 2
+    assert store.watermark("a") is not None
+    assert store.get("c")
+    # "b" se descartó: vuelve a descargarse desde la ventana inicial.
+    assert store.watermark("b") is None
+    calls = client.calls
+    assert [m["id"] for m in store.sync(client, "b")] == ["b-1"]
+    assert client.calls == calls + 1
+
+
+def test_store_keeps_owners_apart():
+    client = FakeClient([_row(1, "a", 1)])
+    store = ChatMessageStore()
+    store.sync(client, "a", owner="user:1")
+    assert store.get("a", owner="user:1")
+    assert store.get("a", owner="user:2") == []
+
+    store.reset("a")
+    assert store.stats()["sessions"] == 0
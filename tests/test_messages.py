@@ -0,0 +1,113 @@
+"""Pruebas de la deduplicación de mensajes del chat (utils/messages.py)."""
+
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.messages import MessageDeduper, append_deduped, dedup_messages, parse_timestamp
+
+START = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+# El contenido normalizado se guarda por id de mensaje, así que cada mensaje
+# de prueba recibe un id propio; las aserciones usan la etiqueta.
+_ids = itertools.count(1)
+
+
+def _message(label, role="assistant", content="Hola", seconds=0):
+    return {
+        "id": f"test-{next(_ids)}",
+        "label": label,
+        "role": role,
+        "content": content,
+        "created_at": (START + timedelta(seconds=seconds)).isoformat(),
+    }
+
+
+# ----------------------------------------------------------------------
+# parse_timestamp
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2024-01-01T12:00:00+00:00",
+        "2024-01-01T12:00:00Z",
+        "2024-01-01T07:00:00-05:00",
+        "2024-01-01T12:00:00",  # sin zona: UTC
+        "2024-01-01 12:00:00",
+        datetime(2024, 1, 1, 12, 0),
+        START,
+    ],
+)
+def test_parse_timestamp_equivalent_formats(value):
+    assert parse_timestamp(value) == START.timestamp()
+
+
+def test_parse_timestamp_keeps_fractional_seconds():
+    assert parse_timestamp("2024-01-01T12:00:00.250+00:00") == pytest.approx(START.timestamp() + 0.25)
+
+
+@pytest.mark.parametrize("value", [None, "", "no es fecha"])
+def test_parse_timestamp_invalid(value):
+    assert parse_timestamp(value) is None
+
+
+# ----------------------------------------------------------------------
+# MessageDeduper
+# ----------------------------------------------------------------------
+def test_deduper_drops_consecutive_duplicate_within_window():
+    deduper = MessageDeduper(window_seconds=5)
+    assert deduper.add(_message(1))
+    assert not deduper.add(_message(2, seconds=3))
+    assert [m["label"] for m in deduper.messages] == [1]
+
+
+def test_deduper_keeps_repeat_outside_window_or_with_other_role():
+    deduper = MessageDeduper(window_seconds=5)
+    kept = deduper.extend(
+        [
+            _message(1),
+            _message(2, seconds=10),  # misma respuesta, pero fuera de la ventana
+            _message(3, role="user", seconds=11),  # mismo texto, otro rol
+            _message(4, role="user", content="Otra cosa", seconds=12),
+        ]
+    )
+    assert [m["label"] for m in kept] == [1, 2, 3, 4]
+
+
+def test_deduper_only_compares_with_last_kept_message():
+    messages = [_message(1), _message(2, content="Intermedio", seconds=1), _message(3, seconds=2)]
+    assert [m["label"] for m in dedup_messages(messages)] == [1, 2, 3]
+
+
+def test_deduper_compares_displayed_text():
+    # El mismo texto guardado como JSON o como cadena se considera igual.
+    messages = [_message(1, content='{"respuesta": "Hola"}'), _message(2, content="Hola", seconds=1)]
+    assert [m["label"] for m in dedup_messages(messages)] == [1]
+
+
+def test_deduper_keeps_messages_without_timestamp():
+    messages = [_message(1), {**_message(2), "created_at": None}]
+    assert [m["label"] for m in dedup_messages(messages)] == [1, 2]
+
+
+def test_deduper_starts_from_existing_tail():
+    base = dedup_messages([_message(1, role="user", content="Pregunta"), _message(2)])
+    result = append_deduped(base, [_message(3, seconds=2), _message(4, content="Nueva", seconds=3)])
+    assert [m["label"] for m in result] == [1, 2, 4]
+    # La lista original no se modifica.
+    assert [m["label"] for m in base] == [1, 2]
+
+
+def test_incremental_matches_full_pass():
+    messages = []
+    for index in range(40):
+        role = "user" if index % 2 == 0 else "assistant"
+        messages.append(_message(index, role=role, content=f"m{index // 2}", seconds=index * 3))
+        if index % 7 == 0:
+            messages.append({**messages[-1], "id": f"test-{next(_ids)}", "label": f"dup-{index}"})
+
+    full = dedup_messages(messages)
+    incremental = append_deduped(dedup_messages(messages[:20]), messages[20:])
+    assert [m["label"] for m in incremental] == [m["label"] for m in full]
+    assert not any(str(m["label"]).startswith("dup-") for m in full)
@@ -0,0 +1,114 @@
+"""Pruebas del renovador de tokens (services/token_manager.py)."""
+
+import time
+
+import pytest
+
+pytest.importorskip("supabase")
+
+import services.token_manager as token_manager  # noqa: E402
+from services.token_manager import TokenManager  # noqa: E402
+
+
+class FakeAuthClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def refresh_session(self, refresh_token):
+        self.calls.append(refresh_token)
+        if self.fail:
+            raise RuntimeError("sin conexión")
+        return {"access_token": f"access-{len(self.calls)}", "refresh_token": "r2", "expires_in": 3600}
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Sustituye el almacén de sesiones por un diccionario."""
+    records = {}
+    monkeypatch.setattr(token_manager, "load_auth_session", records.get)
+    monkeypatch.setattr(
+        token_manager,
+        "save_auth_session",
+        lambda token, session, user: records.__setitem__(token, {"session": session, "user": user}),
+    )
+    return records
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _manager(client, **kwargs):
+    kwargs.setdefault("margin", 1.0)
+    kwargs.setdefault("retry", 0.1)
+    kwargs.setdefault("idle_limit", 60)
+    return TokenManager(client_factory=lambda: client, **kwargs)
+
+
+def test_session_with_only_expires_in_is_refreshed(stored):
+    client = FakeAuthClient()
+    manager = _manager(client)
+    manager.track("t", {"access_token": "a", "refresh_token": "r", "expires_in": 1.3})
+
+    # `expires_in` se convierte una sola vez en un vencimiento absoluto.
+    assert manager.current("t")["expires_at"] <= time.time() + 1.3
+    assert _wait_for(lambda: manager.stats()["refreshes"] == 1)
+    assert client.calls == ["r"]
+    assert manager.current("t")["access_token"] == "access-1"
+    assert stored["t"]["session"]["expires_at"] > time.time() + 3000
+
+
+def test_session_is_refreshed_margin_before_expiry(stored):
+    client = FakeAuthClient()
+    manager = _manager(client, margin=0.5)
+    manager.track("t", {"access_token": "a", "refresh_token": "r", "expires_at": time.time() + 0.8})
+
+    time.sleep(0.1)
+    assert client.calls == []
+    assert _wait_for(lambda: client.calls == ["r"])
+
+
+def test_failed_refresh_is_retried(stored):
+    client = FakeAuthClient(fail=True)
+    manager = _manager(client)
+    manager.track("t", {"access_token": "a", "refresh_token": "r", "expires_at": time.time()})
+
+    assert _wait_for(lambda: manager.stats()["refresh_errors"] >= 2)
+    client.fail = False
+    assert _wait_for(lambda: manager.stats()["refreshes"] == 1)
+
+
+def test_session_refreshed_by_another_process_is_adopted(stored):
+    client = FakeAuthClient()
+    newer = {"access_token": "b", "refresh_token": "r2", "expires_in": 3600}
+    stored["t"] = {"session": newer, "user": {}}
+    manager = _manager(client)
+    manager.track("t", {"access_token": "a", "refresh_token": "r", "expires_at": time.time()})
+
+    assert _wait_for(lambda: manager.stats()["adopted"] == 1)
+    assert client.calls == []
+    assert manager.current("t")["access_token"] == "b"
+    assert manager.current("t")["expires_at"] > time.time() + 3000
+
+
+def test_idle_session_is_dropped(stored):
+    client = FakeAuthClient()
+    manager = _manager(client, idle_limit=0)
+    manager.track("t", {"access_token": "a", "refresh_token": "r", "expires_at": time.time()})
+
+    assert _wait_for(lambda: manager.stats()["dropped"] == 1)
+    assert client.calls == []
+    assert manager.current("t") is None
+
+
+def test_track_ignores_sessions_without_refresh_token(stored):
+    manager = _manager(FakeAuthClient())
+    manager.track("t", {"access_token": "a", "expires_in": 10})
+    manager.track("", {"access_token": "a", "refresh_token": "r"})
+    assert manager.stats()["tracked"] == 0
@@ -0,0 +1,78 @@
+"""Pruebas de los reintentos del cliente del webhook (services/webhook_client.py)."""
+
+import socket
+
+import pytest
+import requests
+from urllib3.exceptions import ProtocolError
+
+from services.webhook_client import WebhookClient
+
+
+def _closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/webhook"
+
+
+def _client(url="http://n8n.invalid/webhook"):
+    client = WebhookClient(url=url, max_retries=2, backoff=0, idempotent_actions=("chat",))
+    client._sleep_before_retry = lambda attempt: None
+    return client
+
+
+def _count_posts(client, monkeypatch, side_effect):
+    calls = []
+    real_post = client.session.post
+
+    def post(*args, **kwargs):
+        calls.append(kwargs.get("headers"))
+        return side_effect(real_post, *args, **kwargs)
+
+    monkeypatch.setattr(client.session, "post", post)
+    return calls
+
+
+def test_refused_connection_is_retried(monkeypatch):
+    client = _client(_closed_port_url())
+    calls = _count_posts(client, monkeypatch, lambda post, *a, **kw: post(*a, **kw))
+    with pytest.raises(requests.ConnectionError):
+        client.post({"action": "chat", "client_message_id": "m-1"})
+    assert len(calls) == 3
+    assert calls[0]["Idempotency-Key"] == "m-1"
+
+
+def test_refused_connection_is_not_retried_for_other_actions(monkeypatch):
+    client = _client(_closed_port_url())
+    calls = _count_posts(client, monkeypatch, lambda post, *a, **kw: post(*a, **kw))
+    with pytest.raises(requests.ConnectionError):
+        client.post({"action": "solution"})
+    assert len(calls) == 1
+
+
+def test_connection_reset_after_sending_is_not_retried(monkeypatch):
+    def reset(post, *args, **kwargs):
+        raise requests.ConnectionError(
+            ProtocolError("Connection aborted.", ConnectionResetError(104, "reset"))
+        )
+
+    client = _client()
+    calls = _count_posts(client, monkeypatch, reset)
+    with pytest.raises(requests.ConnectionError):
+        client.post({"action": "chat"})
+    assert len(calls) == 1
+
+
+def test_gateway_errors_are_retried_until_success(monkeypatch):
+    statuses = iter([503, 502, 200])
+
+    def respond(post, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = next(statuses)
+        return response
+
+    client = _client()
+    calls = _count_posts(client, monkeypatch, respond)
+    assert client.post({"action": "chat"}).status_code == 200
+    assert len(calls) == 3
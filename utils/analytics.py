@@ -0,0 +1,531 @@
+"""Cálculo de indicadores de aprendizaje, independiente de Streamlit.
+
+Las funciones reciben columnas (diccionarios de listas/arrays, listas de filas
+o DataFrames) y devuelven un único `LearningAnalytics` que las vistas solo
+tienen que mostrar. Los cálculos por fila se resuelven con operaciones de
+NumPy/pandas; `RunningStatistics` mantiene las mismas cifras incorporando solo
+los registros que cambiaron.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+Columns = Union[pd.DataFrame, Mapping[str, Sequence[Any]], Sequence[Mapping[str, Any]], None]
+
+TOPIC_COLUMNS = ["topic", "avg_difficulty", "success_count", "error_count", "attempts", "success_rate"]
+DAILY_COLUMNS = ["day", "success_count", "error_count"]
+ACTIVITY_COLUMNS = ["day", "exercises", "completed"]
+DAILY_ACTIVITY_COLUMNS = ["day", "exercises", "completed", "success_count", "error_count"]
+COURSE_COLUMNS = [
+    "subject_id",
+    "course_name",
+    "unique_topics",
+    "avg_success_rate",
+    "success_count",
+    "error_count",
+]
+
+
+@dataclass
+class StudyHabits:
+    """Constancia de estudio a partir de los días con actividad."""
+
+    active_days: int = 0
+    current_streak: int = 0
+    avg_interval_days: Optional[float] = None
+    interval_variance: Optional[float] = None
+
+
+@dataclass
+class LearningAnalytics:
+    """Indicadores y tablas listas para graficar."""
+
+    total_topics: int = 0
+    avg_difficulty: float = 0.0
+    difficulty_variance: Optional[float] = None
+    difficulty_rows: int = 0
+    total_success: int = 0
+    total_errors: int = 0
+    total_exercises: int = 0
+    completed_exercises: int = 0
+    habits: StudyHabits = field(default_factory=StudyHabits)
+    best_topic: Optional[str] = None
+    best_topic_rate: float = 0.0
+    worst_topic: Optional[str] = None
+    worst_topic_rate: float = 0.0
+    most_attempts_topic: Optional[str] = None
+    most_attempts: int = 0
+    topics: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=TOPIC_COLUMNS))
+    daily: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=DAILY_COLUMNS))
+    activity: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=ACTIVITY_COLUMNS))
+    courses: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=COURSE_COLUMNS))
+
+    @property
+    def has_data(self) -> bool:
+        return bool(self.difficulty_rows or self.total_exercises)
+
+    @property
+    def success_rate(self) -> float:
+        """Tasa de éxito global, en porcentaje."""
+        attempts = self.total_success + self.total_errors
+        return self.total_success / attempts * 100 if attempts else 0.0
+
+    @property
+    def course_topic_counts(self) -> pd.DataFrame:
+        """Temas distintos por curso (`course`, `ejercicios_unicos`), de mayor a menor."""
+        return (
+            self.courses.rename(columns={"course_name": "course", "unique_topics": "ejercicios_unicos"})
+            [["course", "ejercicios_unicos"]]
+            .sort_values("ejercicios_unicos", ascending=False)
+        )
+
+    @property
+    def course_success(self) -> pd.DataFrame:
+        """Tasa de éxito promedio por curso (`course`, `success_rate` en %), de mayor a menor."""
+        frame = (
+            self.courses.rename(columns={"course_name": "course", "avg_success_rate": "success_rate"})
+            [["course", "success_rate"]]
+            .sort_values("success_rate", ascending=False)
+        )
+        frame["success_rate"] = (frame["success_rate"].astype("float64") * 100).round(2)
+        return frame
+
+
+def _frame(columns: Columns, names: Iterable[str]) -> pd.DataFrame:
+    frame = columns if isinstance(columns, pd.DataFrame) else pd.DataFrame(columns or [])
+    missing = [name for name in names if name not in frame.columns]
+    if missing:
+        frame = frame.copy()
+        for name in missing:
+            frame[name] = pd.Series(dtype="float64")
+    return frame
+
+
+def _utc_days(values: pd.Series) -> pd.Series:
+    """Convierte marcas de tiempo en fechas UTC (`datetime64[ns]` normalizado)."""
+    stamps = pd.to_datetime(values, utc=True, errors="coerce", format="mixed")
+    return stamps.dt.tz_convert(None).dt.normalize()
+
+
+def study_habits_from_days(days: Iterable[Any], today: Optional[date] = None) -> StudyHabits:
+    """Racha actual e intervalos entre días de actividad.
+
+    La racha es la longitud del bloque de días consecutivos que contiene a
+    `today` (0 si hoy no hubo actividad).
+    """
+    series = days if isinstance(days, pd.Series) else pd.Series(list(days))
+    # Solo se convierten los valores distintos: un historial repite cada día
+    # muchas veces y el análisis de fechas es lo más costoso.
+    stamps = pd.to_datetime(pd.Series(series.unique()), errors="coerce").dropna()
+    values = np.unique(stamps.to_numpy(dtype="datetime64[D]"))
+    if values.size == 0:
+        return StudyHabits()
+
+    ordinals = values.astype(np.int64)
+    today_ordinal = np.datetime64(today or date.today(), "D").astype(np.int64)
+    # Islas de días consecutivos: día - posición es constante dentro de cada una.
+    groups = ordinals - np.arange(ordinals.size)
+    position = np.searchsorted(ordinals, today_ordinal)
+    streak = 0
+    if position < ordinals.size and ordinals[position] == today_ordinal:
+        streak = int(np.count_nonzero(groups == groups[position]))
+
+    gaps = np.diff(ordinals)
+    return StudyHabits(
+        active_days=int(ordinals.size),
+        current_streak=streak,
+        avg_interval_days=float(gaps.mean()) if gaps.size else None,
+        interval_variance=float(gaps.var(ddof=1)) if gaps.size > 1 else None,
+    )
+
+
+def split_daily_activity(rows: Columns):
+    """Separa las filas de `get_daily_activity` en progreso diario y actividad.
+
+    Devuelve `(daily, activity)`: los días con éxitos o errores y los días con
+    ejercicios generados, cada uno con sus columnas propias.
+    """
+    frame = _frame(rows, DAILY_ACTIVITY_COLUMNS)
+    counts = frame[DAILY_ACTIVITY_COLUMNS[1:]].apply(pd.to_numeric, errors="coerce").fillna(0)
+    counts = counts.astype("int64")
+    practiced = (counts["success_count"] != 0) | (counts["error_count"] != 0)
+    daily = pd.concat([frame["day"], counts[["success_count", "error_count"]]], axis=1)
+    activity = pd.concat([frame["day"], counts[["exercises", "completed"]]], axis=1)
+    return (
+        daily[practiced.to_numpy()].reset_index(drop=True)[DAILY_COLUMNS],
+        activity[(counts["exercises"] > 0).to_numpy()].reset_index(drop=True)[ACTIVITY_COLUMNS],
+    )
+
+
+def study_habits_from_activity(rows: Columns, today: Optional[date] = None) -> StudyHabits:
+    """Racha e intervalos a partir de las filas de `get_daily_activity`."""
+    _, activity = split_daily_activity(rows)
+    return study_habits_from_days(activity["day"], today=today)
+
+
+@dataclass
+class CalendarHeatmap:
+    """Matriz día de la semana × semana ISO de una ventana fija de semanas."""
+
+    counts: np.ndarray
+    week_starts: np.ndarray
+    week_labels: list
+
+    @property
+    def total(self) -> float:
+        return float(np.nansum(self.counts))
+
+
+def heatmap_window_start(weeks: int = 52, today: Optional[date] = None) -> date:
+    """Lunes de la primera de las últimas `weeks` semanas ISO hasta `today`."""
+    today = today or date.today()
+    return today - timedelta(days=today.weekday() + (max(1, int(weeks)) - 1) * 7)
+
+
+def calendar_heatmap(
+    days: Iterable[Any],
+    values: Optional[Iterable[Any]] = None,
+    weeks: int = 52,
+    today: Optional[date] = None,
+) -> CalendarHeatmap:
+    """Agrupa valores diarios en una matriz densa de 7 × `weeks`.
+
+    Las columnas son las últimas `weeks` semanas ISO (de lunes a domingo) hasta
+    la de `today`; las filas, los días de la semana empezando por el lunes. Los
+    días fuera de la ventana se descartan y los posteriores a `today` quedan en
+    NaN, de modo que el tamaño no depende del historial.
+    """
+    weeks = max(1, int(weeks))
+    today = today or date.today()
+    today_ordinal = np.datetime64(today, "D").astype(np.int64)
+    start = np.datetime64(heatmap_window_start(weeks, today), "D").astype(np.int64)
+
+    stamps = pd.to_datetime(pd.Series(list(days)), errors="coerce")
+    ordinals = stamps.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    weights = (
+        np.ones(ordinals.size)
+        if values is None
+        else pd.to_numeric(pd.Series(list(values)), errors="coerce").fillna(0).to_numpy(dtype="float64")
+    )
+    offsets = ordinals - start
+    inside = stamps.notna().to_numpy() & (offsets >= 0) & (offsets < weeks * 7)
+    offsets = offsets[inside]
+    # offset = semana * 7 + día: se reordena a fila (día) × columna (semana).
+    cells = (offsets % 7) * weeks + offsets // 7
+    counts = (
+        np.bincount(cells, weights=weights[inside], minlength=7 * weeks)
+        .astype("float64")
+        .reshape(7, weeks)
+    )
+
+    future = np.arange(start + (weeks - 1) * 7, start + weeks * 7) > today_ordinal
+    counts[future, weeks - 1] = np.nan
+
+    week_starts = (start + 7 * np.arange(weeks)).astype("datetime64[D]")
+    labels = list(pd.DatetimeIndex(week_starts).strftime("%G-W%V"))
+    return CalendarHeatmap(counts=counts, week_starts=week_starts, week_labels=labels)
+
+
+def _apply_topic_highlights(result: LearningAnalytics):
+    topics = result.topics
+    if topics.empty:
+        return
+    names = topics["topic"].to_numpy()
+    rates = topics["success_rate"].to_numpy(dtype="float64")
+    attempts = topics["attempts"].to_numpy(dtype="float64")
+    best, worst, most = int(np.nanargmax(rates)), int(np.nanargmin(rates)), int(np.nanargmax(attempts))
+    result.best_topic, result.best_topic_rate = names[best], float(rates[best])
+    result.worst_topic, result.worst_topic_rate = names[worst], float(rates[worst])
+    result.most_attempts_topic, result.most_attempts = names[most], int(attempts[most])
+
+
+def compute_learning_analytics(
+    difficulty: Columns,
+    exercises: Columns,
+    course_names: Optional[Mapping[Any, str]] = None,
+    today: Optional[date] = None,
+) -> LearningAnalytics:
+    """Calcula todos los indicadores a partir de las filas crudas.
+
+    `difficulty` usa las columnas de `difficulty_tracking` (topic, subject_id,
+    difficulty_level, success_count, error_count, last_practiced) y
+    `exercises` las de `generated_exercises` (subject_id, completed,
+    created_at). Los resultados coinciden con las funciones de
+    database_stats_functions.sql.
+    """
+    df_diff = _frame(
+        difficulty,
+        ["topic", "subject_id", "difficulty_level", "success_count", "error_count", "last_practiced"],
+    )
+    df_ex = _frame(exercises, ["subject_id", "completed", "created_at"])
+    success = pd.to_numeric(df_diff["success_count"], errors="coerce").fillna(0).astype("int64")
+    errors = pd.to_numeric(df_diff["error_count"], errors="coerce").fillna(0).astype("int64")
+    levels = pd.to_numeric(df_diff["difficulty_level"], errors="coerce")
+
+    result = LearningAnalytics(
+        difficulty_rows=len(df_diff),
+        total_topics=int(df_diff["topic"].nunique()),
+        avg_difficulty=float(levels.mean()) if levels.notna().any() else 0.0,
+        difficulty_variance=float(levels.var()) if levels.notna().sum() > 1 else None,
+        total_success=int(success.sum()),
+        total_errors=int(errors.sum()),
+        total_exercises=len(df_ex),
+        completed_exercises=int(df_ex["completed"].fillna(False).astype(bool).sum()),
+    )
+
+    if len(df_diff):
+        work = pd.DataFrame(
+            {
+                "topic": df_diff["topic"],
+                "subject_id": df_diff["subject_id"],
+                "difficulty_level": levels,
+                "success_count": success,
+                "error_count": errors,
+                "row_rate": success / np.maximum(success + errors, 1),
+                "day": _utc_days(df_diff["last_practiced"]),
+            }
+        )
+        topics = work.groupby("topic", sort=True).agg(
+            avg_difficulty=("difficulty_level", "mean"),
+            success_count=("success_count", "sum"),
+            error_count=("error_count", "sum"),
+        )
+        topics["attempts"] = topics["success_count"] + topics["error_count"]
+        topics["success_rate"] = topics["success_count"] / np.maximum(topics["attempts"], 1)
+        result.topics = topics.reset_index()[TOPIC_COLUMNS]
+
+        result.daily = (
+            work.dropna(subset=["day"])
+            .groupby("day", sort=True)[["success_count", "error_count"]]
+            .sum()
+            .reset_index()[DAILY_COLUMNS]
+        )
+
+        courses = work.groupby("subject_id", sort=False, dropna=False).agg(
+            unique_topics=("topic", "nunique"),
+            avg_success_rate=("row_rate", "mean"),
+            success_count=("success_count", "sum"),
+            error_count=("error_count", "sum"),
+        )
+        courses = courses.reset_index()
+        names = course_names or {}
+        courses["course_name"] = courses["subject_id"].map(names).fillna("Sin curso")
+        result.courses = courses.sort_values("unique_topics", ascending=False, kind="stable")[
+            COURSE_COLUMNS
+        ].reset_index(drop=True)
+        _apply_topic_highlights(result)
+
+    if len(df_ex):
+        days = _utc_days(df_ex["created_at"])
+        completed = df_ex["completed"].fillna(False).astype(bool)
+        activity = (
+            pd.DataFrame({"day": days, "completed": completed})
+            .dropna(subset=["day"])
+            .groupby("day", sort=True)
+            .agg(exercises=("completed", "size"), completed=("completed", "sum"))
+        )
+        result.activity = activity.reset_index()[ACTIVITY_COLUMNS]
+        result.habits = study_habits_from_days(result.activity["day"], today=today)
+
+    return result
+
+
+class RunningStatistics:
+    """Sumas acumuladas de las estadísticas de un alumno, actualizables por lotes.
+
+    Parte de las sumas por (tema, curso) que calcula `get_difficulty_groups` y
+    de los totales de cada día de `get_daily_activity`. Cuando un grupo vuelve a
+    llegar se resta su aporte anterior y se suma el nuevo, así que incorporar un
+    lote solo toca los temas, cursos y días afectados; `to_analytics` arma el
+    resultado a partir de esas sumas, que tienen un elemento por tema, curso o
+    día.
+    """
+
+    def __init__(self):
+        # (tema, curso) -> GROUP_FIELDS
+        self._groups: Dict[tuple, tuple] = {}
+        # topic -> [suma de niveles, niveles informados, éxitos, errores, registros]
+        self._topics: Dict[Any, list] = {}
+        self._courses: Dict[Any, Dict[str, Any]] = {}
+        self._rows = 0
+        self._level_sum = 0.0
+        self._level_squares = 0.0
+        self._level_count = 0
+        self._success = 0
+        self._errors = 0
+        self._days: Dict[str, tuple] = {}
+
+    @property
+    def difficulty_rows(self) -> int:
+        return self._rows
+
+    @property
+    def difficulty_attempts(self) -> int:
+        return self._success + self._errors
+
+    @property
+    def exercise_rows(self) -> int:
+        return sum(values[0] for values in self._days.values())
+
+    @staticmethod
+    def _count(value: Any) -> int:
+        try:
+            return int(value or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _number(value: Any) -> float:
+        try:
+            number = float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+        return 0.0 if np.isnan(number) else number
+
+    def _apply(self, key: tuple, group: tuple, sign: int):
+        topic, subject_id = key
+        rows, level_sum, level_count, level_squares, success, errors, rate_sum = group
+        stats = self._topics.setdefault(topic, [0.0, 0, 0, 0, 0])
+        course = self._courses.setdefault(
+            subject_id, {"topics": Counter(), "rate_sum": 0.0, "rows": 0, "success": 0, "errors": 0}
+        )
+        stats[0] += sign * level_sum
+        stats[1] += sign * level_count
+        stats[2] += sign * success
+        stats[3] += sign * errors
+        stats[4] += sign * rows
+        course["topics"][topic] += sign * rows
+        course["rate_sum"] += sign * rate_sum
+        course["rows"] += sign * rows
+        course["success"] += sign * success
+        course["errors"] += sign * errors
+        self._rows += sign * rows
+        self._level_sum += sign * level_sum
+        self._level_squares += sign * level_squares
+        self._level_count += sign * level_count
+        self._success += sign * success
+        self._errors += sign * errors
+        if stats[4] <= 0:
+            del self._topics[topic]
+        if course["topics"][topic] <= 0:
+            del course["topics"][topic]
+        if course["rows"] <= 0:
+            del self._courses[subject_id]
+
+    def fold_difficulty_groups(self, groups: Iterable[Mapping[str, Any]]) -> int:
+        """Reemplaza las sumas de los grupos (tema, curso) recibidos; devuelve cuántos cambiaron.
+
+        Un grupo con `row_count` 0 se elimina.
+        """
+        changed = 0
+        for raw in groups or []:
+            key = (raw.get("topic"), raw.get("subject_id"))
+            group = (
+                self._count(raw.get("row_count")),
+                self._number(raw.get("level_sum")),
+                self._count(raw.get("level_count")),
+                self._number(raw.get("level_squares")),
+                self._count(raw.get("success_count")),
+                self._count(raw.get("error_count")),
+                self._number(raw.get("rate_sum")),
+            )
+            previous = self._groups.get(key)
+            if previous == group or (previous is None and group[0] == 0):
+                continue
+            if previous is not None:
+                self._apply(key, previous, -1)
+                del self._groups[key]
+            if group[0] > 0:
+                self._apply(key, group, 1)
+                self._groups[key] = group
+            changed += 1
+        return changed
+
+    def fold_daily_activity(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """Reemplaza los totales de los días recibidos; devuelve cuántos cambiaron."""
+        changed = 0
+        for raw in rows or []:
+            if raw.get("day") is None:
+                continue
+            day = str(raw["day"])[:10]
+            values = tuple(self._count(raw.get(name)) for name in DAILY_ACTIVITY_COLUMNS[1:])
+            if self._days.get(day) != values:
+                self._days[day] = values
+                changed += 1
+        return changed
+
+    def subject_ids(self) -> set:
+        return {subject_id for subject_id in self._courses if subject_id is not None}
+
+    def to_analytics(
+        self, course_names: Optional[Mapping[Any, str]] = None, today: Optional[date] = None
+    ) -> LearningAnalytics:
+        """Arma el resultado a partir de las sumas acumuladas."""
+        level_count = self._level_count
+        variance = None
+        if level_count > 1:
+            mean = self._level_sum / level_count
+            variance = max(self._level_squares - level_count * mean * mean, 0.0) / (level_count - 1)
+
+        daily_rows = [
+            dict(zip(DAILY_ACTIVITY_COLUMNS, (day, *values)))
+            for day, values in sorted(self._days.items())
+        ]
+        daily, activity = split_daily_activity(daily_rows)
+        result = LearningAnalytics(
+            difficulty_rows=self._rows,
+            total_topics=len(self._topics),
+            avg_difficulty=self._level_sum / level_count if level_count else 0.0,
+            difficulty_variance=variance,
+            total_success=self._success,
+            total_errors=self._errors,
+            total_exercises=int(activity["exercises"].sum()),
+            completed_exercises=int(activity["completed"].sum()),
+            habits=study_habits_from_days(activity["day"], today=today),
+            daily=daily,
+            activity=activity,
+        )
+
+        if self._topics:
+            names = sorted(self._topics, key=str)
+            sums = np.array([self._topics[name] for name in names], dtype="float64")
+            attempts = sums[:, 2] + sums[:, 3]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                avg_difficulty = np.where(sums[:, 1] > 0, sums[:, 0] / sums[:, 1], np.nan)
+            result.topics = pd.DataFrame(
+                {
+                    "topic": names,
+                    "avg_difficulty": avg_difficulty,
+                    "success_count": sums[:, 2].astype("int64"),
+                    "error_count": sums[:, 3].astype("int64"),
+                    "attempts": attempts.astype("int64"),
+                    "success_rate": sums[:, 2] / np.maximum(attempts, 1),
+                }
+            )[TOPIC_COLUMNS]
+
+        if self._courses:
+            names = course_names or {}
+            courses = pd.DataFrame(
+                [
+                    {
+                        "subject_id": subject_id,
+                        "course_name": names.get(subject_id) or "Sin curso",
+                        "unique_topics": len(course["topics"]),
+                        "avg_success_rate": course["rate_sum"] / course["rows"],
+                        "success_count": course["success"],
+                        "error_count": course["errors"],
+                    }
+                    for subject_id, course in self._courses.items()
+                ]
+            )
+            result.courses = courses.sort_values("unique_topics", ascending=False, kind="stable")[
+                COURSE_COLUMNS
+            ].reset_index(drop=True)
+
+        _apply_topic_highlights(result)
+        return result
@@ -0,0 +1,110 @@
+"""Caché de figuras de Plotly indexado por la huella de sus datos."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from config.settings import FIGURE_CACHE_MAX_ENTRIES
+
+
+def _update_fingerprint(digest, part: Any):
+    if isinstance(part, pd.DataFrame):
+        header = (list(part.columns), [str(dtype) for dtype in part.dtypes], part.shape)
+        digest.update(repr(("DataFrame", header)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, pd.Series):
+        header = (part.name, str(part.dtype), part.shape)
+        digest.update(repr(("Series", header)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, np.ndarray) and part.dtype != object:
+        digest.update(repr(("ndarray", str(part.dtype), part.shape)).encode("utf-8"))
+        digest.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, (tuple, list)):
+        digest.update(repr((type(part).__name__, len(part))).encode("utf-8"))
+        for item in part:
+            _update_fingerprint(digest, item)
+    else:
+        digest.update(repr(part).encode("utf-8"))
+    digest.update(b"\x00")
+
+
+def data_fingerprint(*parts: Any) -> str:
+    """Hash estable de los datos de una figura (DataFrames, Series, arrays o valores simples)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update_fingerprint(digest, part)
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """LRU acotado de figuras ya construidas.
+
+    La clave combina el tipo de figura, la huella de los datos agregados y el
+    tema; si coincide, se devuelve el mismo `go.Figure` sin volver a pasar por
+    `px`/`go` ni por el procesamiento de los DataFrames. Se guarda el objeto y
+    no su JSON porque `st.plotly_chart` solo hace `to_dict` de un `go.Figure`,
+    mientras que un diccionario o un JSON reconstruido se vuelven a validar
+    (ver bench_figures.py). Las figuras devueltas son compartidas: no deben
+    modificarse.
+    """
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_MAX_ENTRIES):
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, go.Figure]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, build: Callable[[], go.Figure]) -> go.Figure:
+        with self._lock:
+            figure = self._entries.get(key)
+            if figure is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return figure
+            self.misses += 1
+
+        figure = build()
+        with self._lock:
+            self._entries[key] = figure
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return figure
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_figure_cache = FigureCache()
+
+
+def cached_figure(
+    kind: str, data: Any, build: Callable[[], go.Figure], theme: Optional[Any] = None
+) -> go.Figure:
+    """Devuelve la figura `kind` para `data`, construyéndola solo si cambió la huella.
+
+    `build` debe depender únicamente de `data` (y del tema): la figura guardada
+    se reutiliza para cualquier llamada con la misma huella.
+    """
+    key = f"{kind}:{data_fingerprint(data, theme)}"
+    return _figure_cache.get(key, build)
+
+
+def figure_cache_stats() -> dict:
+    return _figure_cache.stats()
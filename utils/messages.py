@@ -1,11 +1,18 @@
 """Funciones utilitarias relacionadas con el manejo de mensajes del chat."""
 
+import hashlib
 import json
 import re
-from typing import Any, List
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, Optional
 
 import pandas as pd
 
+from config.settings import MESSAGE_RENDER_CACHE_SIZE
+
 LATEX_INLINE_PATTERN = re.compile(r"\((\\[^()\n]*?)\)")
 LATEX_PAREN_PATTERN = re.compile(r"\\\((.*?)\\\)", re.DOTALL)
 LATEX_BRACKET_PATTERN = re.compile(r"\\\[(.*?)\\\]", re.DOTALL)
@@ -64,66 +71,253 @@ def display_text(content: Any) -> str:
             return ""
 
 
+def prepare_math_text(text: str) -> str:
+    """Normaliza los delimitadores LaTeX y limpia las barras sueltas antes de renderizar."""
+    normalized = _normalize_math_segments(text)
+    normalized = re.sub(r"(?m)^\s*\\\s*$", "", normalized)
+    normalized = re.sub(r"\\\s*\n", "\n", normalized)
+    return normalized.replace("\\\\", "")
+
+
+@dataclass(frozen=True)
+class NormalizedContent:
+    """Contenido de un mensaje listo para mostrar."""
+
+    text: str
+    math_text: str
+    content_hash: str
+
+
+def _normalize_content(content: Any) -> NormalizedContent:
+    text = display_text(content)
+    return NormalizedContent(
+        text=text,
+        math_text=prepare_math_text(text),
+        content_hash=hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest(),
+    )
+
+
+class NormalizedMessageCache:
+    """LRU acotado de contenido normalizado, indexado por id de mensaje.
+
+    Los mensajes guardados no cambian, así que basta con normalizarlos una vez
+    al descargarlos; las recargas posteriores solo consultan este caché.
+    """
+
+    def __init__(self, max_entries: int = MESSAGE_RENDER_CACHE_SIZE):
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, NormalizedContent]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, message: dict) -> NormalizedContent:
+        message_id = message.get("id")
+        if message_id is None:
+            # Mensajes locales aún sin guardar (pendientes de envío).
+            return _normalize_content(message.get("content"))
+        with self._lock:
+            cached = self._entries.get(message_id)
+            if cached is not None:
+                self._entries.move_to_end(message_id)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        normalized = _normalize_content(message.get("content"))
+        with self._lock:
+            self._entries[message_id] = normalized
+            self._entries.move_to_end(message_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return normalized
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_normalized_cache = NormalizedMessageCache()
+
+
+def normalized_content(message: dict) -> NormalizedContent:
+    """Devuelve el contenido normalizado del mensaje (calculado una sola vez por id)."""
+    return _normalized_cache.get(message)
+
+
+def ingest_messages(messages: Optional[Iterable[dict]]):
+    """Normaliza los mensajes recién descargados o guardados."""
+    for message in messages or []:
+        _normalized_cache.get(message)
+
+
+def normalized_cache_stats() -> dict:
+    return _normalized_cache.stats()
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Convierte un `created_at` ISO-8601 en segundos epoch (las fechas sin zona se toman como UTC)."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, datetime):
+            parsed = value
+        else:
+            parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        try:
+            return pd.to_datetime(value).timestamp()
+        except Exception:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class MessageDeduper:
+    """Lista de mensajes sin duplicados consecutivos que crece de forma incremental.
+
+    Un mensaje se descarta si tiene el mismo rol y contenido que el último
+    conservado y ambos se crearon con menos de `window_seconds` de diferencia.
+    Cada mensaje nuevo solo se compara con la cola de la lista, así que
+    agregar mensajes no obliga a recorrer los anteriores.
+    """
+
+    def __init__(self, window_seconds: int = 5, messages: Optional[List[dict]] = None):
+        self.window_seconds = window_seconds
+        # Se asume que `messages` ya viene sin duplicados.
+        self.messages: List[dict] = list(messages or [])
+        self._last_key = self._key(self.messages[-1]) if self.messages else None
+
+    @staticmethod
+    def _key(message: dict):
+        return (
+            message.get("role"),
+            normalized_content(message).content_hash,
+            parse_timestamp(message.get("created_at")),
+        )
+
+    def add(self, message: dict) -> bool:
+        """Agrega el mensaje si no duplica al último; devuelve si se agregó."""
+        key = self._key(message)
+        last = self._last_key
+        if last is not None and key[0] == last[0] and key[1] == last[1]:
+            if (
+                key[2] is not None
+                and last[2] is not None
+                and abs(key[2] - last[2]) <= self.window_seconds
+            ):
+                return False
+        self.messages.append(message)
+        self._last_key = key
+        return True
+
+    def extend(self, messages: Iterable[dict]) -> List[dict]:
+        """Agrega varios mensajes y devuelve los que se conservaron."""
+        return [message for message in messages or [] if self.add(message)]
+
+
 def dedup_messages(messages: List[dict], window_seconds: int = 5) -> List[dict]:
     """Elimina duplicados consecutivos en función del rol y el contenido."""
     try:
-        result = []
-        last = None
-
-        def _to_ts(message):
-            try:
-                return pd.to_datetime(message.get("created_at")).timestamp()
-            except Exception:
-                return None
-
-        for message in messages or []:
-            if not result:
-                result.append(message)
-                last = message
-                continue
-            same_role = message.get("role") == last.get("role")
-            same_text = display_text(message.get("content")) == display_text(last.get("content"))
-            if same_role and same_text:
-                current_ts, last_ts = _to_ts(message), _to_ts(last)
-                if (
-                    current_ts is not None
-                    and last_ts is not None
-                    and abs(current_ts - last_ts) <= window_seconds
-                ):
-                    continue
-            result.append(message)
-            last = message
-        return result
+        deduper = MessageDeduper(window_seconds)
+        deduper.extend(messages)
+        return deduper.messages
     except Exception:
         return messages or []
 
 
-def render_markdown_with_math(text: str):
-    """Renderiza texto con soporte para segmentos LaTeX usando st.markdown/st.latex."""
-    from streamlit import latex, markdown  # lazy import to evitar ciclos
+def append_deduped(
+    deduped: List[dict], new_messages: Iterable[dict], window_seconds: int = 5
+) -> List[dict]:
+    """Devuelve `deduped` más los mensajes nuevos que no dupliquen su cola.
+
+    `deduped` debe estar ya sin duplicados; no se vuelve a procesar.
+    """
+    deduper = MessageDeduper(window_seconds, deduped)
+    deduper.extend(new_messages)
+    return deduper.messages
 
-    normalized = _normalize_math_segments(text)
-    normalized = re.sub(r"(?m)^\s*\\\s*$", "", normalized)
-    normalized = re.sub(r"\\\s*\n", "\n", normalized)
-    normalized = normalized.replace("\\\\", "")
-    parts = MATH_TOKEN_PATTERN.split(normalized)
 
-    for part in parts:
+def math_to_markdown(normalized: str) -> str:
+    """Arma un único bloque markdown con las fórmulas en su lugar.
+
+    `st.markdown` interpreta `$...$` (en línea) y `$$...$$` (en bloque), así que
+    no hace falta emitir un `st.latex` por fragmento.
+    """
+    pieces = []
+    for part in MATH_TOKEN_PATTERN.split(normalized):
         if not part:
             continue
         stripped = part.strip()
-        if not stripped:
-            continue
         if stripped == "\\":
             continue
         clean = stripped
         while clean.endswith("\\"):
             clean = clean[:-1].rstrip()
-        sanitized_part = re.sub(r"\\\s*\n", "\n", part)
         if clean.startswith("$$") and clean.endswith("$$") and len(clean) > 4:
-            latex(clean[2:-2].strip())
+            # Las fórmulas en bloque deben ir en líneas propias.
+            pieces.append(f"\n\n$$\n{clean[2:-2].strip()}\n$$\n\n")
         elif clean.startswith("$") and clean.endswith("$") and len(clean) > 2:
-            latex(clean[1:-1].strip())
+            # Sin espacios junto a los `$` para que se reconozca como fórmula.
+            pieces.append(f"${clean[1:-1].strip()}$")
         else:
-            markdown(sanitized_part, unsafe_allow_html=True)
+            pieces.append(re.sub(r"\\\s*\n", "\n", part))
+    return "".join(pieces).strip()
+
+
+class MarkdownCache:
+    """LRU acotado del markdown final de cada mensaje, indexado por hash de contenido."""
+
+    def __init__(self, max_entries: int = MESSAGE_RENDER_CACHE_SIZE):
+        self._max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content: NormalizedContent) -> str:
+        key = content.content_hash
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        rendered = math_to_markdown(content.math_text)
+        with self._lock:
+            self._entries[key] = rendered
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_markdown_cache = MarkdownCache()
+
+
+def message_markdown(message: dict) -> str:
+    """Markdown listo para `st.markdown` del mensaje (memoizado por hash de contenido)."""
+    return _markdown_cache.get(normalized_content(message))
+
+
+def markdown_cache_stats() -> dict:
+    return _markdown_cache.stats()
+
+
+def render_message(message: dict):
+    """Renderiza un mensaje del chat en un único elemento markdown."""
+    from streamlit import markdown  # lazy import to evitar ciclos
+
+    markdown(message_markdown(message), unsafe_allow_html=True)
+
+
+def render_markdown_with_math(text: str):
+    """Renderiza texto con soporte para segmentos LaTeX en un único st.markdown."""
+    from streamlit import markdown  # lazy import to evitar ciclos
 
+    markdown(math_to_markdown(prepare_math_text(text)), unsafe_allow_html=True)
@@ -0,0 +1,37 @@
+"""Creación de directorios y archivos locales accesibles solo por el usuario del servidor."""
+
+import os
+
+
+def _check_owner(path: str, info: os.stat_result):
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{path} pertenece a otro usuario")
+
+
+def ensure_private_dir(path: str) -> str:
+    """Crea `path` con permisos 0700 (o los corrige) y verifica que sea propio."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.path.islink(path):
+        raise PermissionError(f"{path} no puede ser un enlace simbólico")
+    info = os.stat(path)
+    _check_owner(path, info)
+    if os.name == "posix" and info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def ensure_private_file(path: str) -> str:
+    """Crea `path` (y su directorio) con permisos 0600 si no existe."""
+    directory = os.path.dirname(path)
+    if directory:
+        ensure_private_dir(directory)
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+    fd = os.open(path, flags, 0o600)
+    try:
+        info = os.fstat(fd)
+        _check_owner(path, info)
+        if os.name == "posix" and info.st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+    return path
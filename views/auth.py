@@ -7,7 +7,9 @@ import streamlit as st
 from uuid import uuid4
 
 from services.auth_store import save_auth_session
-from services.supabase_client import SupabaseClient
+from services.client_pool import get_client_pool
+from services.supabase_service import invalidate_user_caches
+from services.token_manager import get_token_manager
 from utils.query_params import set_query_params
 
 
@@ -49,8 +51,12 @@ def _trigger_rerun():
         raise RuntimeError("No se encontró método de recarga compatible en Streamlit.")
 
 
-def render_login(sb_client: SupabaseClient):
-    """Renderiza el formulario de inicio de sesión y gestiona el login."""
+def render_login():
+    """Renderiza el formulario de inicio de sesión y gestiona el login.
+
+    El inicio de sesión se hace con el cliente del pool asignado al
+    `auth_token` de la pestaña, nunca con el cliente anónimo compartido.
+    """
     st.title("Tutor Virtual Personalizado")
     st.subheader("Inicia sesión con tu cuenta")
 
@@ -68,6 +74,8 @@ def render_login(sb_client: SupabaseClient):
             return
 
         try:
+            auth_token = st.session_state.get("auth_token") or str(uuid4())
+            sb_client = get_client_pool().acquire(auth_token)
             auth_response = sb_client.sign_in_with_password(email, password)
             session = _extract_value(auth_response, "session")
             user = _extract_value(auth_response, "user")
@@ -85,9 +93,9 @@ def render_login(sb_client: SupabaseClient):
             st.session_state.supabase_access_token = session_data.get("access_token")
             st.session_state.supabase_refresh_token = session_data.get("refresh_token")
 
-            auth_token = st.session_state.get("auth_token") or str(uuid4())
             st.session_state.auth_token = auth_token
             save_auth_session(auth_token, session_data, user_data)
+            get_token_manager().track(auth_token, session_data)
             set_query_params(auth_token=auth_token)
 
             try:
@@ -98,10 +106,7 @@ def render_login(sb_client: SupabaseClient):
             except Exception:
                 pass
 
-            try:
-                st.cache_data.clear()
-            except Exception:
-                pass
+            invalidate_user_caches(user_data.get("id"))
 
             st.success("Inicio de sesión exitoso. Redirigiendo al dashboard…")
             _trigger_rerun()
@@ -5,16 +5,35 @@ import uuid
 from datetime import datetime
 
 import pandas as pd
-import requests
 import streamlit as st
-import streamlit.components.v1 as components
-
-from config.settings import N8N_WEBHOOK_URL
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from config.settings import (
+    CHAT_FEED_WAIT_SLICE,
+    CHAT_PAGE_SIZE,
+    CHAT_WINDOW_SIZE,
+    TUTOR_PENDING_POLL_SECONDS,
+)
+from services.chat_feed import get_chat_feed
+from services.client_pool import get_client_pool
 from services.supabase_client import SupabaseClient
-from services.supabase_service import cached_chat_messages, cached_chat_sessions
-from utils.messages import dedup_messages, display_text, render_markdown_with_math
+from services.supabase_service import (
+    cached_chat_messages,
+    cached_chat_sessions,
+    chat_has_older,
+    invalidate_chat_sessions,
+    load_older_chat_messages,
+    sync_chat_messages,
+    use_client,
+)
+from services.tutor_dispatcher import JOB_FAILED, DispatcherBusy, get_tutor_dispatcher
+from utils.messages import append_deduped, render_message
 from utils.query_params import get_query_params, set_query_params
 
+# `st.fragment` (o `experimental_fragment` en versiones anteriores) permite
+# volver a ejecutar solo una parte del script.
+_FRAGMENT = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
 
 def render_chat_interface(sb_client: SupabaseClient, available_subjects):
     """Renderiza la interfaz principal del chat."""
@@ -73,10 +92,7 @@ def render_chat_interface(sb_client: SupabaseClient, available_subjects):
                 new_id = new_session_rows[0]["id"]
                 st.session_state.current_session = new_id
                 st.session_state.chat_history = []
-                try:
-                    st.cache_data.clear()
-                except Exception:
-                    pass
+                invalidate_chat_sessions(st.session_state.user_id)
                 try:
                     chat_sessions = sb_client.get_chat_sessions(st.session_state.user_id) or []
                     chat_sessions = sorted(chat_sessions, key=lambda s: s.get("created_at", ""))
@@ -113,7 +129,8 @@ def render_chat_interface(sb_client: SupabaseClient, available_subjects):
             def on_session_change():
                 sid = st.session_state.session_selector
                 st.session_state.current_session = sid
-                st.session_state.chat_history = dedup_messages(cached_chat_messages(sid))
+                st.session_state.chat_window = CHAT_WINDOW_SIZE
+                st.session_state.chat_history = cached_chat_messages(sid)[-CHAT_WINDOW_SIZE:]
                 set_query_params(sid=sid)
 
             selected_id = st.selectbox(
@@ -129,119 +146,272 @@ def render_chat_interface(sb_client: SupabaseClient, available_subjects):
         st.subheader("Chat")
 
         if st.session_state.current_session:
-            chat_container = st.container()
-            with chat_container:
-                if not st.session_state.get("chat_history"):
-                    messages = cached_chat_messages(st.session_state.current_session)
-                    st.session_state.chat_history = dedup_messages(messages)
-
-                pending = st.session_state.get("pending_local") or []
-                base_messages = st.session_state.get("chat_history", [])
-                display_messages = dedup_messages(base_messages + pending)
-
-                if not display_messages:
-                    st.info("No hay mensajes en esta sesión.")
-                else:
-                    if hasattr(st, "chat_message"):
-                        for message in display_messages:
-                            role = "user" if message.get("role") == "user" else "assistant"
-                            with st.chat_message(role):
-                                render_markdown_with_math(display_text(message.get("content")))
-                    else:
-                        for message in display_messages:
-                            text = display_text(message.get("content"))
-                            if message.get("role") == "user":
-                                st.markdown("**Tú:**")
-                                render_markdown_with_math(text)
-                            else:
-                                st.markdown("**Tutor:**")
-                                render_markdown_with_math(text)
-                            st.markdown("---")
-
-            if st.session_state.get("_clear_user_input"):
-                try:
-                    st.session_state["_clear_user_input"] = False
-                    st.session_state["user_input"] = ""
-                except Exception:
-                    pass
+            run_every = None
+            polling_job = False
+            if _FRAGMENT is not None:
+                if st.session_state.get("pending_job"):
+                    # Mientras el tutor responde, el fragmento se consulta solo
+                    # cada segundo en lugar de bloquear el script esperando.
+                    run_every = TUTOR_PENDING_POLL_SECONDS
+                    polling_job = True
+                elif st.session_state.get("auto_refresh"):
+                    run_every = _auto_refresh_interval()
+            # El panel (mensajes + formulario) se vuelve a ejecutar por sí solo:
+            # al enviar, al esperar la respuesta y con la recarga automática,
+            # sin repetir la restauración de sesión, la barra lateral ni las
+            # consultas del resto de la página.
+            pane = _render_chat_pane
+            if _FRAGMENT is not None:
+                pane = _FRAGMENT(_render_chat_pane, run_every=run_every)
+            pane(sb_client, selected_subject, selected_subject_id, polling_job)
+        else:
+            st.info("Selecciona o crea una sesión de chat para comenzar.")
 
-            if st.session_state.get("_clear_user_input"):
-                st.session_state["_clear_user_input"] = False
-                if "user_input" in st.session_state:
-                    st.session_state["user_input"] = ""
-                st.rerun()
 
-            with st.form("chat_form", clear_on_submit=False):
-                user_input = st.text_area("Escribe tu pregunta:", key="user_input")
-                sending = bool(st.session_state.get("sending", False))
-                has_pending = bool(st.session_state.get("pending_local"))
+def _auto_refresh_interval() -> int:
+    try:
+        return int(st.session_state.get("auto_refresh_interval", 5))
+    except Exception:
+        return 5
 
-                send_clicked = st.form_submit_button(
-                    "Enviar Mensaje", disabled=(sending or has_pending)
-                )
 
-                if send_clicked and user_input:
-                    st.session_state.sending = True
-                    st.session_state.pending_local = [
-                        {
-                            "role": "user",
-                            "content": user_input,
-                            "pending": True,
-                            "created_at": datetime.now().isoformat(),
-                        }
-                    ]
-                    st.session_state["_clear_user_input"] = True
-
-                    send_message_to_tutor(
-                        sb_client,
-                        user_input,
-                        selected_subject,
-                        selected_subject_id,
-                    )
-                    st.rerun()
-
-            composing = bool(
-                st.session_state.get("sending")
-                or st.session_state.get("pending_local")
-                or st.session_state.get("user_input")
-            )
-            if st.session_state.get("auto_refresh") and not composing:
-                try:
-                    interval_ms = int(st.session_state.get("auto_refresh_interval", 5)) * 1000
-                except Exception:
-                    interval_ms = 5000
-                sid = st.session_state.get("current_session", "")
-                subj = st.session_state.get("selected_subject", "")
-                components.html(
-                    f"""
-                    <script>
-                      const interval = {interval_ms};
-                      setTimeout(() => {{
-                        try {{
-                          const url = new URL(window.location.href);
-                          url.searchParams.set('sid', '{sid}');
-                          url.searchParams.set('sub', '{subj}');
-                          url.searchParams.set('auto', '1');
-                          url.searchParams.set('ival', String({interval_ms}/1000));
-                          url.searchParams.set('_tick', Date.now().toString());
-                          window.location.replace(url.toString());
-                        }} catch (e) {{
-                          window.location.reload();
-                        }}
-                      }}, interval);
-                    </script>
-                    """,
-                    height=0,
-                    width=0,
-                )
+def _running_as_fragment() -> bool:
+    """Indica si la ejecución actual es una recarga parcial de un fragmento."""
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and getattr(ctx, "fragment_ids_this_run", None))
+
+
+def _rerun_pane():
+    """Vuelve a ejecutar solo el panel del chat si corre como fragmento.
+
+    En una ejecución completa `st.rerun(scope="fragment")` lanza
+    `StreamlitAPIException`, así que entonces se recarga la página entera.
+    """
+    if _running_as_fragment():
+        try:
+            st.rerun(scope="fragment")
+        except TypeError:
+            # Versiones con `experimental_fragment` sin `scope`.
+            pass
+    st.rerun()
+
+
+def _render_chat_pane(
+    sb_client: SupabaseClient,
+    selected_subject: str,
+    selected_subject_id: str,
+    polling_job: bool = False,
+):
+    """Lista de mensajes y formulario de envío de la sesión actual.
+
+    `polling_job` indica que el fragmento se registró con `run_every` para
+    seguir un envío pendiente.
+    """
+    # Las recargas del fragmento corren en otro hilo: no heredan el cliente
+    # fijado por `main` ni su retención en el pool.
+    with get_client_pool().holding(sb_client):
+        if sb_client.closed:
+            # El pool lo desalojó desde la última recarga completa; esta
+            # vuelve a pedir un cliente.
+            st.rerun()
+        use_client(sb_client, st.session_state.get("user_id"))
+        _chat_pane_contents(sb_client, selected_subject, selected_subject_id, polling_job)
+
+
+def _chat_pane_contents(
+    sb_client: SupabaseClient,
+    selected_subject: str,
+    selected_subject_id: str,
+    polling_job: bool,
+):
+    waiting_reply = _check_pending_job()
+    if _FRAGMENT is not None and waiting_reply != polling_job:
+        # El envío empezó o terminó: una recarga completa registra el
+        # fragmento con (o sin) la consulta periódica.
+        st.rerun()
+    # Se consume aquí, después de la posible recarga, para que la
+    # sincronización ocurra en la ejecución que pinta los mensajes.
+    reply_ready = st.session_state.pop("chat_needs_sync", False)
+    _show_tutor_notice()
+    session_id = st.session_state.current_session
+    feed_version = get_chat_feed().version(session_id)
+    feed_changed = st.session_state.get("feed_seen") != (session_id, feed_version)
+    st.session_state.feed_seen = (session_id, feed_version)
+    chat_container = st.container()
+    with chat_container:
+        if reply_ready or feed_changed:
+            messages = sync_chat_messages(session_id)
         else:
-            st.info("Selecciona o crea una sesión de chat para comenzar.")
+            messages = cached_chat_messages(session_id)
+
+        # Solo se muestran los últimos `chat_window` mensajes; el resto
+        # queda en el almacén del proceso y se pide por páginas.
+        if st.session_state.get("chat_window_session") != session_id:
+            st.session_state.chat_window_session = session_id
+            st.session_state.chat_window = CHAT_WINDOW_SIZE
+        window = st.session_state.get("chat_window", CHAT_WINDOW_SIZE)
+        hidden = max(len(messages) - window, 0)
+        if hidden or chat_has_older(session_id):
+            if st.button("⬆️ Cargar mensajes anteriores", key="load_older_messages"):
+                st.session_state.chat_window = window + CHAT_PAGE_SIZE
+                if hidden < CHAT_PAGE_SIZE and chat_has_older(session_id):
+                    load_older_chat_messages(session_id)
+                _rerun_pane()
+        visible = messages[-window:]
+        st.session_state.chat_history = visible
+
+        pending = st.session_state.get("pending_local") or []
+        display_messages = append_deduped(visible, pending)
+
+        if not display_messages:
+            st.info("No hay mensajes en esta sesión.")
+        else:
+            if hasattr(st, "chat_message"):
+                for message in display_messages:
+                    role = "user" if message.get("role") == "user" else "assistant"
+                    with st.chat_message(role):
+                        render_message(message)
+            else:
+                for message in display_messages:
+                    if message.get("role") == "user":
+                        st.markdown("**Tú:**")
+                    else:
+                        st.markdown("**Tutor:**")
+                    render_message(message)
+                    st.markdown("---")
+
+    if st.session_state.get("_clear_user_input"):
+        try:
+            st.session_state["_clear_user_input"] = False
+            st.session_state["user_input"] = ""
+        except Exception:
+            pass
+
+    if st.session_state.get("_clear_user_input"):
+        st.session_state["_clear_user_input"] = False
+        if "user_input" in st.session_state:
+            st.session_state["user_input"] = ""
+        _rerun_pane()
+
+    with st.form("chat_form", clear_on_submit=False):
+        user_input = st.text_area("Escribe tu pregunta:", key="user_input")
+        sending = bool(st.session_state.get("sending", False))
+        has_pending = bool(st.session_state.get("pending_local"))
+
+        send_clicked = st.form_submit_button(
+            "Enviar Mensaje", disabled=(sending or has_pending)
+        )
+
+        if send_clicked and user_input:
+            st.session_state.sending = True
+            st.session_state.pending_local = [
+                {
+                    "role": "user",
+                    "content": user_input,
+                    "pending": True,
+                    "created_at": datetime.now().isoformat(),
+                }
+            ]
+            st.session_state["_clear_user_input"] = True
+
+            send_message_to_tutor(
+                sb_client,
+                user_input,
+                selected_subject,
+                selected_subject_id,
+            )
+            # Recarga completa: vuelve a registrar el fragmento con `run_every`
+            # para seguir el envío sin bloquear el script.
+            st.rerun()
+
+    if waiting_reply and _FRAGMENT is None:
+        # Sin fragmentos: se espera el aviso del feed en tramos cortos.
+        _wait_for_new_messages(session_id, feed_version, TUTOR_PENDING_POLL_SECONDS)
+        st.rerun()
+
+    composing = bool(
+        st.session_state.get("sending")
+        or st.session_state.get("pending_local")
+        or st.session_state.get("user_input")
+    )
+    if _FRAGMENT is None and st.session_state.get("auto_refresh") and not composing:
+        # Sin fragmentos: se espera un aviso del feed (o el intervalo) y se
+        # vuelve a ejecutar el script con los datos en caché.
+        _wait_for_new_messages(session_id, feed_version, _auto_refresh_interval())
+        st.rerun()
+
+
+def _wait_for_new_messages(session_id: str, seen_version: int, timeout: float):
+    """Espera un aviso de mensajes nuevos de la sesión, como máximo `timeout` segundos.
+
+    La espera se hace en tramos cortos y entre tramos se actualiza un elemento
+    vacío, lo que permite a Streamlit interrumpirla si el usuario interactúa.
+    """
+    feed = get_chat_feed()
+    placeholder = st.empty()
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        version = feed.wait_for_change(
+            session_id, seen_version, min(CHAT_FEED_WAIT_SLICE, remaining)
+        )
+        if version > seen_version:
+            return
+        placeholder.empty()
+
+
+def _check_pending_job():
+    """Revisa el trabajo pendiente del tutor y devuelve si sigue en curso.
+
+    Si acaba de terminar marca `chat_needs_sync` para que la siguiente
+    ejecución del panel sincronice los mensajes de inmediato.
+    """
+    job_id = st.session_state.get("pending_job")
+    if not job_id:
+        return False
+
+    job = get_tutor_dispatcher().get(job_id)
+    if job is not None and not job.finished:
+        return True
+
+    # El aviso se guarda para mostrarlo tras la recarga que quita la consulta
+    # periódica del fragmento.
+    if job is None:
+        pass
+    elif job.state == JOB_FAILED:
+        st.session_state.tutor_notice = ("error", job.error or "No fue posible contactar al tutor.")
+    elif not job.reply_received:
+        st.session_state.tutor_notice = ("toast", "Aún procesando respuesta del tutor...")
+
+    st.session_state.pending_job = None
+    st.session_state.pending_local = []
+    st.session_state.sending = False
+    st.session_state.chat_needs_sync = True
+    return False
+
+
+def _show_tutor_notice():
+    """Muestra (una sola vez) el aviso del último envío terminado."""
+    notice = st.session_state.pop("tutor_notice", None)
+    if not notice:
+        return
+    kind, text = notice
+    if kind == "error":
+        st.error(text)
+        return
+    try:
+        st.toast(text, icon="⏳")
+    except Exception:
+        pass
 
 
 def send_message_to_tutor(sb_client: SupabaseClient, message: str, subject: str, subject_id: str):
-    """Envía un mensaje al tutor externo y actualiza el estado del chat."""
+    """Encola el mensaje para el tutor externo y regresa sin esperar la respuesta."""
+    session_id = st.session_state.current_session
     try:
-        previous_messages = sb_client.get_chat_messages(st.session_state.current_session) or []
+        previous_messages = sync_chat_messages(session_id) or []
     except Exception:
         previous_messages = []
 
@@ -251,7 +421,7 @@ def send_message_to_tutor(sb_client: SupabaseClient, message: str, subject: str,
 
     payload = {
         "user_id": st.session_state.user_id,
-        "session_id": st.session_state.current_session,
+        "session_id": session_id,
         "subject": subject.lower(),
         "subject_id": subject_id,
         "message": message,
@@ -262,45 +432,16 @@ def send_message_to_tutor(sb_client: SupabaseClient, message: str, subject: str,
     headers = {"Accept": "text/plain, text/markdown;q=0.9, */*;q=0.1"}
 
     try:
-        response = requests.post(N8N_WEBHOOK_URL, json=payload, headers=headers, timeout=25)
-    except Exception as exc:
-        st.error(f"Error al llamar al webhook del tutor: {exc}")
-        st.session_state.sending = False
-        return
-
-    if not (200 <= response.status_code < 300):
-        st.error(f"Tutor respondió {response.status_code}: {response.text}")
+        job = get_tutor_dispatcher().submit(
+            session_id,
+            payload,
+            headers=headers,
+            baseline_watermark=previous_messages[-1].get("created_at") if previous_messages else None,
+        )
+    except DispatcherBusy as exc:
+        st.error(f"{exc} Intenta nuevamente en unos segundos.")
         st.session_state.sending = False
-        return
-
-    try:
-        st.cache_data.clear()
-    except Exception:
-        pass
-
-    start = time.time()
-    latest = previous_messages
-
-    while time.time() - start < 8:
-        try:
-            latest = sb_client.get_chat_messages(st.session_state.current_session) or []
-        except Exception:
-            latest = previous_messages
-
-        if len(latest) > len(previous_messages):
-            break
-
-        time.sleep(0.25)
-
-    st.session_state.chat_history = dedup_messages(latest)
-
-    if len(latest) > len(previous_messages):
         st.session_state.pending_local = []
-    else:
-        try:
-            st.toast("Aún procesando respuesta del tutor...", icon="⏳")
-        except Exception:
-            pass
-
-    st.session_state.sending = False
+        return
 
+    st.session_state.pending_job = job.id
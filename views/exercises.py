@@ -1,10 +1,11 @@
 """Componentes relacionados con la generación y evaluación de ejercicios."""
 
-import requests
 import streamlit as st
 
-from config.settings import N8N_WEBHOOK_URL
-from services.supabase_client import SupabaseClient
+from services.chat_feed import get_chat_feed
+from services.supabase_client import EXERCISE_LIST_COLUMNS, SupabaseClient
+from services.supabase_service import cached_exercise_detail, invalidate_exercise
+from services.webhook_client import post_to_webhook
 
 
 def render_exercises_interface(sb_client: SupabaseClient, available_subjects):
@@ -31,7 +32,9 @@ def render_exercises_interface(sb_client: SupabaseClient, available_subjects):
     with col2:
         st.subheader("Ejercicios Recientes")
 
-        exercises = sb_client.get_exercise_stats(st.session_state.user_id)
+        exercises = sb_client.get_exercise_stats(
+            st.session_state.user_id, columns=EXERCISE_LIST_COLUMNS
+        )
 
         if not exercises:
             st.info("No hay ejercicios generados todavía.")
@@ -39,7 +42,18 @@ def render_exercises_interface(sb_client: SupabaseClient, available_subjects):
 
         for exercise in exercises:
             with st.expander(f"Ejercicio - {exercise['topic']}"):
-                st.write(f"**Enunciado:** {exercise['exercise_text']}")
+                # Los textos largos se descargan solo cuando el alumno abre el detalle.
+                detail_key = f"detail_open_{exercise['id']}"
+                if not st.session_state.get(detail_key):
+                    if st.button("📄 Ver enunciado", key=f"load_{exercise['id']}"):
+                        st.session_state[detail_key] = True
+                detail = (
+                    cached_exercise_detail(exercise["id"]) or {}
+                    if st.session_state.get(detail_key)
+                    else {}
+                )
+                if detail:
+                    st.write(f"**Enunciado:** {detail.get('exercise_text', '')}")
 
                 show_input_key = f"show_input_{exercise['id']}"
                 feedback_key = f"feedback_{exercise['id']}"
@@ -76,22 +90,26 @@ def render_exercises_interface(sb_client: SupabaseClient, available_subjects):
                                 subj["subjects"]["name"] if subj and subj.get("subjects") else None
                             )
 
+                        if not detail:
+                            detail = cached_exercise_detail(exercise["id"]) or {}
+
                         payload = {
                             "user_id": exercise["user_id"],
                             "subject_id": exercise["subject_id"],
                             "subject": subject_value,
                             "difficulty": exercise["difficulty_level"],
                             "topic": exercise["topic"],
-                            "enunciado": exercise["exercise_text"],
+                            "enunciado": detail.get("exercise_text"),
                             "user_answer": respuesta,
                             "action": "solution",
                             "exercise_id": exercise["id"],
                         }
 
                         try:
-                            response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=20)
+                            response = post_to_webhook(payload)
 
                             if response.status_code == 200:
+                                invalidate_exercise(exercise["id"])
                                 result = response.json()
 
                                 respuesta_n8n = result.get("Respuesta", "").lower()
@@ -124,8 +142,9 @@ def render_exercises_interface(sb_client: SupabaseClient, available_subjects):
                 if exercise.get("completed"):
                     st.success("✅ Completado")
 
-                    if exercise.get("user_answer"):
-                        st.markdown(f"**Tu respuesta:** {exercise['user_answer']}")
+                    user_answer = exercise.get("user_answer") or detail.get("user_answer")
+                    if user_answer:
+                        st.markdown(f"**Tu respuesta:** {user_answer}")
                 else:
                     st.warning("⏳ Pendiente")
 
@@ -149,7 +168,7 @@ def generate_custom_exercise(sb_client: SupabaseClient, subject: str, topic: str
     }
 
     try:
-        response = requests.post(N8N_WEBHOOK_URL, json=payload)
+        response = post_to_webhook(payload)
         if response.status_code == 200:
             st.success("¡Ejercicio generado!")
     except Exception as exc:
@@ -168,7 +187,7 @@ def generate_exercise(sb_client: SupabaseClient, subject: str, subject_id: str):
     }
 
     try:
-        response = requests.post(N8N_WEBHOOK_URL, json=payload)
+        response = post_to_webhook(payload)
         if response.status_code == 200:
             exercise = response.json()
             sb_client.save_chat_message(
@@ -177,6 +196,7 @@ def generate_exercise(sb_client: SupabaseClient, subject: str, subject_id: str):
                 exercise,
                 "exercise",
             )
+            get_chat_feed().publish(st.session_state.current_session)
             st.session_state.chat_history.append(
                 {"role": "assistant", "content": exercise, "message_type": "exercise"}
             )
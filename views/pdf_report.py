@@ -14,16 +14,20 @@ from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, Tabl
 import streamlit as st
 import streamlit.components.v1 as components
 
+from services.query_bundle import load_report_data
 from services.supabase_client import SupabaseClient
+from utils.analytics import study_habits_from_activity
 
 
 def render_pdf_report(sb_client: SupabaseClient):
     """Genera un reporte PDF con estadísticas recopiladas."""
     st.header("📄 Generar Reporte PDF")
 
-    difficulty_data = sb_client.get_difficulty_stats(st.session_state.user_id)
-    exercise_data = sb_client.get_exercise_stats(st.session_state.user_id)
-    chat_sessions = sb_client.get_chat_sessions(st.session_state.user_id)
+    # Las seis consultas son independientes: se lanzan en paralelo.
+    report_data = load_report_data(sb_client, st.session_state.user_id)
+    difficulty_data = report_data.difficulty
+    exercise_data = report_data.exercises
+    chat_sessions = report_data.chat_sessions or []
 
     if not difficulty_data:
         st.warning("No hay suficientes datos para generar un reporte.")
@@ -152,7 +156,6 @@ def render_pdf_report(sb_client: SupabaseClient):
         df_diff["last_practiced"] = pd.to_datetime(df_diff["last_practiced"], errors="coerce")
     if not df_ex.empty and "created_at" in df_ex.columns:
         df_ex["created_at"] = pd.to_datetime(df_ex["created_at"], errors="coerce")
-        df_ex["date"] = df_ex["created_at"].dt.date
 
     # Análisis por tema con métricas avanzadas
     df_topics = df_diff.groupby("topic").agg(
@@ -204,32 +207,26 @@ def render_pdf_report(sb_client: SupabaseClient):
     study_frequency = "moderada"
     current_streak = 0
     
-    if not df_ex.empty and "date" in df_ex.columns:
-        dates = sorted(set(df_ex["date"].tolist()))
-        if len(dates) > 0:
-            today = pd.Timestamp.now(tz=None).date()
-            day = today
-            while day in dates:
-                current_streak += 1
-                day -= pd.Timedelta(days=1)
-            
-            if len(dates) > 1:
-                intervals = [(dates[i] - dates[i-1]).days for i in range(1, len(dates))]
-                avg_interval = sum(intervals) / len(intervals) if intervals else 0
-                if avg_interval <= 2:
-                    study_frequency = "alta"
-                elif avg_interval <= 5:
-                    study_frequency = "moderada"
-                else:
-                    study_frequency = "baja"
-                
-                interval_variance = pd.Series(intervals).var() if len(intervals) > 1 else 0
-                if interval_variance < 5:
-                    study_consistency = "muy regular"
-                elif interval_variance < 15:
-                    study_consistency = "regular"
-                else:
-                    study_consistency = "irregular"
+    # Racha e intervalos desde el resumen diario (user_daily_activity).
+    if report_data.daily_activity:
+        habits = study_habits_from_activity(report_data.daily_activity)
+        current_streak = habits.current_streak
+        if habits.avg_interval_days is not None:
+            avg_interval = habits.avg_interval_days
+            if avg_interval <= 2:
+                study_frequency = "alta"
+            elif avg_interval <= 5:
+                study_frequency = "moderada"
+            else:
+                study_frequency = "baja"
+
+            interval_variance = habits.interval_variance or 0
+            if interval_variance < 5:
+                study_consistency = "muy regular"
+            elif interval_variance < 15:
+                study_consistency = "regular"
+            else:
+                study_consistency = "irregular"
 
     # Clasificación mejorada de riesgo
     def classify_risk_advanced(row):
@@ -441,8 +438,8 @@ def render_pdf_report(sb_client: SupabaseClient):
     story.append(Paragraph("<b>4. Análisis y Recomendaciones por Curso</b>", styles["TituloSeccion"]))
     
     # Obtener suscripciones del usuario y mapeo de materias
-    user_subscriptions = sb_client.get_user_subscriptions(st.session_state.user_id) or []
-    all_subjects = sb_client.get_subjects()
+    user_subscriptions = report_data.subscriptions or []
+    all_subjects = report_data.subjects or []
     subjects_map = {sub["id"]: sub["name"] for sub in all_subjects}
     
     # Cursos a los que el usuario está suscrito
@@ -5,7 +5,85 @@ import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
+from config.settings import ACTIVITY_HEATMAP_WEEKS, SHOW_CACHE_STATS
+from services.stats_store import get_stats_store
 from services.supabase_client import SupabaseClient
+from utils.analytics import CalendarHeatmap, calendar_heatmap, heatmap_window_start
+from utils.figures import cached_figure, figure_cache_stats
+
+DAY_LABELS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+def _theme_key():
+    """Opciones de tema que cambian el aspecto de las figuras."""
+    try:
+        return (st.get_option("theme.base"), st.get_option("theme.primaryColor"))
+    except Exception:
+        return None
+
+
+def _topic_difficulty_figure(df_plot: pd.DataFrame) -> go.Figure:
+    fig = px.pie(
+        df_plot,
+        names="topic",
+        values="avg_difficulty",
+        hole=0.35,
+    )
+
+    fig.update_layout(legend_title="Temas")
+    return fig
+
+
+def _daily_progress_figure(df_daily: pd.DataFrame) -> go.Figure:
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df_daily["day"], y=df_daily["success_count"], name="Éxitos"))
+    fig.add_trace(go.Scatter(x=df_daily["day"], y=df_daily["error_count"], name="Errores"))
+    fig.update_layout(xaxis_title="Fecha", yaxis_title="Cantidad")
+    return fig
+
+
+def _activity_heatmap_figure(heatmap: CalendarHeatmap) -> go.Figure:
+    return px.imshow(
+        heatmap.counts,
+        labels=dict(x="Semana", y="Día", color="Ejercicios"),
+        x=heatmap.week_labels,
+        y=DAY_LABELS,
+        aspect="auto",
+        color_continuous_scale="YlGnBu",
+    )
+
+
+def _course_topics_figure(exercises_by_course: pd.DataFrame) -> go.Figure:
+    fig1 = px.bar(
+        exercises_by_course,
+        x="ejercicios_unicos",
+        y="course",
+        title="Cantidad de temas por curso",
+        orientation="h",
+        text_auto=True,
+    )
+
+    fig1.update_layout(
+        xaxis_title="Cantidad de temas",
+        yaxis_title="Curso",
+        title_x=0.3
+    )
+    return fig1
+
+
+def _course_success_figure(success_by_course: pd.DataFrame) -> go.Figure:
+    fig2 = px.pie(
+        success_by_course,
+        names="course",
+        values="success_rate",
+        hole=0.45,
+    )
+
+    fig2.update_traces(
+        textinfo="percent+label",
+        pull=[0.02] * len(success_by_course)
+    )
+    return fig2
 
 
 def render_statistics_interface(sb_client: SupabaseClient):
@@ -13,15 +91,18 @@ def render_statistics_interface(sb_client: SupabaseClient):
     st.title("📊 Panel de Estadísticas de Aprendizaje")
     st.markdown("Aquí puedes revisar tu evolución, hábitos y desempeño general.")
 
-    difficulty_data = sb_client.get_difficulty_stats(st.session_state.user_id, subject_id=None)
-    exercise_data = sb_client.get_exercise_stats(st.session_state.user_id)
+    # Si los datos no cambiaron desde la última visita se reutilizan las
+    # estadísticas guardadas; si cambiaron, solo se descargan las filas nuevas.
+    analytics = get_stats_store().load(sb_client, st.session_state.user_id)
 
-    if not difficulty_data and not exercise_data:
+    if not analytics.has_data:
         st.info("Aún no hay datos suficientes para mostrar estadísticas.")
         return
 
-    df_difficulty = pd.DataFrame(difficulty_data)
-    df_exercises = pd.DataFrame(exercise_data) if exercise_data else pd.DataFrame()
+    df_topics = analytics.topics
+    df_daily = analytics.daily
+    df_activity = analytics.activity
+    df_courses = analytics.courses
 
     st.markdown("### 📌 Resumen General")
 
@@ -29,229 +110,138 @@ def render_statistics_interface(sb_client: SupabaseClient):
         col1, col2, col3, col4 = st.columns(4)
 
         with col1:
-            total_topics = len(df_difficulty["topic"].unique()) if not df_difficulty.empty else 0
-            st.metric("Temas Estudiados", total_topics)
+            st.metric("Temas Estudiados", analytics.total_topics)
 
         with col2:
-            avg_difficulty = (
-                df_difficulty["difficulty_level"].mean() if not df_difficulty.empty else 0
-            )
-            st.metric("Dificultad Promedio", f"{avg_difficulty:.1f}/5")
+            st.metric("Dificultad Promedio", f"{analytics.avg_difficulty:.1f}/5")
 
         with col3:
-            completed_exercises = (
-                len(df_exercises[df_exercises["completed"] == True])  # noqa: E712
-                if not df_exercises.empty
-                else 0
-            )
-            st.metric("Ejercicios Completados", completed_exercises)
+            st.metric("Ejercicios Completados", analytics.completed_exercises)
 
         with col4:
-            total_ok = df_difficulty["success_count"].sum()
-            total_err = df_difficulty["error_count"].sum()
-            success_rate = (total_ok / (total_ok + total_err) * 100) if (total_ok + total_err) > 0 else 0
-            st.metric("Tasa de Éxito", f"{success_rate:.1f}%")
+            st.metric("Tasa de Éxito", f"{analytics.success_rate:.1f}%")
 
     st.markdown("---")
 
     st.markdown("### 🔎 Indicadores Avanzados")
 
-    # --- Cálculo base ---
-    grouped = df_difficulty.groupby("topic").agg({
-        "success_count": "sum",
-        "error_count": "sum"
-    })
-
-    # Total de intentos
-    grouped["attempts"] = grouped["success_count"] + grouped["error_count"]
-
-    # Tasa de éxito
-    grouped["success_rate"] = grouped["success_count"] / grouped["attempts"].replace(0, 1)
+    if analytics.best_topic is not None:
+        # --- Indicadores por tasa de éxito ---
+        colA, colB = st.columns(2)
 
-    # --- Indicadores por tasa de éxito ---
-    best_topic = grouped["success_rate"].idxmax()
-    worst_topic = grouped["success_rate"].idxmin()
-
-    colA, colB = st.columns(2)
+        with colA:
+            st.success(
+                f"✅ Mejor Tema (mayor tasa de éxito): **{analytics.best_topic}** "
+                f"({analytics.best_topic_rate*100:.1f}%)"
+            )
 
-    with colA:
-        st.success(
-            f"✅ Mejor Tema (mayor tasa de éxito): **{best_topic}** "
-            f"({grouped.loc[best_topic, 'success_rate']*100:.1f}%)"
-        )
+        with colB:
+            st.warning(
+                f"🟠 Tema con más oportunidad (menor tasa de éxito): **{analytics.worst_topic}** "
+                f"({analytics.worst_topic_rate*100:.1f}%)"
+            )
 
-    with colB:
-        st.warning(
-            f"🟠 Tema con más oportunidad (menor tasa de éxito): **{worst_topic}** "
-            f"({grouped.loc[worst_topic, 'success_rate']*100:.1f}%)"
+        # --- Indicadores según número de intentos ---
+        st.info(
+            f"📌 Tema con **más intentos**: **{analytics.most_attempts_topic}** "
+            f"({analytics.most_attempts} intentos)"
         )
 
-    # --- Indicadores según número de intentos ---
-    most_attempts_topic = grouped["attempts"].idxmax()
-    least_attempts_topic = grouped["attempts"].idxmin()
-
-    st.info(
-        f"📌 Tema con **más intentos**: **{most_attempts_topic}** "
-        f"({grouped.loc[most_attempts_topic, 'attempts']} intentos)"
-    )
-
     st.markdown("---")
 
     st.markdown("### 📌 Hábitos de Estudio")
 
     colA, colB, colC = st.columns(3)
 
-    with colA:
-        if not df_exercises.empty:
-            df_exercises["date"] = pd.to_datetime(df_exercises["created_at"]).dt.date
-            streak = 0
-            today = pd.Timestamp.now().date()
-            day = today
-
-            dates = set(df_exercises["date"].tolist())
+    habits = analytics.habits
 
-            while day in dates:
-                streak += 1
-                day -= pd.Timedelta(days=1)
-
-            st.metric("🔥 Racha Activa", f"{streak} día(s)")
+    with colA:
+        if analytics.total_exercises:
+            st.metric("🔥 Racha Activa", f"{habits.current_streak} día(s)")
 
     with colB:
-        if not df_exercises.empty:
-            dates_sorted = sorted(df_exercises["date"].unique())
-            if len(dates_sorted) > 1:
-                diffs = [
-                    (dates_sorted[i] - dates_sorted[i - 1]).days for i in range(1, len(dates_sorted))
-                ]
-                avg_interval = sum(diffs) / len(diffs)
-                st.metric("⏱️ Intervalo entre sesiones", f"{avg_interval:.1f} días")
+        if habits.active_days > 1 and habits.avg_interval_days is not None:
+            st.metric("⏱️ Intervalo entre sesiones", f"{habits.avg_interval_days:.1f} días")
 
     with colC:
-        if not df_difficulty.empty:
-            difficulty_var = df_difficulty["difficulty_level"].var()
+        if analytics.difficulty_rows:
+            difficulty_var = analytics.difficulty_variance
+            difficulty_var = float("nan") if difficulty_var is None else difficulty_var
             st.metric("📉 Variación de dificultad", f"{difficulty_var:.2f}")
 
     st.markdown("---")
 
     st.markdown("### 📈 Visualizaciones")
 
+    # Las figuras se reutilizan mientras sus datos agregados y el tema no cambien.
+    theme = _theme_key()
+
     col_chart1, col_chart2 = st.columns(2)
 
     with col_chart1:
-        if not df_difficulty.empty:
+        if not df_topics.empty:
             st.subheader("Dificultad por Tema")
 
-            df_difficulty["difficulty_level"] = pd.to_numeric(
-                df_difficulty["difficulty_level"], errors="coerce"
-            )
-
-            df_plot = (
-                df_difficulty.groupby("topic", as_index=False)["difficulty_level"].mean().dropna()
+            df_plot = df_topics[["topic", "avg_difficulty"]].dropna()
+            fig = cached_figure(
+                "topic_difficulty", df_plot, lambda: _topic_difficulty_figure(df_plot), theme
             )
 
-            fig = px.pie(
-                df_plot,
-                names="topic",
-                values="difficulty_level",
-                hole=0.35,
-            )
-
-            fig.update_layout(legend_title="Temas")
-
             st.plotly_chart(fig, use_container_width=True)
 
     with col_chart2:
-        if not df_difficulty.empty:
+        if not df_daily.empty:
             st.subheader("Progreso Diario")
 
-            df_difficulty["date"] = pd.to_datetime(df_difficulty["last_practiced"]).dt.date
-            daily = df_difficulty.groupby("date").agg(
-                {"success_count": "sum", "error_count": "sum"}
-            ).reset_index()
-
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(x=daily["date"], y=daily["success_count"], name="Éxitos"))
-            fig.add_trace(go.Scatter(x=daily["date"], y=daily["error_count"], name="Errores"))
-            fig.update_layout(xaxis_title="Fecha", yaxis_title="Cantidad")
+            fig = cached_figure(
+                "daily_progress", df_daily, lambda: _daily_progress_figure(df_daily), theme
+            )
 
             st.plotly_chart(fig, use_container_width=True)
 
     st.markdown("---")
 
-    if not df_exercises.empty:
+    if not df_activity.empty:
         st.markdown("### 🔥 Actividad Semanal")
 
-        df_exercises["date"] = pd.to_datetime(df_exercises["created_at"]).dt.date
-        activity = df_exercises.groupby("date").size().reset_index(name="count")
-        activity_pivot = activity.pivot_table(
-        values="count",
-        index=pd.to_datetime(activity["date"]).dt.dayofweek,
-        columns=activity["date"].astype(str),
-        fill_value=0,
-        )   
-
-        day_labels = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
-        activity_pivot = activity_pivot.reindex(index=range(7), fill_value=0)
-
-        fig = px.imshow(
-                activity_pivot.values,
-                labels=dict(x="Fecha", y="Día", color="Ejercicios"),
-                x=list(activity_pivot.columns),
-                y=day_labels,
-                aspect="auto",
-                color_continuous_scale="YlGnBu",
+        weeks = st.radio(
+            "Periodo",
+            ACTIVITY_HEATMAP_WEEKS,
+            format_func=lambda value: f"Últimas {value} semanas",
+            horizontal=True,
+            key="activity_heatmap_weeks",
         )
-
-        st.plotly_chart(fig, use_container_width=True)
+        # Los días ya llegan agregados desde user_daily_activity y la copia
+        # guarda el historial completo (la racha, los intervalos y los totales
+        # lo necesitan), así que no hace falta otra consulta con `since`: solo se
+        # toman los días de la ventana y se reparten en una matriz de 7 × semanas.
+        window_start = heatmap_window_start(weeks).isoformat()
+        df_window = df_activity[df_activity["day"].astype(str) >= window_start]
+        heatmap = calendar_heatmap(df_window["day"], df_window["exercises"], weeks=weeks)
+
+        if heatmap.total:
+            fig = cached_figure(
+                "activity_heatmap",
+                [heatmap.counts, heatmap.week_labels],
+                lambda: _activity_heatmap_figure(heatmap),
+                theme,
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info(f"No hay ejercicios en las últimas {weeks} semanas.")
 
     # ======================================================
     # 🎓 ESTADÍSTICAS POR CURSO
     # ======================================================
     st.markdown("---")
 
-    # Obtener nombres de cursos
-    subjects_map = {
-        sub["id"]: sub["name"]
-        for sub in sb_client.get_subjects()
-    }
-
-    if not df_difficulty.empty:
-
-        # --------------------------------------------
-        # Preparación de datos
-        # --------------------------------------------
-        df_difficulty["course"] = (
-            df_difficulty["subject_id"].map(subjects_map).fillna("Sin curso")
-        )
-
-        df_difficulty["attempts"] = (
-            df_difficulty["success_count"] + df_difficulty["error_count"]
-        )
-
-        df_difficulty["success_rate"] = (
-            df_difficulty["success_count"] /
-            df_difficulty["attempts"].replace(0, 1)
-        )
+    if not df_courses.empty:
 
         # --------------------------------------------
         # Datos agregados por curso
         # --------------------------------------------
-        exercises_by_course = (
-            df_difficulty.groupby("course")["topic"]
-            .nunique()
-            .reset_index(name="ejercicios_unicos")
-            .sort_values("ejercicios_unicos", ascending=False)
-        )
-
-        success_by_course = (
-            df_difficulty.groupby("course")["success_rate"]
-            .mean()
-            .reset_index()
-            .sort_values("success_rate", ascending=False)
-        )
-        success_by_course["success_rate"] = (
-            success_by_course["success_rate"] * 100
-        ).round(2)
+        exercises_by_course = analytics.course_topic_counts
+        success_by_course = analytics.course_success
 
         # ======================================================
         # 📊 2 GRÁFICOS EN UNA SOLA FILA
@@ -265,19 +255,11 @@ def render_statistics_interface(sb_client: SupabaseClient):
         with col1:
             st.subheader("📘 Ejercicios Únicos por Curso")
 
-            fig1 = px.bar(
+            fig1 = cached_figure(
+                "course_topics",
                 exercises_by_course,
-                x="ejercicios_unicos",
-                y="course",
-                title="Cantidad de temas por curso",
-                orientation="h",
-                text_auto=True,
-            )
-
-            fig1.update_layout(
-                xaxis_title="Cantidad de temas",
-                yaxis_title="Curso",
-                title_x=0.3
+                lambda: _course_topics_figure(exercises_by_course),
+                theme,
             )
             st.plotly_chart(fig1, use_container_width=True)
 
@@ -287,19 +269,18 @@ def render_statistics_interface(sb_client: SupabaseClient):
         with col2:
             st.subheader("✅ Rendimiento por Curso (%)")
 
-            fig2 = px.pie(
+            fig2 = cached_figure(
+                "course_success",
                 success_by_course,
-                names="course",
-                values="success_rate",
-                hole=0.45,
-            )
-
-            fig2.update_traces(
-                textinfo="percent+label",
-                pull=[0.02] * len(success_by_course)
+                lambda: _course_success_figure(success_by_course),
+                theme,
             )
 
             st.plotly_chart(fig2, use_container_width=True)
 
     else:
         st.info("Aún no hay datos suficientes para generar estadísticas de cursos.")
+
+    if SHOW_CACHE_STATS:
+        with st.expander("🛠️ Diagnóstico de cachés"):
+            st.json({"figuras": figure_cache_stats(), "estadísticas": get_stats_store().stats()})
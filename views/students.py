@@ -12,11 +12,13 @@ from config.settings import (
     STUDENT_COURSES_STUDENT_FIELD,
 )
 from services.supabase_client import SupabaseClient
+from services.roster_import import plan_roster_import
 from services.supabase_service import (
     cached_courses,
     cached_student_course_relations,
     cached_student_courses,
     cached_students,
+    import_roster,
     update_student_courses,
 )
 
@@ -32,6 +34,70 @@ def _resolve_display_name(item: Dict, preferred_fields) -> str:
     return item.get("id", "Sin nombre")
 
 
+def _render_roster_import(students: List[Dict], courses: List[Dict], relations: List[Dict]):
+    """Importa matrículas (email, curso) desde un CSV con vista previa de los cambios."""
+    st.subheader("Importar roster")
+    st.caption(
+        "El CSV debe incluir una columna `email` y una columna `course` con el nombre del curso. "
+        "Solo se agregan asignaciones; las existentes no se modifican."
+    )
+
+    uploaded = st.file_uploader("Archivo CSV", type=["csv"], key="roster_csv")
+    dry_run = st.checkbox("Solo simular (dry-run)", value=True, key="roster_dry_run")
+
+    if not uploaded or not st.button("Procesar roster", key="process_roster"):
+        return
+
+    try:
+        plan = plan_roster_import(uploaded, students, courses, relations)
+    except ValueError as exc:
+        st.error(str(exc))
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Filas leídas", plan.rows_read)
+    col2.metric("Asignaciones nuevas", len(plan.to_add))
+    col3.metric("Ya asignadas", plan.already_assigned)
+    col4.metric(
+        "Sin resolver",
+        len(plan.unknown_students) + len(plan.unknown_courses) + len(plan.invalid_rows),
+    )
+
+    if plan.unknown_students:
+        with st.expander(f"Alumnos no encontrados ({len(plan.unknown_students)})"):
+            st.dataframe(
+                pd.DataFrame(plan.unknown_students[:200], columns=["Línea", "Email"]),
+                use_container_width=True,
+            )
+    if plan.unknown_courses:
+        with st.expander(f"Cursos no encontrados ({len(plan.unknown_courses)})"):
+            st.dataframe(
+                pd.DataFrame(plan.unknown_courses[:200], columns=["Línea", "Curso"]),
+                use_container_width=True,
+            )
+    if plan.invalid_rows:
+        st.warning(f"Filas incompletas en las líneas: {', '.join(map(str, plan.invalid_rows[:50]))}")
+
+    if dry_run:
+        st.info(f"Simulación completada en {plan.elapsed:.2f} s. No se escribió nada en Supabase.")
+        return
+
+    if not plan.to_add:
+        st.info("No hay asignaciones nuevas que registrar.")
+        return
+
+    try:
+        report = import_roster(plan)
+    except Exception as exc:
+        st.error(f"No fue posible importar el roster: {exc}")
+        return
+
+    st.success(
+        f"Se registraron {report.inserted} asignaciones en {report.batches} lote(s) "
+        f"en {report.elapsed:.2f} s ({report.rows_per_second:.0f} filas/s)."
+    )
+
+
 def render_student_dashboard(sb_client: SupabaseClient):
     """Renderiza la sección de gestión de alumnos y asignación de cursos."""
     st.header("👩‍🎓 Gestión de Alumnos y Cursos")
@@ -75,6 +141,16 @@ def render_student_dashboard(sb_client: SupabaseClient):
     st.dataframe(pd.DataFrame(summary_rows), use_container_width=True)
 
     st.markdown("---")
+    mode = st.radio(
+        "Modo de asignación",
+        ["Por alumno", "Importar roster (CSV)"],
+        horizontal=True,
+        key="assignment_mode",
+    )
+    if mode == "Importar roster (CSV)":
+        _render_roster_import(students, courses, relations)
+        return
+
     st.subheader("Asignación por alumno")
 
     selected_student_id = st.selectbox(